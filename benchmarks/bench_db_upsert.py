@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Listing writes in rows per second: the former per-row `session.merge` loop vs the bulk upsert.
+
+Rows are kv.ee listings of the portal simulator, written twice into an SQLite file: first into an
+empty table (inserts), then again over the stored rows (updates), committing once per pass.
+
+Usage:
+    python -m benchmarks.bench_db_upsert [--listings 12000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from database import Database, KvEeListingModel
+from database.bulk import upsert_rows
+from simulator import generate_apartments
+from simulator.server import _kvee_excerpt
+
+
+def merge_rows(session, model, rows):
+    """Database.save_kvee_listings before the bulk upsert."""
+    for row in rows:
+        session.merge(model(**row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk upsert against session.merge.')
+    parser.add_argument('--listings', type=int, default=12000)
+    args = parser.parse_args()
+
+    rows = [_kvee_row(apartment) for apartment in generate_apartments(args.listings)]
+    candidates = {
+        'merge': lambda db: merge_rows(db.session, KvEeListingModel, rows),
+        'bulk upsert': lambda db: upsert_rows(db.session, KvEeListingModel.__table__, rows),
+    }
+    print(f"{len(rows)} kv.ee rows")
+    print(f"{'write path':<12} {'insert, rows/s':>15} {'update, rows/s':>15}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, write in candidates.items():
+            db = Database(f"sqlite:///{os.path.join(tmp_dir, name.replace(' ', '_'))}.db")
+            rates = []
+            for _ in ('insert', 'update'):
+                started = time.perf_counter()
+                write(db)
+                db.session.commit()
+                db.session.expunge_all()
+                rates.append(len(rows) / (time.perf_counter() - started))
+            assert db.session.query(KvEeListingModel).count() == len(rows)
+            db.close()
+            print(f"{name:<12} {rates[0]:>15.0f} {rates[1]:>15.0f}")
+
+
+def _kvee_row(apartment) -> dict:
+    return {
+        'id': str(3_000_000 + apartment.index),
+        'address': f'Tallinn, {apartment.district}, {apartment.street} {apartment.building}',
+        'city': 'Tallinn',
+        'street_with_building': f'{apartment.street} {apartment.building}',
+        'apartment_number': apartment.apartment_number,
+        'rooms': apartment.rooms,
+        'area_m2': apartment.area_m2,
+        'price': apartment.price,
+        'price_m2': apartment.price_m2,
+        'link': f'https://www.kv.ee/{3_000_000 + apartment.index}',
+        'img_url': None,
+        'description': _kvee_excerpt(apartment),
+        'date_activated': apartment.published_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'floor': apartment.floor,
+        'total_floors': apartment.total_floors,
+        'year_built': apartment.year_built,
+    }
+
+
+if __name__ == '__main__':
+    main()
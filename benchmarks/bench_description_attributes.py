@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Description attribute extraction: the targeted precompiled searches vs the former three uncompiled regex scans.
+
+The former code only extracted floor, total floors and year built, from Russian phrasings. The extractor is timed
+both with all its patterns (7 attributes, Russian and Estonian) and restricted to the patterns of those three
+attributes, for a like-for-like comparison.
+
+Descriptions are the kv.ee excerpts of the portal simulator (Russian and Estonian phrasings).
+
+Usage:
+    python -m benchmarks.bench_description_attributes [--listings 20000] [--repeat 3]
+"""
+import argparse
+import re
+import time
+
+from parsers.description_attributes import PATTERNS, compile_patterns, extract_attributes
+from simulator import generate_apartments
+from simulator.server import _kvee_excerpt
+
+FORMER_ATTRIBUTES = {'floor', 'total_floors', 'year_built'}
+
+
+def three_pass_attributes(description):
+    """KvEeParser.parse_floor / parse_total_floors / parse_year_built before the attribute extractor."""
+    floor = total_floors = year_built = None
+    if description:
+        floor_match = re.search(r'Этаж\s*(\d+)(?:/\d+)?', description)
+        if floor_match:
+            floor = int(floor_match.group(1))
+        else:
+            floor_match = re.search(r'(\d+)\.\s*этаж', description)
+            if floor_match:
+                floor = int(floor_match.group(1))
+        floor_match = re.search(r'Этаж\s*\d+/(\d+)', description)
+        if floor_match:
+            total_floors = int(floor_match.group(1))
+        year_match = re.search(r'год постройки\s*(\d{4})', description)
+        if year_match:
+            year_built = int(year_match.group(1))
+    return floor, total_floors, year_built
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark description attribute extraction.')
+    parser.add_argument('--listings', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    descriptions = [_kvee_excerpt(apartment) for apartment in generate_apartments(args.listings)]
+    former_patterns = compile_patterns([pattern for pattern in PATTERNS if set(pattern.fields) <= FORMER_ATTRIBUTES])
+
+    # Same results for the attributes the old code knew about (it only understood the Russian phrasing)
+    for description in descriptions:
+        if 'Этаж' in description:
+            for attributes in (extract_attributes(description), extract_attributes(description, former_patterns)):
+                assert (attributes.floor, attributes.total_floors, attributes.year_built) == \
+                    three_pass_attributes(description), description
+
+    candidates = {
+        'three-pass (3 attributes)': lambda: [three_pass_attributes(d) for d in descriptions],
+        'targeted (3 attributes)': lambda: [extract_attributes(d, former_patterns) for d in descriptions],
+        'targeted (7 attributes)': lambda: [extract_attributes(d) for d in descriptions],
+    }
+    print(f"{len(descriptions)} descriptions, best of {args.repeat}")
+    for name, run in candidates.items():
+        elapsed = min(_timed(run) for _ in range(args.repeat))
+        print(f"{name:<30} {len(descriptions) / elapsed:>10.0f} descriptions/s")
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate photo hash lookups: multi-index HashIndex vs a BK-tree vs a NumPy scan of every hash.
+
+Hashes come in small clusters (the same photo on several portals, a few bits apart), like real listing photos.
+
+Usage:
+    python -m benchmarks.bench_image_index [--hashes 100000] [--queries 1000] [--max-distance 5]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from config import IMAGE_MAX_DISTANCE
+from duplicates import HashIndex, _bit_counts, hamming
+
+
+class BKTree:
+    """Burkhard-Keller tree: children keyed by their distance to the parent."""
+
+    def __init__(self, values):
+        self.root = None
+        for value in values:
+            self.add(value)
+
+    def add(self, value: int):
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (value, {})
+                return
+            node = node[1][distance]
+
+    def search(self, value: int, max_distance: int) -> list:
+        found, stack = [], [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, node_value))
+            stack.extend(child for child_distance, child in children.items()
+                         if abs(child_distance - distance) <= max_distance)
+        return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark photo hash lookups.')
+    parser.add_argument('--hashes', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--max-distance', type=int, default=IMAGE_MAX_DISTANCE)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    values = []
+    while len(values) < args.hashes:
+        photo = rng.getrandbits(64)
+        for _ in range(3):
+            value = photo
+            for _ in range(rng.randint(0, 3)):
+                value ^= 1 << rng.randrange(64)
+            values.append(value)
+    queries = rng.sample(values, args.queries)
+
+    started = time.perf_counter()
+    index = HashIndex(values, args.max_distance)
+    print(f"{len(index)} hashes indexed in {time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    tree = BKTree(values)
+    print(f"BK-tree built in {time.perf_counter() - started:.2f}s")
+    array = np.array(values, dtype=np.uint64)
+
+    lookups = {
+        'multi-index hashing': lambda value: index.search(value),
+        'BK-tree': lambda value: tree.search(value, args.max_distance),
+        'NumPy scan': lambda value: np.flatnonzero(_bit_counts(array ^ np.uint64(value)) <= args.max_distance),
+    }
+    print(f"{'lookup':<20} {'ms per query':>13}")
+    for name, lookup in lookups.items():
+        started = time.perf_counter()
+        for value in queries:
+            lookup(value)
+        print(f"{name:<20} {(time.perf_counter() - started) / len(queries) * 1000:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
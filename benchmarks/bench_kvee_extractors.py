@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Throughput of the kv.ee HTML extraction backends, in articles per second.
+
+Pages come from the portal simulator (no server is started, responses are built in-process).
+
+Usage:
+    python -m benchmarks.bench_kvee_extractors [--listings 5000] [--repeat 3]
+"""
+import argparse
+import time
+
+from parsers.kvee_extractors import EXTRACTORS
+from parsers.kvee_parser import KvEeParser
+from simulator import PortalSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark kv.ee extraction backends.')
+    parser.add_argument('--listings', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    simulator = PortalSimulator(listings=args.listings)
+    pages = [simulator.kvee_page(start) for start in range(0, len(simulator.apartments_by_portal['kvee']), 50)]
+    simulator.stop()
+    articles_count = sum(len(page['objects']) for page in pages)
+
+    print(f"{articles_count} articles in {len(pages)} pages, best of {args.repeat}")
+    print(f"{'backend':>8} {'extract, art/s':>16} {'parse_listings, art/s':>23}")
+    reference = None
+    for name, extractor_class in EXTRACTORS.items():
+        extractor = extractor_class()
+        kvee_parser = KvEeParser(extractor=name)
+
+        extract_time = min(_timed(lambda: [extractor.extract_articles(page['content']) for page in pages])
+                           for _ in range(args.repeat))
+        parse_time = min(_timed(lambda: [kvee_parser.parse_listings(page) for page in pages])
+                         for _ in range(args.repeat))
+
+        listings = [listing for page in pages for listing in kvee_parser.parse_listings(page)]
+        reference = reference or listings
+        assert listings == reference, f"{name} output differs from {next(iter(EXTRACTORS))}"
+        print(f"{name:>8} {articles_count / extract_time:>16.0f} {articles_count / parse_time:>23.0f}")
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Memory per 100k listings and price_m2 statistics speed: plain dataclasses, slots dataclasses and ListingBatch.
+
+Listings are City24 items of the portal simulator, parsed in-process page by page.
+
+Usage:
+    python -m benchmarks.bench_listing_batch [--listings 100000] [--repeat 3]
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass
+
+from parsers.batch import ListingBatch
+from parsers.city24_parser import City24Listing, City24Parser
+from parsers.http_client import HttpClient
+from simulator import generate_apartments
+from simulator.server import _city24_item
+
+# City24Listing as it was before slots=True
+DictCity24Listing = make_dataclass('DictCity24Listing', [(field.name, field.type) for field in fields(City24Listing)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the columnar listing batch.')
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    apartments = generate_apartments(args.listings)
+    items = [_city24_item(apartment) for apartment in apartments]
+    pages = [items[i:i + args.page_size] for i in range(0, len(items), args.page_size)]
+    client = HttpClient(rate_limits={})
+    city24_parser = City24Parser(client=client)
+
+    representations = {
+        'dataclass': lambda: [DictCity24Listing(**{field.name: getattr(listing, field.name)
+                                                   for field in fields(listing)})
+                              for page in pages for listing in city24_parser.parse_listings(page)],
+        'slots dataclass': lambda: [listing for page in pages for listing in city24_parser.parse_listings(page)],
+        'ListingBatch': lambda: ListingBatch.concat(
+            ListingBatch.from_listings(City24Listing, city24_parser.parse_listings(page)) for page in pages),
+    }
+    per_100k = 100000 / len(items)
+    print(f"{len(items)} City24 listings")
+    print(f"{'representation':<16} {'MB per 100k':>12} {'price_m2 stats, ms':>19}")
+    for name, build in representations.items():
+        tracemalloc.start()
+        listings = build()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        stats = (lambda: listings.price_m2_stats()) if name == 'ListingBatch' else (lambda: _list_stats(listings))
+        elapsed = min(_timed(stats) for _ in range(args.repeat))
+        print(f"{name:<16} {memory * per_100k / 2 ** 20:>12.1f} {elapsed * 1000:>19.1f}")
+        del listings
+    client.close()
+
+
+def _list_stats(listings) -> tuple:
+    prices = [listing.price_m2 for listing in listings if listing.price_m2 is not None]
+    deciles = statistics.quantiles(prices, n=10)
+    return len(prices), statistics.fmean(prices), statistics.median(prices), deciles[0], deciles[-1]
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    main()
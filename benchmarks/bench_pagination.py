@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Wall-clock benchmark of the kv.ee crawl at different fetch concurrency levels.
+
+Runs KvEeParser against the local portal simulator, which answers every page after a fixed delay.
+
+Usage:
+    python -m benchmarks.bench_pagination [--listings 1000] [--latency 0.1]
+"""
+import argparse
+import time
+
+from parsers.http_client import HttpClient
+from parsers.kvee_parser import KvEeParser
+from simulator import PortalSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent page fetching against the portal simulator.')
+    parser.add_argument('--listings', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.1, help='Server-side delay per page, in seconds')
+    args = parser.parse_args()
+
+    results = []
+    with PortalSimulator(listings=args.listings, latency=args.latency) as simulator:
+        expected_count = len(simulator.apartments_by_portal['kvee'])
+        for concurrency in (1, 4, 16):
+            # No rate limit: the benchmark measures the fan-out, not the politeness settings
+            client = HttpClient(rate_limits={})
+            kvee_parser = KvEeParser(concurrency=concurrency, search_url=simulator.kvee_search_url, client=client)
+            started = time.perf_counter()
+            listings = kvee_parser.parse()
+            elapsed = time.perf_counter() - started
+            assert len(listings) == expected_count
+            results.append((concurrency, elapsed))
+            client.close()
+
+    print(f"\n{expected_count} kv.ee listings, {args.latency * 1000:.0f} ms latency per page")
+    print(f"{'concurrency':>12} {'wall time, s':>14} {'speedup':>8}")
+    for concurrency, elapsed in results:
+        print(f"{concurrency:>12} {elapsed:>14.2f} {results[0][1] / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
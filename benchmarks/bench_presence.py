@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+"Only on one portal" reads: the listing_presence lookup vs the anti-join over the listing tables, and what keeping
+listing_presence up to date costs per written page.
+
+Simulator apartments are saved to an SQLite file on the portals they are listed on, one page at a time, like a crawl.
+
+Usage:
+    python -m benchmarks.bench_presence [--listings 100000] [--page-size 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import and_, exists, select
+
+from database import Database
+from database.models import LISTING_MODELS
+from database.presence import update_presence
+from parsers.common import build_match_key
+from simulator import generate_apartments
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the listing_presence table.')
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    apartments = generate_apartments(args.listings)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(f"sqlite:///{os.path.join(tmp_dir, 'presence.db')}")
+        for crawl in ('first crawl', 'unchanged re-crawl'):
+            pages = 0
+            started = time.perf_counter()
+            for portal, model in LISTING_MODELS.items():
+                rows = [_row(portal, apartment) for apartment in apartments if portal in apartment.portals]
+                for start in range(0, len(rows), args.page_size):
+                    db.save_rows(model, rows[start:start + args.page_size])
+                    pages += 1
+            elapsed = time.perf_counter() - started
+            print(f"{crawl}: {pages} pages saved in {elapsed:.1f}s ({elapsed / pages * 1000:.2f} ms per page)")
+
+        keys = [row['match_key'] for row in (_row('kvee', apartment) for apartment in apartments[:args.page_size])]
+        started = time.perf_counter()
+        for _ in range(100):
+            update_presence(db.session, keys)
+        db.session.rollback()
+        print(f"presence update of a page's {len(set(keys))} buildings: "
+              f"{(time.perf_counter() - started) / 100 * 1000:.2f} ms")
+
+        print(f"{'portal':<13} {'listings':>8} {'presence, ms':>13} {'anti-join, ms':>14}")
+        for portal in LISTING_MODELS:
+            started = time.perf_counter()
+            found = db.only_on(portal)
+            presence_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            expected = _anti_join(db, portal)
+            anti_join_ms = (time.perf_counter() - started) * 1000
+            assert len(found) == len(expected)
+            print(f"{portal:<13} {len(found):>8} {presence_ms:>13.1f} {anti_join_ms:>14.1f}")
+        db.close()
+
+
+def _anti_join(db: Database, portal: str) -> list:
+    """The README's query: listings of `portal` with no listing of the same building on another portal."""
+    table = LISTING_MODELS[portal].__table__
+    elsewhere = [~exists().where(LISTING_MODELS[other].__table__.c.match_key == table.c.match_key)
+                 for other in LISTING_MODELS if other != portal]
+    return [dict(row) for row in db.session.execute(select(table).where(and_(*elsewhere))).mappings()]
+
+
+def _row(portal: str, apartment) -> dict:
+    street_with_building = f'{apartment.street} {apartment.building}'
+    return {
+        'id': f'{portal}-{apartment.index}',
+        'address': f'Tallinn, {apartment.district}, {street_with_building}',
+        'city': 'Tallinn',
+        'street_with_building': street_with_building,
+        'apartment_number': apartment.apartment_number,
+        'rooms': apartment.rooms,
+        'area_m2': apartment.area_m2,
+        'price': apartment.price,
+        'price_m2': apartment.price_m2,
+        'match_key': build_match_key('Tallinn', street_with_building),
+    }
+
+
+if __name__ == '__main__':
+    main()
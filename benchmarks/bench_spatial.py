@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Comparable-listing lookups over simulator apartments: grid SpatialIndex vs a NumPy scan of every listing.
+
+Usage:
+    python -m benchmarks.bench_spatial [--listings 100000] [--queries 1000] [--k 10]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from config import COMPARABLE_AREA_TOLERANCE
+from simulator import generate_apartments
+from spatial import SpatialIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the spatial index.')
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--radius', type=float, default=500.0)
+    args = parser.parse_args()
+
+    apartments = generate_apartments(args.listings)
+    started = time.perf_counter()
+    index = SpatialIndex([str(apartment.index) for apartment in apartments],
+                         [apartment.latitude for apartment in apartments],
+                         [apartment.longitude for apartment in apartments],
+                         [apartment.rooms for apartment in apartments],
+                         [apartment.area_m2 for apartment in apartments],
+                         [apartment.price for apartment in apartments],
+                         [apartment.price_m2 for apartment in apartments])
+    print(f"{len(index)} listings indexed in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(1)
+    queries = [rng.choice(apartments) for _ in range(args.queries)]
+    lookups = {
+        f'grid kNN (k={args.k})': lambda apartment: index.nearest(
+            apartment.latitude, apartment.longitude, args.k, apartment.rooms, apartment.area_m2),
+        f'scan kNN (k={args.k})': lambda apartment: _scan_nearest(index, apartment, args.k),
+        f'grid radius {args.radius:g} m': lambda apartment: index.within(
+            apartment.latitude, apartment.longitude, args.radius),
+        f'scan radius {args.radius:g} m': lambda apartment: _scan_within(index, apartment, args.radius),
+    }
+    print(f"{'lookup':<22} {'ms per query':>13}")
+    for name, lookup in lookups.items():
+        started = time.perf_counter()
+        for apartment in queries:
+            lookup(apartment)
+        print(f"{name:<22} {(time.perf_counter() - started) / len(queries) * 1000:>13.3f}")
+
+
+def _scan_nearest(index: SpatialIndex, apartment, k: int) -> list:
+    x, y = index._project(apartment.latitude, apartment.longitude)
+    similar = (index.rooms == apartment.rooms) & \
+              (np.abs(index.areas - apartment.area_m2) <= COMPARABLE_AREA_TOLERANCE * apartment.area_m2)
+    distances = np.where(similar, np.hypot(index.x - x, index.y - y), np.inf)
+    nearest = np.argpartition(distances, k)[:k]
+    return index._comparables(nearest, distances[nearest])
+
+
+def _scan_within(index: SpatialIndex, apartment, radius: float) -> list:
+    x, y = index._project(apartment.latitude, apartment.longitude)
+    distances = np.hypot(index.x - x, index.y - y)
+    inside = np.flatnonzero(distances <= radius)
+    return index._comparables(inside, distances[inside])
+
+
+if __name__ == '__main__':
+    main()
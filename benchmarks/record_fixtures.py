@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Record search results pages of each portal as benchmark fixtures (benchmarks/fixtures/<portal>.json.gz).
+
+Pages are fetched with the parsers' own `iter_raw_pages`, so a fixture holds exactly the payloads `parse_listings`
+receives. They come from the configured portal URLs: the live portals, or the portal simulator with
+PORTAL_SIMULATOR_URL. The checked-in fixtures were recorded from the simulator (`python -m simulator`).
+
+Usage:
+    PORTAL_SIMULATOR_URL=http://127.0.0.1:8000 python -m benchmarks.record_fixtures [--portal all] [--listings 1000]
+"""
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import List
+
+from parsers.http_client import HttpClient
+from parsers.registry import PARSERS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_path(portal: str, fixtures_dir: str = FIXTURES_DIR) -> str:
+    return os.path.join(fixtures_dir, f'{portal}.json.gz')
+
+
+def load_fixture(portal: str, fixtures_dir: str = FIXTURES_DIR) -> List:
+    """Recorded page payloads of `portal`, in page order."""
+    with gzip.open(fixture_path(portal, fixtures_dir), 'rt', encoding='utf-8') as fixture:
+        return json.load(fixture)['pages']
+
+
+def record_fixture(portal: str, client: HttpClient, min_listings: int, fixtures_dir: str = FIXTURES_DIR) -> str:
+    """Fetch pages of `portal` until at least `min_listings` listings (or the last page), save them and return
+    the fixture's path."""
+    parser = PARSERS[portal](client=client, concurrency=1)
+    pages, listings = [], 0
+    raw_pages = parser.iter_raw_pages()
+    for raw_page in raw_pages:
+        pages.append(raw_page.payload)
+        listings += len(parser.parse_listings(raw_page.payload))
+        if listings >= min_listings:
+            break
+    raw_pages.close()
+
+    path = fixture_path(portal, fixtures_dir)
+    os.makedirs(fixtures_dir, exist_ok=True)
+    # mtime=0 keeps re-recordings of the same pages byte-identical
+    with open(path, 'wb') as output, gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as compressed:
+        compressed.write(json.dumps({
+            'portal': portal,
+            'search_url': parser.search_url,
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'listings': listings,
+            'pages': pages,
+        }, ensure_ascii=False).encode())
+    print(f"{portal}: {len(pages)} pages, {listings} listings saved to {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record search results pages as benchmark fixtures.')
+    parser.add_argument('--portal', default='all', help=f"{', '.join(PARSERS)} or all")
+    parser.add_argument('--listings', type=int, default=1000, help='Record pages until this many listings')
+    parser.add_argument('--output-dir', default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    client = HttpClient()
+    for portal in PARSERS if args.portal == 'all' else [args.portal]:
+        record_fixture(portal, client, args.listings, args.output_dir)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite with regression thresholds: parser and address normalization throughput on the recorded pages of
+each portal (benchmarks/fixtures, see record_fixtures.py), and listing write rate and cross-portal comparison time on
+synthetic databases.
+
+A synthetic database of N apartments holds the simulator's listings of all three portals (each apartment is on one
+to three of them), parsed by the real parsers and written page by page through `Database.save_rows` into an SQLite
+file, first into empty tables, then again unchanged.
+
+Results are written as JSON. With a baseline (a results file saved with --save-baseline), the run fails when a metric
+is worse than the baseline by more than BENCH_REGRESSION_THRESHOLD (or the matching BENCH_THRESHOLDS pattern).
+
+Usage:
+    python -m benchmarks.suite [--sizes 10000,100000] [--repeat 3] [--baseline benchmarks/baseline.json]
+    python -m benchmarks.suite --save-baseline
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from config import BENCH_REGRESSION_THRESHOLD, BENCH_THRESHOLDS
+from database import Database
+from database.models import LISTING_MODELS
+from matching import find_portal_gaps, load_portal_indexes
+from parsers.batch import listing_rows
+from parsers.common import build_match_key, extract_district
+from parsers.http_client import HttpClient
+from parsers.registry import PARSERS
+from simulator import PortalSimulator
+from simulator.server import KINNISVARA24_PAGE_SIZE, KVEE_PAGE_SIZE
+from .record_fixtures import FIXTURES_DIR, load_fixture
+
+BENCHMARKS_DIR = os.path.dirname(__file__)
+RESULTS_PATH = os.path.join(BENCHMARKS_DIR, 'results', 'latest.json')
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+# Listings per write, like one crawled page
+WRITE_PAGE_SIZE = 50
+CITY24_PAGE_SIZE = 1000
+
+
+@dataclass
+class Regression:
+    metric: str
+    baseline: float
+    value: float
+    # Relative change for the worse, e.g. 0.3 for 30% slower
+    change: float
+    threshold: float
+
+
+def run_suite(sizes: List[int], repeat: int = 3, fixtures_dir: str = FIXTURES_DIR) -> dict:
+    """Run every benchmark; returns the results document (metric name -> value, unit, direction)."""
+    metrics = {}
+    client = HttpClient()
+    for portal, parser_class in PARSERS.items():
+        parser = parser_class(client=client)
+        pages = load_fixture(portal, fixtures_dir)
+        listings = [listing for page in pages for listing in parser.parse_listings(page)]
+        parse_time = _best_of(repeat, lambda: [parser.parse_listings(page) for page in pages])
+        _add(metrics, f'parse.{portal}.listings_per_s', len(listings) / parse_time, 'listings/s')
+        normalize_time = _best_of(repeat, lambda: [(build_match_key(listing.city, listing.street_with_building),
+                                                    extract_district(listing.address)) for listing in listings])
+        _add(metrics, f'normalize.{portal}.addresses_per_s', len(listings) / normalize_time, 'addresses/s')
+    client.close()
+
+    for size in sizes:
+        rows_by_portal = synthetic_rows(size)
+        rows_count = sum(len(rows) for rows in rows_by_portal.values())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = Database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+            for write in ('insert', 'update'):
+                write_time = _timed(lambda: _save_pages(db, rows_by_portal))
+                _add(metrics, f'upsert.{size}.{write}_rows_per_s', rows_count / write_time, 'rows/s')
+            db.session.expunge_all()
+            compare_time = _best_of(repeat, lambda: find_portal_gaps(load_portal_indexes(db, list(PARSERS))))
+            _add(metrics, f'compare.{size}.fuzzy_s', compare_time, 's', higher_is_better=False)
+            only_on_time = _best_of(repeat, lambda: [db.only_on(portal) for portal in PARSERS])
+            _add(metrics, f'compare.{size}.only_on_s', only_on_time, 's', higher_is_better=False)
+            db.close()
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'repeat': repeat,
+        'metrics': metrics,
+    }
+
+
+def synthetic_rows(size: int) -> Dict[str, List[dict]]:
+    """Rows to store for the simulator's listings of `size` apartments, parsed by each portal's parser."""
+    simulator = PortalSimulator(listings=size)
+    simulator.stop()
+    client = HttpClient()
+    parsers = {portal: parser_class(client=client) for portal, parser_class in PARSERS.items()}
+    counts = {portal: len(apartments) for portal, apartments in simulator.apartments_by_portal.items()}
+    pages = {
+        'kvee': (simulator.kvee_page(start) for start in range(0, counts['kvee'], KVEE_PAGE_SIZE)),
+        'city24': (simulator.city24_page(CITY24_PAGE_SIZE, page)
+                   for page in range(1, counts['city24'] // CITY24_PAGE_SIZE + 2)),
+        'kinnisvara24': (simulator.kinnisvara24_page(page)['data']
+                         for page in range(1, counts['kinnisvara24'] // KINNISVARA24_PAGE_SIZE + 2)),
+    }
+    rows = {portal: [row for page in portal_pages for row in listing_rows(parsers[portal].parse_listings(page))]
+            for portal, portal_pages in pages.items()}
+    client.close()
+    return rows
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float = BENCH_REGRESSION_THRESHOLD,
+                          thresholds: Optional[Dict[str, float]] = None) -> List[Regression]:
+    """Metrics of `results` worse than in `baseline` by more than their threshold: the first pattern of
+    `thresholds` (fnmatch, e.g. "upsert.*") matching the metric name, else `threshold`.
+
+    Metrics missing from either side are skipped, so adding a benchmark doesn't fail against an older baseline.
+    """
+    thresholds = BENCH_THRESHOLDS if thresholds is None else thresholds
+    regressions = []
+    for name, metric in results['metrics'].items():
+        baseline_metric = baseline['metrics'].get(name)
+        if baseline_metric is None or not baseline_metric['value']:
+            continue
+        before, after = baseline_metric['value'], metric['value']
+        change = (before - after) / before if metric['higher_is_better'] else (after - before) / before
+        limit = next((value for pattern, value in thresholds.items() if fnmatch.fnmatch(name, pattern)), threshold)
+        if change > limit:
+            regressions.append(Regression(name, before, after, change, limit))
+    return regressions
+
+
+def format_results(results: dict, baseline: Optional[dict] = None) -> str:
+    lines = [f"{'metric':<40} {'value':>14} {'unit':<12} {'baseline':>14} {'change':>8}"]
+    for name, metric in results['metrics'].items():
+        line = f"{name:<40} {metric['value']:>14.4g} {metric['unit']:<12}"
+        baseline_metric = (baseline or {}).get('metrics', {}).get(name)
+        if baseline_metric and baseline_metric['value']:
+            # Positive is better, whatever the direction of the metric
+            change = metric['value'] / baseline_metric['value'] - 1
+            change = change if metric['higher_is_better'] else -change
+            line += f" {baseline_metric['value']:>14.4g} {change:>+8.1%}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _save_pages(db: Database, rows_by_portal: Dict[str, List[dict]]):
+    for portal, rows in rows_by_portal.items():
+        for start in range(0, len(rows), WRITE_PAGE_SIZE):
+            db.save_rows(LISTING_MODELS[portal], rows[start:start + WRITE_PAGE_SIZE])
+
+
+def _add(metrics: dict, name: str, value: float, unit: str, higher_is_better: bool = True):
+    metrics[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+    print(f"{name}: {value:.4g} {unit}", flush=True)
+
+
+def _best_of(repeat: int, run: Callable) -> float:
+    return min(_timed(run) for _ in range(repeat))
+
+
+def _timed(run: Callable) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def _load(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _save(path: str, results: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+        file.write('\n')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and compare it with a baseline.')
+    parser.add_argument('--sizes', default='10000,100000',
+                        help='Apartments in the synthetic databases, comma-separated (default: 10000,100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per timing, the best one counts (default: 3)')
+    parser.add_argument('--output', default=RESULTS_PATH, help='Results JSON file')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline results JSON file')
+    parser.add_argument('--threshold', type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help=f'Allowed relative regression for metrics without a BENCH_THRESHOLDS pattern '
+                             f'(default: {BENCH_REGRESSION_THRESHOLD})')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run_suite([int(size) for size in args.sizes.split(',') if size], args.repeat)
+    _save(args.output, results)
+    baseline = _load(args.baseline)
+    print(format_results(results, baseline))
+    print(f"Results saved to {args.output}")
+    if args.save_baseline:
+        _save(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, nothing to compare with (run with --save-baseline)")
+        return 0
+
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression.metric}: {regression.value:.4g} vs baseline {regression.baseline:.4g} "
+              f"({regression.change:.1%} worse, threshold {regression.threshold:.0%})")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
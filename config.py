@@ -1,16 +1,117 @@
+import os
+
 DB_PATH = "sqlite:///real_estate_prices.db"
+# Streamed crawls commit after this many listings
+DB_COMMIT_EVERY = 500
+# Rows per executemany of the bulk upsert (database/bulk.py)
+DB_UPSERT_CHUNK = 1000
+# SQLite page cache per connection, in KiB
+DB_CACHE_SIZE_KB = 64 * 1024
+# Listing batches waiting for the database writer thread (database/writer.py) before crawls block
+DB_WRITE_QUEUE_SIZE = 16
+
+# --incremental crawls still walk every page when the last full crawl is older than this
+INCREMENTAL_FULL_SWEEP_HOURS = 24
+# --resume continues an unfinished full crawl from its last saved page if it started within this many hours
+CRAWL_RESUME_MAX_AGE_HOURS = 24
+
+# Cross-portal matching (matching.py): listings without the same address still count as present on another
+# portal if it has an apartment on the same street with the same rooms and floor, area and price within these
+MATCH_AREA_TOLERANCE_M2 = 1.0
+MATCH_PRICE_TOLERANCE = 0.05  # relative
+MATCH_REPORTS_DIR = "reports"
+
+# Comparable listings (spatial.py): grid cell size of the City24 coordinate index, number of comparables for a fair
+# price estimate, and how much their area may differ (relative)
+SPATIAL_CELL_M = 250
+COMPARABLES_K = 10
+COMPARABLE_AREA_TOLERANCE = 0.2
+
+# Mispricing detector (detect.py): listings are compared with others in the same district with the same rooms, floor
+# band and year_built band; a band starts at each boundary (floors 1, 2-4, 5-8, 9+; built before 1940, 1940-1990, ...)
+DETECT_FLOOR_BANDS = [2, 5, 9]
+DETECT_YEAR_BANDS = [1940, 1991, 2011]
+# Groups smaller than this fall back to district and rooms only
+DETECT_MIN_GROUP = 5
+# Robust z-score from which a listing is reported
+DETECT_MIN_Z = 3.0
+
+# Parquet export (export.py): one directory per portal, one partition per crawl date
+EXPORT_DIR = "exports"
+# Rows read from the database and written as one Parquet row group at a time
+EXPORT_CHUNK_ROWS = 10000
+
+# Cross-portal duplicates by photo (duplicates.py): downloaded photos are kept in IMAGE_CACHE_DIR, their perceptual
+# hashes in the image_fingerprint table. Photos whose hashes differ in at most IMAGE_MAX_DISTANCE of 64 bits count as
+# the same photo; a hash shared by more than IMAGE_COMMON_HASH_LISTINGS listings of one portal (placeholder, agency
+# logo) is ignored
+IMAGE_CACHE_DIR = "image_cache"
+IMAGE_CONCURRENCY = 8
+IMAGE_MAX_DISTANCE = 5
+IMAGE_COMMON_HASH_LISTINGS = 10
+
+# Crawl metrics (metrics.py): every run appends one JSON object per portal to METRICS_LOG_PATH and rewrites the
+# portal's samples in METRICS_PROM_PATH (Prometheus text format, e.g. for the node_exporter textfile collector)
+METRICS_LOG_PATH = "crawl_metrics.jsonl"
+METRICS_PROM_PATH = "crawl_metrics.prom"
+
+# Benchmark suite (benchmarks/suite.py): a run fails when a metric is worse than the saved baseline by more than
+# this (relative), or by the value of the first BENCH_THRESHOLDS pattern matching the metric name. Disk-bound writes
+# vary more between runs than in-memory parsing
+BENCH_REGRESSION_THRESHOLD = 0.25
+BENCH_THRESHOLDS = {
+    'upsert.*': 0.4,
+}
+
+# Import time budget of `real_estate_parser_cli.py --help`, in milliseconds, enforced by tests/test_startup.py.
+# Command dependencies (SQLAlchemy, requests, numpy, the parsers) are imported by the command that needs them
+STARTUP_IMPORT_BUDGET_MS = 100
+
+# Max number of page requests in flight per portal
+FETCH_CONCURRENCY = 4
+
+# Worker processes parsing fetched pages (0: parse on the fetching thread), see parsers/pipeline.py
+PARSE_WORKERS = 0
+# Max number of fetched pages waiting for or being parsed, per worker
+PARSE_QUEUE_PER_WORKER = 2
+
+# Shared HTTP client (parsers/http_client.py)
+HTTP_TIMEOUT = 30  # seconds
+HTTP_POOL_SIZE = 16  # keep-alive connections per host
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE = 0.5  # seconds, doubled on every retry
+HTTP_BACKOFF_MAX = 30  # seconds, also caps Retry-After
+# Token bucket per portal: (requests per second, burst)
+RATE_LIMITS = {
+    'kvee': (5, 10),
+    'city24': (5, 10),
+    'kinnisvara24': (5, 10),
+}
+
+# On-disk response cache (parsers/response_cache.py)
+CACHE_PATH = "http_cache.sqlite"
+CACHE_TTL = 15 * 60  # seconds; stale entries are revalidated with ETag / Last-Modified
+# Entries neither stored nor revalidated for this long are deleted when the cache is opened, and the file vacuumed
+CACHE_MAX_AGE = 7 * 24 * 3600  # seconds
+
+# Portal URLs can be pointed at the local portal simulator (python -m simulator), either all at once with
+# PORTAL_SIMULATOR_URL=http://127.0.0.1:8000 or one by one with KVEE_BASE_URL, CITY24_API_URL, KINNISVARA24_API_URL
+PORTAL_SIMULATOR_URL = os.environ.get("PORTAL_SIMULATOR_URL")
 
 # kv.ee
-KVEE_BASE_URL = "https://www.kv.ee"
-KVEE_SEARCH_URL = "https://www.kv.ee/ru/search?orderby=cawl&deal_type=1&county=1&parish=1061&start="
+KVEE_EXTRACTOR = "lxml"  # HTML extraction backend: "lxml" (fast) or "bs4" (reference), see parsers/kvee_extractors.py
+KVEE_BASE_URL = os.environ.get("KVEE_BASE_URL", PORTAL_SIMULATOR_URL or "https://www.kv.ee")
+KVEE_SEARCH_URL = KVEE_BASE_URL + "/ru/search?orderby=cawl&deal_type=1&county=1&parish=1061&start="
 
 # city24.ee
 CITY24_BASE_URL = "https://www.city24.ee/ru"
-CITY24_API_SEARCH_URL = "https://api.city24.ee/ru_RU/search/realties?address%5Bcc%5D=1&address%5Bparish%5D%5B%5D=181&tsType=sale&unitType=Apartment&order%5BdatePublished%5D=desc&adReach=0&itemsPerPage={limit}&page={page}"
+CITY24_API_URL = os.environ.get("CITY24_API_URL", PORTAL_SIMULATOR_URL or "https://api.city24.ee")
+CITY24_API_SEARCH_URL = CITY24_API_URL + "/ru_RU/search/realties?address%5Bcc%5D=1&address%5Bparish%5D%5B%5D=181&tsType=sale&unitType=Apartment&order%5BdatePublished%5D=desc&adReach=0&itemsPerPage={limit}&page={page}"
 
 # kinnisvara24.ee
 KINNISVARA24_BASE_URL = "https://kinnisvara24.ee/ru"
-KINNISVARA24_API_SEARCH_URL = "https://kinnisvara24.ee/search"
+KINNISVARA24_API_URL = os.environ.get("KINNISVARA24_API_URL", PORTAL_SIMULATOR_URL or "https://kinnisvara24.ee")
+KINNISVARA24_API_SEARCH_URL = KINNISVARA24_API_URL + "/search"
 KINNISVARA24_API_PAYLOAD = {
     "deal_types": ["sale"],
     "object_types": ["apartment"],
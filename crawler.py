@@ -0,0 +1,107 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import FETCH_CONCURRENCY, INCREMENTAL_FULL_SWEEP_HOURS, PARSE_WORKERS
+from database import Database, DatabaseWriter
+from metrics import get_metrics
+from parsers.http_client import HttpClient
+from parsers.registry import PARSERS
+
+
+@dataclass
+class CrawlOptions:
+    concurrency: int = FETCH_CONCURRENCY
+    incremental: bool = False
+    # Continue the portal's unfinished full crawl, if any, after its last saved page
+    resume: bool = False
+    parse_workers: int = PARSE_WORKERS
+    # Per-portal search URL overrides, e.g. PortalSimulator.search_urls
+    search_urls: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class CrawlResult:
+    portal: str
+    mode: str
+    listings_count: int
+    duration: float
+    error: Optional[str] = None
+    # First page fetched when an unfinished crawl was resumed
+    resumed_from_page: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def crawl_portal(portal: str, db: Database, client: HttpClient, options: CrawlOptions,
+                 writer: Optional[DatabaseWriter] = None) -> CrawlResult:
+    """Crawl one portal into `db`, through `writer` if given.
+
+    Every saved page is journaled under the crawl run, so with `options.resume` an unfinished full crawl of the
+    portal continues after its last saved page instead of starting over. The run is only marked finished once
+    all pages are saved. Failures are reported in the result rather than raised. The crawl's mode, duration and
+    error are added to the portal's stage metrics in `metrics.get_metrics()`.
+    """
+    started = time.perf_counter()
+    mode, listings_count, start_page = 'full', 0, 1
+    try:
+        incremental = None
+        crawl_run_id = db.unfinished_crawl_run(portal) if options.resume else None
+        if crawl_run_id is not None:
+            start_page = db.completed_pages(crawl_run_id) + 1
+            print(f"Resuming {portal} crawl run {crawl_run_id} from page {start_page}")
+        elif options.incremental:
+            last_full_crawl_at = db.last_full_crawl_at(portal)
+            if last_full_crawl_at and \
+                    datetime.now() - last_full_crawl_at < timedelta(hours=INCREMENTAL_FULL_SWEEP_HOURS):
+                incremental = db.load_incremental_state(portal)
+                mode = 'incremental'
+            else:
+                print(f"No full crawl of {portal} in the last {INCREMENTAL_FULL_SWEEP_HOURS}h, running a full sweep")
+        if crawl_run_id is None:
+            crawl_run_id = db.start_crawl_run(portal, mode)
+
+        parser_kwargs = {'search_url': options.search_urls[portal]} if portal in options.search_urls else {}
+        parser = PARSERS[portal](concurrency=options.concurrency, client=client,
+                                 parse_workers=options.parse_workers, **parser_kwargs)
+        pages = parser.iter_pages(incremental, columnar=True, start_page=start_page)
+        listings_count = (writer or db).save_listing_pages(portal, pages, crawl_run_id=crawl_run_id)
+        db.finish_crawl_run(crawl_run_id)
+    except Exception as e:
+        traceback.print_exc()
+        result = CrawlResult(portal, mode, listings_count, time.perf_counter() - started, f'{type(e).__name__}: {e}')
+    else:
+        result = CrawlResult(portal, mode, listings_count, time.perf_counter() - started)
+    if start_page > 1:
+        result.resumed_from_page = start_page
+    get_metrics().finish(portal, mode, result.duration, result.error)
+    return result
+
+
+def crawl_portals(portals: List[str], db: Database, client: HttpClient, options: CrawlOptions,
+                  writer: Optional[DatabaseWriter] = None) -> List[CrawlResult]:
+    """Crawl `portals` in parallel, one worker thread per portal, all writing through the same `db` or `writer`.
+
+    A slow or failing portal doesn't hold up the others; results are returned in `portals` order.
+    """
+    if len(portals) == 1:
+        return [crawl_portal(portals[0], db, client, options, writer)]
+    with ThreadPoolExecutor(max_workers=len(portals), thread_name_prefix='crawl') as executor:
+        futures = [executor.submit(crawl_portal, portal, db, client, options, writer) for portal in portals]
+        return [future.result() for future in futures]
+
+
+def format_summary(results: List[CrawlResult]) -> str:
+    lines = [f"{'portal':<14} {'mode':<12} {'listings':>9} {'duration':>10}  status"]
+    for result in results:
+        status = 'ok' if result.ok else f'failed: {result.error}'
+        if result.resumed_from_page:
+            status += f' (resumed from page {result.resumed_from_page})'
+        lines.append(f"{result.portal:<14} {result.mode:<12} {result.listings_count:>9} "
+                     f"{result.duration:>9.1f}s  {status}")
+    return '\n'.join(lines)
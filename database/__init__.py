@@ -1,4 +1,6 @@
 from .database import Database
-from .models import KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel
+from .models import KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel, CrawlRunModel
+from .writer import DatabaseWriter
 
-__all__ = ['Database', 'KvEeListingModel', 'City24ListingModel', 'Kinnisvara24ListingModel']
+__all__ = ['Database', 'DatabaseWriter', 'KvEeListingModel', 'City24ListingModel', 'Kinnisvara24ListingModel',
+           'CrawlRunModel']
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from typing import List
+
+from sqlalchemy import Table
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from config import DB_UPSERT_CHUNK
+
+
+@lru_cache(maxsize=None)
+def upsert_statement(table: Table, columns: tuple):
+    """INSERT ... ON CONFLICT(<primary key>) DO UPDATE for `columns` of `table`.
+
+    Only the given columns are overwritten on conflict, so columns that a caller doesn't supply keep
+    their stored values. Built once per table and column set.
+    """
+    statement = insert(table)
+    primary_key = [column.name for column in table.primary_key]
+    return statement.on_conflict_do_update(
+        index_elements=primary_key,
+        set_={name: statement.excluded[name] for name in columns if name not in primary_key},
+    )
+
+
+def upsert_rows(session: Session, table: Table, rows: List[dict], chunk_size: int = DB_UPSERT_CHUNK) -> int:
+    """Insert or update `rows` (dicts with the same keys) with one executemany per chunk.
+
+    Unlike `session.merge`, there is no SELECT per row and no ORM unit of work: each chunk is a single
+    prepared statement run against all its rows. Runs in the session's transaction; the caller commits.
+    """
+    if not rows:
+        return 0
+    statement = upsert_statement(table, tuple(rows[0]))
+    for start in range(0, len(rows), chunk_size):
+        session.execute(statement, rows[start:start + chunk_size])
+    return len(rows)
+
@@ -1,94 +1,181 @@
-from typing import List
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Union
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
-from config import DB_PATH
-from parsers.city24_parser import City24Listing
-from parsers.kinnisvara24_parser import Kinnisvara24Listing
-from parsers.kvee_parser import KvEeListing
-from .models import KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel, Base
+from config import DB_PATH, DB_COMMIT_EVERY, DB_CACHE_SIZE_KB, CRAWL_RESUME_MAX_AGE_HOURS
+from metrics import get_metrics
+from parsers.batch import ListingBatch, listing_rows
+from parsers.common import ListingBase, ListingPage
+from parsers.incremental import IncrementalState
+from .bulk import upsert_rows
+from .history import PriceDrop, find_price_drops, record_changes
+from .journal import completed_pages, record_page, unfinished_crawl_run
+from .migrations import ensure_schema
+from .presence import changed_match_keys, only_on, update_presence
+from .models import KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel, CrawlRunModel, LISTING_MODELS
+
+# Column each portal sorts its search results by (newest first)
+TIMESTAMP_COLUMNS = {
+    'kvee': KvEeListingModel.date_activated,
+    'city24': City24ListingModel.date_published,
+    'kinnisvara24': Kinnisvara24ListingModel.created_at,
+}
+
+Listings = Union[ListingBatch, List[ListingBase]]
 
 
 class Database:
-    def __init__(self):
-        self.session = create_engine_and_session(DB_PATH)
-
-    def save_kvee_listings(self, listings: List[KvEeListing]):
-        for listing in listings:
-            db_listing = KvEeListingModel(
-                id=listing.id,
-                address=listing.address,
-                city=listing.city,
-                street_with_building=listing.street_with_building,
-                apartment_number=listing.apartment_number,
-                rooms=listing.rooms,
-                area_m2=listing.area_m2,
-                price=listing.price,
-                price_m2=listing.price_m2,
-                link=listing.link,
-                img_url=listing.img_url,
-                object_important_note=listing.object_important_note,
-                description=listing.description,
-                date_activated=listing.date_activated,
-                advertisement_level=listing.advertisement_level,
-                floor=listing.floor,
-                total_floors=listing.total_floors,
-                year_built=listing.year_built,
-            )
-            self.session.merge(db_listing)
-        self.session.commit()
-
-    def save_city24_listings(self, listings: List[City24Listing]):
-        for listing in listings:
-            db_listing = City24ListingModel(
-                id=listing.id,
-                address=listing.address,
-                city=listing.city,
-                street_with_building=listing.street_with_building,
-                apartment_number=listing.apartment_number,
-                rooms=listing.rooms,
-                area_m2=listing.area_m2,
-                price=listing.price,
-                price_m2=listing.price_m2,
-                link=listing.link,
-                img_url=listing.img_url,
-                object_important_note=listing.object_important_note,
-                date_published=listing.date_published,
-                floor=listing.floor,
-                total_floors=listing.total_floors,
-                year_built=listing.year_built,
-                latitude=listing.latitude,
-                longitude=listing.longitude,
-            )
-            self.session.merge(db_listing)
-        self.session.commit()
-
-    def save_kinnisvara24_listings(self, listings: List[Kinnisvara24Listing]):
-        for listing in listings:
-            db_listing = Kinnisvara24ListingModel(
-                id=listing.id,
-                address=listing.address,
-                city=listing.city,
-                street_with_building=listing.street_with_building,
-                apartment_number=listing.apartment_number,
-                rooms=listing.rooms,
-                area_m2=listing.area_m2,
-                price=listing.price,
-                price_m2=listing.price_m2,
-                link=listing.link,
-                img_url=listing.img_url,
-                created_at=listing.created_at
-            )
-            self.session.merge(db_listing)
-        self.session.commit()
+    """Listing storage. Safe to share between crawl threads: session access is serialized by `lock`.
+
+    Other threads that need their own connection (see database/writer.py) open sessions with `Session`.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.engine = create_database_engine(db_path)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.lock = threading.RLock()
+
+    def save_kvee_listings(self, listings: Listings, commit: bool = True):
+        self.save_rows(KvEeListingModel, listing_rows(listings), commit)
+
+    def save_city24_listings(self, listings: Listings, commit: bool = True):
+        self.save_rows(City24ListingModel, listing_rows(listings), commit)
+
+    def save_kinnisvara24_listings(self, listings: Listings, commit: bool = True):
+        self.save_rows(Kinnisvara24ListingModel, listing_rows(listings), commit)
+
+    def save_rows(self, model, rows: List[dict], commit: bool = True, crawled_at: Optional[datetime] = None):
+        """Insert or update listing rows; row keys are the listing fields, which match the model columns.
+        Price, area and note changes are first appended to the portal's history table, stamped with `crawled_at`
+        (default: now)."""
+        with self.lock:
+            write_listing_rows(self.session, model, rows, crawled_at or datetime.now())
+            if commit:
+                self.session.commit()
+
+    def save_listing_pages(self, portal: str, pages: Iterable[ListingPage],
+                           commit_every: int = DB_COMMIT_EVERY, crawl_run_id: Optional[int] = None) -> int:
+        """Save listings as the parser yields them, committing every `commit_every` rows.
+
+        Memory stays bounded by a few pages, and a failed crawl keeps everything committed before the failure;
+        the uncommitted rest is rolled back, so the shared session doesn't carry it into the next commit. With
+        `crawl_run_id` every page is also journaled, in the same transaction as its listings, so the run can be
+        resumed after the last committed page. Returns the number of saved listings.
+        """
+        model = LISTING_MODELS[portal]
+        metrics = get_metrics()
+        saved, uncommitted = 0, 0
+        try:
+            # Pages are fetched and parsed by the generator outside the lock
+            for page in pages:
+                with self.lock, metrics.timer(portal, 'write'):
+                    rows = listing_rows(page.listings)
+                    self.save_rows(model, rows, commit=False)
+                    if crawl_run_id is not None:
+                        record_page(self.session, crawl_run_id, portal, page.number, [row['id'] for row in rows])
+                    saved += len(page.listings)
+                    uncommitted += len(page.listings)
+                    if uncommitted >= commit_every:
+                        self.session.commit()
+                        uncommitted = 0
+            with self.lock, metrics.timer(portal, 'write'):
+                self.session.commit()
+        except BaseException:
+            with self.lock:
+                self.session.rollback()
+            raise
+        return saved
+
+    def load_incremental_state(self, portal: str) -> IncrementalState:
+        timestamp_column = TIMESTAMP_COLUMNS[portal]
+        id_column = timestamp_column.class_.id
+        with self.lock:
+            return IncrementalState.from_rows(self.session.query(id_column, timestamp_column))
+
+    def price_drops(self, portal: str, min_drop_pct: float, days: float) -> List[PriceDrop]:
+        """Listings of `portal` whose price dropped more than `min_drop_pct` % within the last `days` days."""
+        with self.lock:
+            return find_price_drops(self.session, LISTING_MODELS[portal], min_drop_pct, days)
+
+    def only_on(self, portal: str, among: Optional[List[str]] = None) -> List[dict]:
+        """Listings of `portal` whose building is on none of the other portals of `among` (default: all)."""
+        with self.lock:
+            return only_on(self.session, portal, among)
+
+    def start_crawl_run(self, portal: str, mode: str) -> int:
+        crawl_run = CrawlRunModel(portal=portal, mode=mode, started_at=datetime.now())
+        with self.lock:
+            self.session.add(crawl_run)
+            self.session.commit()
+            return crawl_run.id
+
+    def unfinished_crawl_run(self, portal: str,
+                             max_age: timedelta = timedelta(hours=CRAWL_RESUME_MAX_AGE_HOURS)) -> Optional[int]:
+        """Id of the portal's latest crawl run if it is a full crawl that never finished, started within `max_age`."""
+        with self.lock:
+            crawl_run = unfinished_crawl_run(self.session, portal, max_age)
+            return crawl_run.id if crawl_run else None
+
+    def completed_pages(self, crawl_run_id: int) -> int:
+        """Pages of the run, from page 1, whose listings are committed."""
+        with self.lock:
+            return completed_pages(self.session, crawl_run_id)
+
+    def finish_crawl_run(self, crawl_run_id: int):
+        with self.lock:
+            self.session.get(CrawlRunModel, crawl_run_id).finished_at = datetime.now()
+            self.session.commit()
+
+    def last_full_crawl_at(self, portal: str) -> Optional[datetime]:
+        """Start time of the last full crawl of `portal` that ran to completion."""
+        with self.lock:
+            crawl_run = self.session.query(CrawlRunModel) \
+                .filter(CrawlRunModel.portal == portal, CrawlRunModel.mode == 'full',
+                        CrawlRunModel.finished_at.isnot(None)) \
+                .order_by(CrawlRunModel.started_at.desc()) \
+                .first()
+        return crawl_run.started_at if crawl_run else None
 
     def close(self):
         self.session.close()
+        self.engine.dispose()
+
+
+def write_listing_rows(session: Session, model, rows: List[dict], crawled_at: datetime):
+    """Record changes in the history table, upsert `rows` stamped with `crawled_at`, then recount the cross-portal
+    presence of the match_keys that gained or lost listings. The caller commits."""
+    match_keys = changed_match_keys(session, model, rows)
+    record_changes(session, model, rows, crawled_at)
+    for row in rows:
+        row['crawled_at'] = crawled_at
+    upsert_rows(session, model.__table__, rows)
+    update_presence(session, match_keys)
+
+
+def create_database_engine(db_path: str) -> Engine:
+    url = make_url(db_path)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # Every connection to an in-memory database is a new, empty database: share a single one
+        engine = create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+    else:
+        engine = create_engine(url)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine, 'connect', _configure_sqlite_connection)
+    ensure_schema(engine)
+    return engine
 
 
-def create_engine_and_session(db_path: str):
-    engine = create_engine(db_path)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session()
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Tune SQLite for bulk writes: the WAL journal lets readers query while a crawl writes, and with WAL
+    `synchronous=NORMAL` syncs only at checkpoints instead of on every commit."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    cursor.close()
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from config import DB_UPSERT_CHUNK
+from .models import (KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel, KvEeListingHistoryModel,
+                     City24ListingHistoryModel, Kinnisvara24ListingHistoryModel)
+
+HISTORY_MODELS = {
+    KvEeListingModel: KvEeListingHistoryModel,
+    City24ListingModel: City24ListingHistoryModel,
+    Kinnisvara24ListingModel: Kinnisvara24ListingHistoryModel,
+}
+
+# A listing gets a history row when one of these changes (kinnisvara24.ee has no note)
+TRACKED_COLUMNS = ('price', 'price_m2', 'area_m2', 'object_important_note')
+
+
+@dataclass
+class PriceDrop:
+    listing_id: str
+    address: Optional[str]
+    link: Optional[str]
+    # Highest price in effect during the period
+    peak_price: int
+    price: int
+    drop_pct: float
+    # When the current price was first seen
+    changed_at: datetime
+
+
+def tracked_columns(model) -> List[str]:
+    history_table = HISTORY_MODELS[model].__table__
+    return [name for name in TRACKED_COLUMNS if name in history_table.columns]
+
+
+def record_changes(session: Session, model, rows: List[dict], crawled_at: datetime,
+                   chunk_size: int = DB_UPSERT_CHUNK) -> int:
+    """Append a history row for every listing in `rows` that is new or whose tracked columns differ from the
+    stored listing. Must run before `rows` are upserted. Returns the number of history rows.
+
+    Stored values are loaded with one `SELECT ... WHERE id IN (...)` per chunk and compared in memory, so an
+    unchanged crawl costs a read per chunk and writes nothing: a year of hourly crawls only grows the history
+    by the actual price and note changes. Runs in the session's transaction; the caller commits.
+    """
+    table = model.__table__
+    columns = tracked_columns(model)
+    # Values as of this call, so a listing repeated in `rows` is compared with its previous occurrence
+    latest = {}
+    changes = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        # Ids are stored as strings, some parsers produce ints
+        ids = [str(row['id']) for row in chunk]
+        query = select(table.c.id, *(table.c[name] for name in columns)) \
+            .where(table.c.id.in_([listing_id for listing_id in ids if listing_id not in latest]))
+        for stored in session.execute(query):
+            latest[stored[0]] = tuple(stored[1:])
+        for listing_id, row in zip(ids, chunk):
+            previous = latest.get(listing_id)
+            # A column missing from the row keeps its stored value (see bulk.upsert_statement)
+            values = tuple(row[name] if name in row else (previous[index] if previous else None)
+                           for index, name in enumerate(columns))
+            if values != previous:
+                changes.append({'listing_id': listing_id, 'crawled_at': crawled_at, **dict(zip(columns, values))})
+                latest[listing_id] = values
+    history_table = HISTORY_MODELS[model].__table__
+    for start in range(0, len(changes), chunk_size):
+        session.execute(insert(history_table), changes[start:start + chunk_size])
+    return len(changes)
+
+
+def find_price_drops(session: Session, model, min_drop_pct: float, days: float,
+                     now: Optional[datetime] = None) -> List[PriceDrop]:
+    """Listings whose current price is more than `min_drop_pct` % below the highest price they had in the last
+    `days` days (including the price in effect when the period started). Largest drops first.
+
+    Only listings with a history row in the period can have dropped, so the scan is limited to those through
+    the (listing_id, crawled_at) index.
+    """
+    table = model.__table__
+    history_table = HISTORY_MODELS[model].__table__
+    since = (now or datetime.now()) - timedelta(days=days)
+    changed_ids = select(history_table.c.listing_id).where(history_table.c.crawled_at >= since)
+    query = select(history_table.c.listing_id, history_table.c.crawled_at, history_table.c.price,
+                   table.c.address, table.c.link) \
+        .join(table, table.c.id == history_table.c.listing_id) \
+        .where(history_table.c.listing_id.in_(changed_ids)) \
+        .order_by(history_table.c.listing_id, history_table.c.crawled_at)
+
+    drops = []
+    for listing_id, history in groupby(session.execute(query), key=lambda row: row.listing_id):
+        history = list(history)
+        # The last row before the period holds the price in effect when it started
+        first = max((index for index, row in enumerate(history) if row.crawled_at < since), default=0)
+        history = history[first:]
+        current = history[-1]
+        prices = [row.price for row in history if row.price]
+        if not current.price or not prices:
+            continue
+        peak_price = max(prices)
+        drop_pct = (peak_price - current.price) / peak_price * 100
+        if drop_pct > min_drop_pct:
+            drops.append(PriceDrop(listing_id, current.address, current.link, peak_price, current.price,
+                                   drop_pct, _price_since(history)))
+    drops.sort(key=lambda drop: drop.drop_pct, reverse=True)
+    return drops
+
+
+def _price_since(history) -> datetime:
+    """When the last row's price was first seen, ignoring rows recorded for other columns."""
+    since = history[-1].crawled_at
+    for row in reversed(history):
+        if row.price != history[-1].price:
+            break
+        since = row.crawled_at
+    return since
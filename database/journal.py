@@ -0,0 +1,44 @@
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import CrawlPageModel, CrawlRunModel
+
+
+def record_page(session: Session, crawl_run_id: int, portal: str, page: int, listing_ids: List[str],
+                completed_at: Optional[datetime] = None):
+    """Journal `page` of a crawl run as saved. Runs in the session's transaction, so the caller commits it
+    together with the page's listings: a page is in the journal if and only if its listings are stored."""
+    session.merge(CrawlPageModel(crawl_run_id=crawl_run_id, page=page, portal=portal,
+                                 listing_ids=json.dumps([str(listing_id) for listing_id in listing_ids]),
+                                 completed_at=completed_at or datetime.now()))
+
+
+def completed_pages(session: Session, crawl_run_id: int) -> int:
+    """Number of consecutive pages, from page 1, the journal of the run has; the run resumes after them.
+
+    Pages are saved in search results order, so this is every journaled page unless a gap was left some other way.
+    """
+    pages = session.execute(select(CrawlPageModel.page).where(CrawlPageModel.crawl_run_id == crawl_run_id)
+                            .order_by(CrawlPageModel.page)).scalars()
+    completed = 0
+    for page in pages:
+        if page != completed + 1:
+            break
+        completed = page
+    return completed
+
+
+def unfinished_crawl_run(session: Session, portal: str, max_age: timedelta) -> Optional[CrawlRunModel]:
+    """The portal's latest crawl run if it is a full crawl that never finished and started within `max_age`."""
+    crawl_run = session.query(CrawlRunModel) \
+        .filter(CrawlRunModel.portal == portal) \
+        .order_by(CrawlRunModel.started_at.desc(), CrawlRunModel.id.desc()) \
+        .first()
+    if crawl_run is None or crawl_run.finished_at is not None or crawl_run.mode != 'full' \
+            or datetime.now() - crawl_run.started_at > max_age:
+        return None
+    return crawl_run
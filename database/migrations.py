@@ -0,0 +1,170 @@
+from datetime import datetime
+
+from sqlalchemy import Float, Integer, String, bindparam, delete, exists, func, insert, inspect, literal, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from parsers.common import build_match_key, extract_district
+from .history import HISTORY_MODELS, tracked_columns
+from .models import Base, LISTING_MODELS, ListingPresenceModel, SCHEMA_VERSION, SchemaVersionModel
+from .presence import rebuild_presence
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """Create missing tables and run the migrations, unless the database is already at SCHEMA_VERSION.
+
+    Opening an up-to-date database costs one query instead of the table inspections and backfill checks of every
+    migration. Returns whether the schema was updated.
+    """
+    table = SchemaVersionModel.__table__
+    if inspect(engine).has_table(table.name):
+        with engine.connect() as connection:
+            version = connection.execute(select(func.max(table.c.version))).scalar()
+        # A database of a newer version is left alone as well
+        if version is not None and version >= SCHEMA_VERSION:
+            return False
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(delete(table))
+        connection.execute(insert(table).values(version=SCHEMA_VERSION, migrated_at=datetime.now()))
+    return True
+
+
+def migrate(engine: Engine):
+    """Bring tables created by an older version up to date with the models."""
+    add_missing_columns(engine)
+    convert_text_columns_to_numbers(engine)
+    create_missing_indexes(engine)
+    backfill_match_keys(engine)
+    backfill_districts(engine)
+    backfill_history(engine)
+    backfill_crawled_at(engine)
+    backfill_presence(engine)
+
+
+def add_missing_columns(engine: Engine):
+    """Add model columns missing from tables created by an older version.
+
+    `create_all` only creates missing tables; columns added to an existing model later would otherwise be absent
+    from databases created before. New columns are nullable, so existing rows get NULL until the next crawl.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def convert_text_columns_to_numbers(engine: Engine):
+    """Rebuild tables whose numeric model columns were created as text by an older version (city24 coordinates).
+
+    SQLite can't change a column's type, so the table is renamed, created again from the model, refilled and the
+    old one dropped, in one transaction. The numeric columns convert well-formed numbers on insert; values that
+    aren't numbers stay text and are set to NULL.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_types = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        converted = [column.name for column in table.columns
+                     if isinstance(column.type, (Integer, Float))
+                     and isinstance(existing_types.get(column.name), String)]
+        if not converted:
+            continue
+        old_name = f'{table.name}_before_migration'
+        columns = ', '.join(column.name for column in table.columns if column.name in existing_types)
+        indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+        with engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+            # Index names are global in SQLite: free them for the new table
+            for index in indexes:
+                connection.execute(text(f'DROP INDEX {index}'))
+            table.create(connection)
+            connection.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}'))
+            for name in converted:
+                connection.execute(text(f"UPDATE {table.name} SET {name} = NULL WHERE typeof({name}) = 'text'"))
+            connection.execute(text(f'DROP TABLE {old_name}'))
+
+
+def create_missing_indexes(engine: Engine):
+    """Create model indexes missing from existing tables (`create_all` only indexes the tables it creates)."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def backfill_match_keys(engine: Engine):
+    """Compute `match_key` for rows stored before it existed."""
+    with engine.begin() as connection:
+        for model in LISTING_MODELS.values():
+            table = model.__table__
+            rows = connection.execute(
+                table.select().with_only_columns(table.c.id, table.c.city, table.c.street_with_building)
+                .where(table.c.match_key.is_(None))
+            ).all()
+            updates = [{'row_id': row.id, 'key': build_match_key(row.city, row.street_with_building)} for row in rows]
+            updates = [update for update in updates if update['key']]
+            if updates:
+                connection.execute(
+                    table.update().where(table.c.id == bindparam('row_id')).values(match_key=bindparam('key')),
+                    updates,
+                )
+
+
+def backfill_districts(engine: Engine):
+    """Compute `district` for rows stored before it existed."""
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if 'district' not in table.columns:
+                continue
+            rows = connection.execute(
+                table.select().with_only_columns(table.c.id, table.c.address).where(table.c.district.is_(None))
+            ).all()
+            updates = [{'row_id': row.id, 'district': extract_district(row.address)} for row in rows]
+            updates = [update for update in updates if update['district']]
+            if updates:
+                connection.execute(
+                    table.update().where(table.c.id == bindparam('row_id')).values(district=bindparam('district')),
+                    updates,
+                )
+
+
+def backfill_history(engine: Engine):
+    """Record the stored values of listings without history (saved before it existed) as their first history row,
+    so a later price change has a previous price to compare with."""
+    now = datetime.now()
+    with engine.begin() as connection:
+        for model, history_model in HISTORY_MODELS.items():
+            table, history_table = model.__table__, history_model.__table__
+            columns = tracked_columns(model)
+            without_history = select(table.c.id, literal(now), *(table.c[name] for name in columns)) \
+                .where(~exists().where(history_table.c.listing_id == table.c.id))
+            connection.execute(history_table.insert().from_select(['listing_id', 'crawled_at', *columns],
+                                                                  without_history))
+
+
+def backfill_crawled_at(engine: Engine):
+    """Set `crawled_at` of rows saved before it existed to the time of their latest history row."""
+    with engine.begin() as connection:
+        for model, history_model in HISTORY_MODELS.items():
+            table, history_table = model.__table__, history_model.__table__
+            last_seen = select(func.max(history_table.c.crawled_at)) \
+                .where(history_table.c.listing_id == table.c.id).scalar_subquery()
+            connection.execute(table.update().where(table.c.crawled_at.is_(None)).values(crawled_at=last_seen))
+
+
+def backfill_presence(engine: Engine):
+    """Count the listings stored before listing_presence existed; afterwards every write keeps it up to date."""
+    with Session(engine) as session:
+        if session.execute(select(ListingPresenceModel.match_key).limit(1)).first() is None:
+            if rebuild_presence(session):
+                session.commit()
@@ -1,8 +1,13 @@
-from sqlalchemy import Column, String, Integer, Text, Float
+from sqlalchemy import Column, String, Integer, BigInteger, Text, Float, DateTime, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import declared_attr
 
 Base = declarative_base()
 
+# Version of the schema the models and database/migrations.py produce. Bump it whenever a model or a migration
+# changes: create_all and the migrations only run on databases stamped with an older version (see ensure_schema).
+SCHEMA_VERSION = 1
+
 
 class ListingModelBase:
     # NB! This is a mixin. It is not a model.
@@ -17,6 +22,17 @@ class ListingModelBase:
     price_m2 = Column(Integer)
     link = Column(Text)
     img_url = Column(Text)
+    # parsers.common.build_match_key(city, street_with_building): the same building on every portal
+    match_key = Column(String)
+    # parsers.common.extract_district(address): Tallinn district, the same name on every portal
+    district = Column(String)
+    # Time of the last crawl that saw the listing
+    crawled_at = Column(DateTime)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (Index(f'ix_{cls.__tablename__}_match_key', 'match_key', 'apartment_number'),
+                Index(f'ix_{cls.__tablename__}_crawled_at', 'crawled_at'))
 
 
 class KvEeListingModel(Base, ListingModelBase):
@@ -29,6 +45,10 @@ class KvEeListingModel(Base, ListingModelBase):
     floor = Column(Integer)
     total_floors = Column(Integer)
     year_built = Column(Integer)
+    heating = Column(String)
+    condition = Column(String)
+    energy_class = Column(String)
+    balcony = Column(Boolean)
 
 
 class City24ListingModel(Base, ListingModelBase):
@@ -39,11 +59,104 @@ class City24ListingModel(Base, ListingModelBase):
     floor = Column(Integer)
     total_floors = Column(Integer)
     year_built = Column(Integer)
-    latitude = Column(String)
-    longitude = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
 
 
 class Kinnisvara24ListingModel(Base, ListingModelBase):
     __tablename__ = 'kinnisvara24_listing'
 
     created_at = Column(String)
+
+
+LISTING_MODELS = {
+    'kvee': KvEeListingModel,
+    'city24': City24ListingModel,
+    'kinnisvara24': Kinnisvara24ListingModel,
+}
+
+
+class ListingHistoryModelBase:
+    # NB! This is a mixin. It is not a model.
+    # Append-only: a row per listing whenever a tracked column changes (see database/history.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    listing_id = Column(String, nullable=False)
+    crawled_at = Column(DateTime, nullable=False)
+    price = Column(Integer)
+    price_m2 = Column(Integer)
+    area_m2 = Column(Float)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (Index(f'ix_{cls.__tablename__}_listing_id', 'listing_id', 'crawled_at'),
+                Index(f'ix_{cls.__tablename__}_crawled_at', 'crawled_at'))
+
+
+class KvEeListingHistoryModel(Base, ListingHistoryModelBase):
+    __tablename__ = 'kvee_listing_history'
+
+    object_important_note = Column(Text)
+
+
+class City24ListingHistoryModel(Base, ListingHistoryModelBase):
+    __tablename__ = 'city24_listing_history'
+
+    object_important_note = Column(Text)
+
+
+class Kinnisvara24ListingHistoryModel(Base, ListingHistoryModelBase):
+    __tablename__ = 'kinnisvara24_listing_history'
+
+
+class CrawlRunModel(Base):
+    __tablename__ = 'crawl_run'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    portal = Column(String, nullable=False, index=True)
+    mode = Column(String, nullable=False)  # 'full' or 'incremental'
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+
+
+class CrawlPageModel(Base):
+    __tablename__ = 'crawl_page'
+
+    # Journal of a crawl run (database/journal.py): one row per search results page, written in the transaction
+    # that saves the page's listings
+    crawl_run_id = Column(Integer, primary_key=True)
+    page = Column(Integer, primary_key=True)  # 1-based page number, in search results order
+    portal = Column(String, nullable=False)
+    listing_ids = Column(Text, nullable=False)  # JSON array
+    completed_at = Column(DateTime, nullable=False)
+
+
+class SchemaVersionModel(Base):
+    __tablename__ = 'schema_version'
+
+    # One row: the SCHEMA_VERSION the database was last created or migrated to
+    version = Column(Integer, primary_key=True)
+    migrated_at = Column(DateTime, nullable=False)
+
+
+class ImageFingerprintModel(Base):
+    __tablename__ = 'image_fingerprint'
+
+    # Listing photo URL (img_url of any listing table)
+    url = Column(Text, primary_key=True)
+    # 64-bit difference hash of the photo (duplicates.dhash), stored as a signed integer; NULL if the photo
+    # couldn't be downloaded (4xx) or decoded
+    dhash = Column(BigInteger)
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class ListingPresenceModel(Base):
+    __tablename__ = 'listing_presence'
+
+    # Listings per portal with this match_key, recounted for the affected keys on every listing write
+    # (database/presence.py); keys without listings have no row
+    match_key = Column(String, primary_key=True)
+    kvee = Column(Integer, nullable=False, default=0)
+    city24 = Column(Integer, nullable=False, default=0)
+    kinnisvara24 = Column(Integer, nullable=False, default=0)
+    # The portal, if the match_key has listings on exactly one portal
+    only_on = Column(String, index=True)
@@ -0,0 +1,107 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from config import DB_UPSERT_CHUNK
+from .bulk import upsert_rows
+from .models import LISTING_MODELS, ListingPresenceModel
+
+
+def changed_match_keys(session: Session, model, rows: List[dict], chunk_size: int = DB_UPSERT_CHUNK) -> Set[str]:
+    """match_keys whose listing count on the portal of `model` changes when `rows` are upserted: keys of new
+    listings, and the old and new keys of listings whose address changed. Must run before the upsert.
+
+    Stored keys are loaded with one `SELECT ... WHERE id IN (...)` per chunk, so re-crawling unchanged listings
+    returns nothing and leaves listing_presence untouched.
+    """
+    table = model.__table__
+    # Keys as of this call, so a listing repeated in `rows` is compared with its previous occurrence
+    latest = {}
+    changed = set()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        ids = [str(row['id']) for row in chunk]
+        query = select(table.c.id, table.c.match_key) \
+            .where(table.c.id.in_([listing_id for listing_id in ids if listing_id not in latest]))
+        latest.update(session.execute(query).all())
+        for listing_id, row in zip(ids, chunk):
+            stored = listing_id in latest
+            # A row without match_key keeps the stored one (see bulk.upsert_statement)
+            key = row['match_key'] if 'match_key' in row else latest.get(listing_id)
+            if not stored or key != latest[listing_id]:
+                changed.update(filter(None, (latest.get(listing_id), key)))
+            latest[listing_id] = key
+    return changed
+
+
+def update_presence(session: Session, match_keys: Iterable[str], chunk_size: int = DB_UPSERT_CHUNK) -> int:
+    """Recount the listings of every portal for `match_keys` and store the counts in listing_presence.
+
+    One statement per chunk, with a grouped `WHERE match_key IN (...)` per portal answered from the match_key
+    indexes, so a write only touches the presence of the buildings whose listings it added or moved. Runs in the
+    session's transaction; the caller commits. Returns the number of keys recounted.
+    """
+    keys = sorted({key for key in match_keys if key})
+    presence_table = ListingPresenceModel.__table__
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        counts = {key: dict.fromkeys(LISTING_MODELS, 0) for key in chunk}
+        counts_query = union_all(*(
+            select(literal(portal), model.match_key, func.count()).where(model.match_key.in_(chunk))
+            .group_by(model.match_key)
+            for portal, model in LISTING_MODELS.items()))
+        for portal, key, count in session.execute(counts_query):
+            counts[key][portal] = count
+        upsert_rows(session, presence_table, [_presence_row(key, portal_counts)
+                                              for key, portal_counts in counts.items()
+                                              if any(portal_counts.values())])
+        gone = [key for key, portal_counts in counts.items() if not any(portal_counts.values())]
+        if gone:
+            session.execute(delete(presence_table).where(presence_table.c.match_key.in_(gone)))
+    return len(keys)
+
+
+def rebuild_presence(session: Session) -> int:
+    """Recount every match_key from scratch, e.g. for listings stored before listing_presence existed."""
+    counts: Dict[str, Dict[str, int]] = {}
+    for portal, model in LISTING_MODELS.items():
+        table = model.__table__
+        for key, count in session.execute(
+                select(table.c.match_key, func.count()).where(table.c.match_key.isnot(None))
+                .group_by(table.c.match_key)):
+            counts.setdefault(key, dict.fromkeys(LISTING_MODELS, 0))[portal] = count
+    session.execute(delete(ListingPresenceModel.__table__))
+    upsert_rows(session, ListingPresenceModel.__table__,
+                [_presence_row(key, portal_counts) for key, portal_counts in counts.items()])
+    return len(counts)
+
+
+def only_on(session: Session, portal: str, among: Optional[List[str]] = None) -> List[dict]:
+    """Listings of `portal` whose building (match_key) has no listing on the other portals of `among`
+    (default: all portals).
+
+    Read from listing_presence instead of an anti-join of the listing tables: for all portals an index lookup
+    on `only_on`, for a subset a filter on the counts. Listings without a match_key can't be matched with
+    anything and are always included, like in `compare --no-fuzzy`.
+    """
+    presence = ListingPresenceModel.__table__
+    table = LISTING_MODELS[portal].__table__
+    others = [other for other in (among or LISTING_MODELS) if other != portal]
+    if set(others) == set(LISTING_MODELS) - {portal}:
+        alone = presence.c.only_on == portal
+    else:
+        alone = presence.c[portal] > 0
+        for other in others:
+            alone &= presence.c[other] == 0
+    alone_keys = select(presence.c.match_key).where(alone)
+    rows = session.execute(
+        select(table).where(or_(table.c.match_key.in_(alone_keys), table.c.match_key.is_(None)))
+        .order_by(table.c.id)
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def _presence_row(key: str, counts: Dict[str, int]) -> dict:
+    portals = [portal for portal, count in counts.items() if count]
+    return {'match_key': key, **counts, 'only_on': portals[0] if len(portals) == 1 else None}
@@ -0,0 +1,155 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from queue import Queue
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import DB_WRITE_QUEUE_SIZE
+from metrics import get_metrics
+from parsers.batch import listing_rows
+from parsers.common import ListingPage
+from .database import Database, LISTING_MODELS, Listings, write_listing_rows
+from .journal import record_page
+
+
+@dataclass
+class WriterStats:
+    batches: int
+    rows: int
+    # Batches waiting in the queue, sampled whenever one is submitted
+    max_queue_depth: int
+    mean_queue_depth: float
+    # Time to write and commit one batch, in seconds
+    mean_commit_latency: float
+    p95_commit_latency: float
+    max_commit_latency: float
+
+
+class DatabaseWriter:
+    """Writes listing batches to `db` on a dedicated thread, one transaction per batch.
+
+    Crawl threads hand batches over with `submit` and go back to fetching and parsing while the previous
+    batch is written. `submit` blocks while `queue_size` batches are waiting, so a slow disk slows the
+    crawl down instead of piling up parsed pages in memory. The writer has its own connection, separate
+    from `db.session`.
+
+    Portals crawled in parallel share the writer but not its failures: a failed write is raised by the next
+    `submit` or `flush` of the batch's portal only, and that portal's later batches are dropped until its `flush`
+    has raised the error. `flush(portal)` only waits for the batches of `portal`.
+    """
+
+    def __init__(self, db: Database, queue_size: int = DB_WRITE_QUEUE_SIZE):
+        self.session = db.Session()
+        self.queue = Queue(maxsize=queue_size)
+        # Per portal: batches submitted but not yet written (or dropped), and the first failed write
+        self.pending: Dict[str, int] = {}
+        self.errors: Dict[str, Exception] = {}
+        self.condition = threading.Condition()
+        self.rows = 0
+        self.queue_depths: List[int] = []
+        self.commit_latencies: List[float] = []
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, portal: str, listings: Listings, crawl_run_id: Optional[int] = None,
+               page: Optional[int] = None):
+        """Queue a batch; with `crawl_run_id` it is journaled as `page` of that run when it is committed."""
+        self._raise_error(portal)
+        with self.condition:
+            self.pending[portal] = self.pending.get(portal, 0) + 1
+        self.queue.put((portal, listings, crawl_run_id, page))
+        self.queue_depths.append(self.queue.qsize())
+
+    def save_listing_pages(self, portal: str, pages: Iterable[ListingPage], crawl_run_id: Optional[int] = None) -> int:
+        """Queue every page as its own batch, journaled under `crawl_run_id` if given, and wait until all are
+        committed. Returns the number of listings."""
+        saved = 0
+        try:
+            for page in pages:
+                self.submit(portal, page.listings, crawl_run_id, page.number)
+                saved += len(page.listings)
+        except BaseException:
+            # The crawl (or an earlier write) failed: let the queued pages commit, and don't leave a write error
+            # behind for the next crawl of `portal`
+            self._wait(portal)
+            with self.condition:
+                self.errors.pop(portal, None)
+            raise
+        self.flush(portal)
+        return saved
+
+    def flush(self, portal: Optional[str] = None):
+        """Wait until every submitted batch of `portal` (of all portals if None) is written, and raise its
+        failed write if there was one."""
+        self._wait(portal)
+        with self.condition:
+            errors = [self.errors.pop(failed) for failed in list(self.errors) if portal in (None, failed)]
+        if errors:
+            raise RuntimeError(f'Database writer failed: {errors[0]}') from errors[0]
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.session.close()
+
+    def stats(self) -> WriterStats:
+        latencies = np.array(self.commit_latencies or [0.0])
+        depths = self.queue_depths or [0]
+        return WriterStats(
+            batches=len(self.commit_latencies),
+            rows=self.rows,
+            max_queue_depth=max(depths),
+            mean_queue_depth=sum(depths) / len(depths),
+            mean_commit_latency=float(latencies.mean()),
+            p95_commit_latency=float(np.percentile(latencies, 95)),
+            max_commit_latency=float(latencies.max()),
+        )
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            portal = item[0]
+            try:
+                if portal not in self.errors:
+                    self._write(*item)
+            except Exception as e:
+                self.session.rollback()
+                with self.condition:
+                    self.errors[portal] = e
+            finally:
+                with self.condition:
+                    self.pending[portal] -= 1
+                    self.condition.notify_all()
+
+    def _write(self, portal: str, listings: Listings, crawl_run_id: Optional[int], page: Optional[int]):
+        started = time.perf_counter()
+        rows = listing_rows(listings)
+        write_listing_rows(self.session, LISTING_MODELS[portal], rows, datetime.now())
+        if crawl_run_id is not None:
+            record_page(self.session, crawl_run_id, portal, page, [row['id'] for row in rows])
+        self.session.commit()
+        latency = time.perf_counter() - started
+        self.commit_latencies.append(latency)
+        get_metrics().observe(portal, 'write', latency)
+        self.rows += len(rows)
+
+    def _wait(self, portal: Optional[str]):
+        with self.condition:
+            self.condition.wait_for(lambda: not (self.pending.get(portal, 0) if portal is not None
+                                                 else sum(self.pending.values())))
+
+    def _raise_error(self, portal: str):
+        error = self.errors.get(portal)
+        if error is not None:
+            raise RuntimeError(f'Database writer failed: {error}') from error
+
+
+def format_writer_stats(stats: WriterStats) -> str:
+    return (f"DB writer: {stats.batches} batches, {stats.rows} rows, queue depth max {stats.max_queue_depth} "
+            f"(mean {stats.mean_queue_depth:.1f}), commit latency mean {stats.mean_commit_latency * 1000:.1f} ms, "
+            f"p95 {stats.p95_commit_latency * 1000:.1f} ms, max {stats.max_commit_latency * 1000:.1f} ms")
@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import literal, null, select
+
+from config import DETECT_FLOOR_BANDS, DETECT_YEAR_BANDS, DETECT_MIN_GROUP, DETECT_MIN_Z
+from database import Database
+from database.database import LISTING_MODELS
+
+# Robust z-score: 0.6745 * (x - median) / MAD is comparable to a standard score for normally distributed prices
+MAD_SCALE = 0.6745
+MAX_ROOMS = 5
+
+DETECT_COLUMNS = ['id', 'district', 'match_key', 'apartment_number', 'rooms', 'area_m2', 'floor', 'year_built',
+                  'price_m2', 'link']
+
+
+@dataclass
+class Outlier:
+    portal: str
+    listing_id: str
+    district: str
+    rooms: Optional[int]
+    floor: Optional[int]
+    year_built: Optional[int]
+    price_m2: int
+    # Median price_m2 of the comparison group and the listing's robust z-score in it
+    baseline: float
+    z: float
+    group_size: int
+    link: Optional[str]
+
+
+def load_listing_arrays(db: Database, portals: List[str]) -> Dict[str, np.ndarray]:
+    """The listings of `portals` as one array per column (plus `portal`), with NaN for missing numbers.
+
+    Only listings with a district and a price per m² can be compared; portals without floor or year_built
+    (kinnisvara24.ee) get NaN there.
+    """
+    rows = []
+    with db.lock:
+        for portal in portals:
+            table = LISTING_MODELS[portal].__table__
+            columns = [table.c[name] if name in table.c else null().label(name) for name in DETECT_COLUMNS]
+            rows.extend(db.session.execute(
+                select(literal(portal).label('portal'), *columns)
+                .where(table.c.district.isnot(None), table.c.price_m2 > 0)
+            ).all())
+    columns = dict(zip(['portal'] + DETECT_COLUMNS, zip(*rows) if rows else [()] * (len(DETECT_COLUMNS) + 1)))
+    return {
+        **{name: np.array(columns[name], dtype=object)
+           for name in ['portal', 'id', 'district', 'match_key', 'apartment_number', 'link']},
+        **{name: _numbers(columns[name]) for name in ['rooms', 'area_m2', 'floor', 'year_built', 'price_m2']},
+    }
+
+
+def group_keys(listings: Dict[str, np.ndarray]):
+    """Integer keys of the (district, rooms, floor band, year band) groups and the coarser (district, rooms) ones.
+
+    Rooms above MAX_ROOMS share a group; unknown rooms, floors and years are a band of their own.
+    """
+    district = np.unique(listings['district'].astype(str), return_inverse=True)[1].astype(np.int64)
+    rooms = np.nan_to_num(np.clip(listings['rooms'], 0, MAX_ROOMS), nan=0).astype(np.int64)
+    floor_band = _bands(listings['floor'], DETECT_FLOOR_BANDS)
+    year_band = _bands(listings['year_built'], DETECT_YEAR_BANDS)
+    coarse = district * (MAX_ROOMS + 1) + rooms
+    fine = (coarse * (len(DETECT_FLOOR_BANDS) + 2) + floor_band) * (len(DETECT_YEAR_BANDS) + 2) + year_band
+    return fine, coarse
+
+
+def robust_baselines(keys: np.ndarray, values: np.ndarray):
+    """Median and median absolute deviation of `values` in each group of equal `keys`.
+
+    Returns the sorted group keys with the median, MAD and size of each group. One sort by (key, value) puts
+    every group in a contiguous, ordered run, so all medians are read at once at the middle of each run; the
+    deviations from the medians are sorted the same way for the MADs.
+    """
+    order = np.lexsort((values, keys))
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else \
+        np.array([], dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(keys)])
+    group = np.empty(len(keys), dtype=np.int64)
+    group[order] = np.repeat(np.arange(len(starts)), counts)
+
+    medians = _run_medians(values[order], starts, counts)
+    deviations = np.abs(values - medians[group])
+    # Groups are numbered in key order, so sorting by group gives the same runs
+    mads = _run_medians(deviations[np.lexsort((deviations, group))], starts, counts)
+    return sorted_keys[starts], medians, mads, counts
+
+
+def unique_apartments(listings: Dict[str, np.ndarray]) -> np.ndarray:
+    """Positions of the first listing of every apartment.
+
+    An apartment advertised on several portals (same building, apartment number, rooms and area) would otherwise
+    count several times in its group and shrink the MAD. Listings without a match key count as unique.
+    """
+    count = len(listings['id'])
+    if count == 0:
+        return np.array([], dtype=np.int64)
+    building = np.unique(listings['match_key'].astype(str), return_inverse=True)[1].astype(np.int64)
+    building = np.where(np.equal(listings['match_key'], None), -1 - np.arange(count), building)
+    apartment = np.unique(listings['apartment_number'].astype(str), return_inverse=True)[1]
+    rooms = np.nan_to_num(listings['rooms'], nan=-1)
+    area = np.round(np.nan_to_num(listings['area_m2'], nan=-1))
+    return np.sort(np.unique(np.stack([building, apartment, rooms, area], axis=1), axis=0, return_index=True)[1])
+
+
+def find_outliers(listings: Dict[str, np.ndarray], min_z: float = DETECT_MIN_Z,
+                  min_group: int = DETECT_MIN_GROUP) -> List[Outlier]:
+    """Listings whose price_m2 is at least `min_z` robust standard deviations from the median of their group,
+    most underpriced first.
+
+    A listing is compared with its (district, rooms, floor band, year band) group, or with its (district, rooms)
+    group if that one has fewer than `min_group` apartments; smaller groups and groups where most apartments
+    share one price (MAD 0) are not judged. Baselines count every apartment once (see `unique_apartments`).
+    """
+    prices = listings['price_m2']
+    fine, coarse = group_keys(listings)
+    apartments = unique_apartments(listings)
+    fine_median, fine_mad, fine_count = _group_stats(fine, *robust_baselines(fine[apartments], prices[apartments]))
+    coarse_median, coarse_mad, coarse_count = _group_stats(
+        coarse, *robust_baselines(coarse[apartments], prices[apartments]))
+    use_fine = fine_count >= min_group
+    median = np.where(use_fine, fine_median, coarse_median)
+    mad = np.where(use_fine, fine_mad, coarse_mad)
+    count = np.where(use_fine, fine_count, coarse_count)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = MAD_SCALE * (prices - median) / mad
+    judged = (count >= min_group) & (mad > 0)
+    positions = np.flatnonzero(judged & (np.abs(z) >= min_z))
+    positions = positions[np.argsort(z[positions], kind='stable')]
+    return [Outlier(listings['portal'][i], listings['id'][i], listings['district'][i], _value(listings['rooms'][i]),
+                    _value(listings['floor'][i]), _value(listings['year_built'][i]), int(prices[i]),
+                    float(median[i]), float(z[i]), int(count[i]), listings['link'][i])
+            for i in positions]
+
+
+def _group_stats(keys: np.ndarray, group_keys: np.ndarray, medians: np.ndarray, mads: np.ndarray,
+                 counts: np.ndarray):
+    """Median, MAD and size of the group of each of `keys`; NaN and 0 for keys without a group."""
+    if not len(group_keys):
+        return np.full(len(keys), np.nan), np.full(len(keys), np.nan), np.zeros(len(keys), dtype=np.int64)
+    positions = np.minimum(np.searchsorted(group_keys, keys), len(group_keys) - 1)
+    found = group_keys[positions] == keys
+    return (np.where(found, medians[positions], np.nan), np.where(found, mads[positions], np.nan),
+            np.where(found, counts[positions], 0))
+
+
+def _run_medians(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+
+
+def _bands(values: np.ndarray, boundaries: List[int]) -> np.ndarray:
+    """0 for unknown values, then 1 + the number of boundaries at or below the value."""
+    return np.where(np.isnan(values), 0, np.digitize(values, boundaries) + 1).astype(np.int64)
+
+
+def _numbers(values) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _value(number: float) -> Optional[int]:
+    return None if np.isnan(number) else int(number)
+
+
+def format_outliers(outliers: List[Outlier], limit: int) -> str:
+    lines = [f"{'portal':<13} {'listing':<12} {'district':<14} {'rooms':>5} {'floor':>5} {'built':>5} "
+             f"{'€/m²':>6} {'median':>7} {'z':>6} {'group':>5}  link"]
+    for outlier in outliers[:limit]:
+        lines.append(f"{outlier.portal:<13} {outlier.listing_id:<12} {outlier.district:<14} "
+                     f"{_optional(outlier.rooms):>5} {_optional(outlier.floor):>5} {_optional(outlier.year_built):>5} "
+                     f"{outlier.price_m2:>6} "
+                     f"{outlier.baseline:>7.0f} {outlier.z:>6.1f} {outlier.group_size:>5}  {outlier.link or ''}")
+    return '\n'.join(lines)
+
+
+def _optional(value) -> str:
+    return '-' if value is None else str(value)
@@ -0,0 +1,329 @@
+import hashlib
+import io
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import zip_longest
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from PIL import Image
+from sqlalchemy import exists, select
+
+from config import IMAGE_CACHE_DIR, IMAGE_CONCURRENCY, IMAGE_MAX_DISTANCE, IMAGE_COMMON_HASH_LISTINGS, DB_COMMIT_EVERY
+from database import Database
+from database.bulk import upsert_rows
+from database.database import LISTING_MODELS
+from database.models import ImageFingerprintModel
+from parsers.http_client import HttpClient
+from parsers.pagination import fetch_pages
+
+# The difference hash compares neighbouring pixels of a HASH_SIZE x HASH_SIZE grayscale thumbnail: 64 bits
+HASH_SIZE = 8
+
+
+@dataclass
+class FingerprintResult:
+    # Distinct photo URLs of the listings
+    urls: int
+    # Already fingerprinted on a previous run: not downloaded again
+    known: int = 0
+    downloaded: int = 0
+    # Hashed from the image cache without a download
+    cached: int = 0
+    # Stored without a hash (4xx, not an image) and not retried
+    failed: int = 0
+    # Connection errors and 5xx that outlasted the client's retries: retried on the next run
+    errors: int = 0
+
+
+@dataclass
+class ListingImage:
+    portal: str
+    listing_id: str
+    match_key: Optional[str]
+    apartment_number: Optional[str]
+    link: Optional[str]
+
+
+@dataclass
+class ImageDuplicate:
+    """Two listings on different portals with the same (or nearly the same) photo."""
+    portal: str
+    listing_id: str
+    other_portal: str
+    other_listing_id: str
+    # Differing bits of the two photos' hashes
+    distance: int
+    # Whether address matching (match_key and apartment number) already pairs the listings
+    same_address: bool
+    link: Optional[str]
+    other_link: Optional[str]
+
+
+class ImageCache:
+    """Downloaded photos on disk, one file per URL, named by the SHA-1 of the URL."""
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        # 256 subdirectories keep directory listings short with hundreds of thousands of photos
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, url: str) -> Optional[bytes]:
+        try:
+            with open(self.path(url), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, content: bytes):
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name first, so a crash never leaves a truncated photo behind
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+
+class HashIndex:
+    """Multi-index hashing: 64-bit hashes indexed for lookups within a Hamming distance of `max_distance`.
+
+    Every hash is cut into max_distance + 1 chunks of bits. Two hashes that differ in at most max_distance bits
+    are equal in at least one chunk (pigeonhole principle), so the candidates of a lookup are the hashes sharing
+    a chunk with it: one binary search per chunk in the sorted chunk values, then the exact distance of only those
+    candidates. That is well under a millisecond per lookup in 100k hashes, where a BK-tree still visits most of
+    its nodes at this distance.
+    """
+
+    def __init__(self, values, max_distance: int = IMAGE_MAX_DISTANCE):
+        self.values = np.array(sorted(set(values)), dtype=np.uint64)
+        self.max_distance = max_distance
+        bounds = np.linspace(0, HASH_SIZE * HASH_SIZE, max_distance + 2).astype(int)
+        self.chunks = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+        self.tables = []
+        for start, stop in self.chunks:
+            keys = (self.values >> np.uint64(start)) & np.uint64((1 << (stop - start)) - 1)
+            order = np.argsort(keys, kind='stable')
+            chunk_values, starts = np.unique(keys[order], return_index=True)
+            self.tables.append((chunk_values, starts, np.r_[starts[1:], len(keys)], order))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def search(self, value: int) -> List[Tuple[int, int]]:
+        """(distance, hash) of every hash within `max_distance` of `value`, closest first."""
+        candidates = []
+        for (start, stop), (chunk_values, starts, ends, order) in zip(self.chunks, self.tables):
+            key = (value >> start) & ((1 << (stop - start)) - 1)
+            position = np.searchsorted(chunk_values, key)
+            if position < len(chunk_values) and chunk_values[position] == key:
+                candidates.append(order[starts[position]:ends[position]])
+        if not candidates:
+            return []
+        candidates = np.unique(np.concatenate(candidates))
+        distances = _bit_counts(self.values[candidates] ^ np.uint64(value))
+        close = distances <= self.max_distance
+        return sorted(zip(distances[close].tolist(), self.values[candidates[close]].tolist()))
+
+
+def hamming(value: int, other: int) -> int:
+    return bin(value ^ other).count('1')
+
+
+# Set bits of every byte value
+_BYTE_BIT_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def _bit_counts(values: np.ndarray) -> np.ndarray:
+    """Set bits of each uint64 of `values`."""
+    return _BYTE_BIT_COUNTS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def dhash(content: bytes) -> int:
+    """64-bit difference hash of an image: one bit per pair of horizontally neighbouring pixels of a 9x8 grayscale
+    thumbnail, set where brightness increases.
+
+    The thumbnail keeps only the photo's coarse structure, so resized, re-encoded or slightly brightened copies
+    hash to the same or nearly the same bits. Raises OSError for content that isn't an image.
+    """
+    image = Image.open(io.BytesIO(content))
+    # JPEGs are decoded at a fraction of their size, which is all a 9x8 thumbnail needs and several times faster
+    image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    thumbnail = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def pending_image_urls(db: Database, portals: List[str]) -> Tuple[Dict[str, str], int]:
+    """Photo URLs of the listings of `portals` without a fingerprint (mapped to the portal of their first listing),
+    and the number of distinct photo URLs that already have one."""
+    fingerprint = ImageFingerprintModel.__table__
+    pending = {}
+    known = set()
+    with db.lock:
+        for portal in portals:
+            table = LISTING_MODELS[portal].__table__
+            rows = db.session.execute(
+                select(table.c.img_url, exists().where(fingerprint.c.url == table.c.img_url))
+                .where(table.c.img_url.isnot(None)).distinct()
+            ).all()
+            for url, fingerprinted in rows:
+                if fingerprinted:
+                    known.add(url)
+                else:
+                    pending.setdefault(url, portal)
+    return pending, len(known)
+
+
+def fingerprint_images(db: Database, client: HttpClient, portals: List[str], cache: Optional[ImageCache] = None,
+                       concurrency: int = IMAGE_CONCURRENCY) -> FingerprintResult:
+    """Hash the photos of the listings of `portals` that have no fingerprint yet.
+
+    URLs with a stored fingerprint are never downloaded again, so a re-run only fetches the photos of new listings.
+    Photos are downloaded with up to `concurrency` requests in flight, each through the token bucket of the
+    listing's portal, and kept in `cache` (if given): a fingerprint lost from the database is rebuilt from disk.
+    """
+    pending, known = pending_image_urls(db, portals)
+    result = FingerprintResult(urls=len(pending) + known, known=known)
+
+    def fetch(item: Tuple[str, str]) -> Tuple[str, Optional[int], str]:
+        url, portal = item
+        content = cache.get(url) if cache else None
+        source = 'cached'
+        if content is None:
+            try:
+                content = client.get(portal, url).content
+            except requests.HTTPError as error:
+                status = error.response.status_code if error.response is not None else 0
+                return url, None, 'failed' if 400 <= status < 500 and status != 429 else 'errors'
+            except requests.RequestException:
+                return url, None, 'errors'
+            source = 'downloaded'
+            if cache:
+                cache.put(url, content)
+        try:
+            return url, dhash(content), source
+        except (OSError, Image.DecompressionBombError):
+            return url, None, 'failed'
+
+    rows = []
+    for url, value, outcome in fetch_pages(fetch, _round_robin(pending), concurrency):
+        setattr(result, outcome, getattr(result, outcome) + 1)
+        if outcome == 'errors':
+            continue
+        rows.append({'url': url, 'dhash': _signed(value), 'fetched_at': datetime.now()})
+        if len(rows) >= DB_COMMIT_EVERY:
+            _save_fingerprints(db, rows)
+            rows = []
+    _save_fingerprints(db, rows)
+    return result
+
+
+def _round_robin(pending: Dict[str, str]) -> List[Tuple[str, str]]:
+    """(url, portal) pairs alternating between the portals, so every portal's rate limit is used at once instead of
+    one portal's photos waiting for another's."""
+    by_portal = defaultdict(list)
+    for url, portal in pending.items():
+        by_portal[portal].append((url, portal))
+    return [item for items in zip_longest(*by_portal.values()) for item in items if item]
+
+
+def _save_fingerprints(db: Database, rows: List[dict]):
+    if not rows:
+        return
+    with db.lock:
+        upsert_rows(db.session, ImageFingerprintModel.__table__, rows)
+        db.session.commit()
+
+
+def load_listing_hashes(db: Database, portals: List[str]) -> Dict[int, List[ListingImage]]:
+    """Listings of `portals` with a fingerprinted photo, grouped by the photo's hash."""
+    fingerprint = ImageFingerprintModel.__table__
+    listings = defaultdict(list)
+    with db.lock:
+        for portal in portals:
+            table = LISTING_MODELS[portal].__table__
+            rows = db.session.execute(
+                select(fingerprint.c.dhash, table.c.id, table.c.match_key, table.c.apartment_number, table.c.link)
+                .join(fingerprint, fingerprint.c.url == table.c.img_url)
+                .where(fingerprint.c.dhash.isnot(None))
+            ).all()
+            for value, listing_id, match_key, apartment_number, link in rows:
+                listings[_unsigned(value)].append(ListingImage(portal, listing_id, match_key, apartment_number, link))
+    return listings
+
+
+def find_duplicates(listings: Dict[int, List[ListingImage]], portals: List[str],
+                    max_distance: int = IMAGE_MAX_DISTANCE,
+                    common_hash_listings: int = IMAGE_COMMON_HASH_LISTINGS) -> List[ImageDuplicate]:
+    """Pairs of listings on different portals whose photos differ in at most `max_distance` hash bits, closest first.
+
+    Hashes shared by more than `common_hash_listings` listings of one portal are left out: those are
+    placeholders and agency logos rather than photos of an apartment.
+    """
+    listings = {value: images for value, images in listings.items()
+                if max(_portal_counts(images).values()) <= common_hash_listings}
+    index = HashIndex(listings, max_distance)
+    order = {portal: position for position, portal in enumerate(portals)}
+    duplicates = []
+    for value, images in listings.items():
+        for distance, other_value in index.search(value):
+            # Every pair of hashes once
+            if other_value < value:
+                continue
+            others = listings[other_value]
+            for position, image in enumerate(images):
+                for other in (images[position + 1:] if other_value == value else others):
+                    if image.portal == other.portal:
+                        continue
+                    first, second = (image, other) if order[image.portal] < order[other.portal] else (other, image)
+                    duplicates.append(ImageDuplicate(
+                        first.portal, first.listing_id, second.portal, second.listing_id, distance,
+                        _same_address(first, second), first.link, second.link))
+    duplicates.sort(key=lambda duplicate: (duplicate.distance, order[duplicate.portal],
+                                           order[duplicate.other_portal], duplicate.listing_id,
+                                           duplicate.other_listing_id))
+    return duplicates
+
+
+def _portal_counts(images: List[ListingImage]) -> Dict[str, int]:
+    counts = defaultdict(int)
+    for image in images:
+        counts[image.portal] += 1
+    return counts
+
+
+def _same_address(image: ListingImage, other: ListingImage) -> bool:
+    return image.match_key is not None and image.match_key == other.match_key and \
+        (image.apartment_number or None) == (other.apartment_number or None)
+
+
+def _signed(value: Optional[int]) -> Optional[int]:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+def _unsigned(value: int) -> int:
+    return value & ((1 << 64) - 1)
+
+
+def format_fingerprints(result: FingerprintResult) -> str:
+    return (f"{result.urls} photos: {result.known} already fingerprinted, {result.downloaded} downloaded, "
+            f"{result.cached} from the image cache, {result.failed} failed, {result.errors} to retry")
+
+
+def format_duplicates(duplicates: List[ImageDuplicate], limit: int) -> str:
+    lines = [f"{'portal':<13} {'listing':<12} {'portal':<13} {'listing':<12} {'bits':>4}  links"]
+    for duplicate in duplicates[:limit]:
+        lines.append(f"{duplicate.portal:<13} {duplicate.listing_id:<12} {duplicate.other_portal:<13} "
+                     f"{duplicate.other_listing_id:<12} {duplicate.distance:>4}  "
+                     f"{duplicate.link or ''} {duplicate.other_link or ''}")
+    return '\n'.join(lines)
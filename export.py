@@ -0,0 +1,130 @@
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, DateTime, Float, Integer, Table, func, select
+from sqlalchemy.engine import Connection
+
+from config import EXPORT_CHUNK_ROWS
+from database import Database
+from database.database import LISTING_MODELS
+
+PARTITION_PREFIX = 'crawl_date='
+# Parquet metadata key: the latest `crawled_at` in the file, the partition's watermark once it is written
+CRAWLED_UNTIL_KEY = b'crawled_until'
+
+
+@dataclass
+class ExportResult:
+    portal: str
+    # Latest `crawled_at` exported before, rows crawled up to then were left out
+    since: Optional[datetime] = None
+    # Crawl dates a file was added to
+    written: List[date] = field(default_factory=list)
+    rows: int = 0
+
+
+def arrow_schema(table: Table) -> pa.Schema:
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def partition_dir(output_dir: str, portal: str, crawl_date: date) -> str:
+    """Hive-style layout, readable with `pandas.read_parquet(f'{output_dir}/{portal}')`."""
+    return os.path.join(output_dir, portal, f'{PARTITION_PREFIX}{crawl_date.isoformat()}')
+
+
+def export_portal(db: Database, portal: str, output_dir: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> ExportResult:
+    """Append the listings of `portal` saved since the previous export to Parquet, partitioned by crawl date.
+
+    Every row goes to the partition of the date of its `crawled_at`, in a new file per export, so exported files
+    are never rewritten or deleted: a listing crawled again since the previous export gets another row, the one
+    with the latest `crawled_at` being its current state. The watermark is the latest `crawled_at` recorded in the
+    files of the last partition. Rows are streamed from their own connection in chunks of `chunk_rows`, one
+    Parquet row group per chunk, so memory doesn't depend on the table size, and a crawl can keep writing
+    meanwhile.
+    """
+    table = LISTING_MODELS[portal].__table__
+    schema = arrow_schema(table)
+    result = ExportResult(portal, since=exported_until(os.path.join(output_dir, portal)))
+    crawl_date = func.date(table.c.crawled_at)
+    with db.engine.connect() as connection:
+        new_rows = table.c.crawled_at > result.since if result.since else table.c.crawled_at.isnot(None)
+        partitions = connection.execute(
+            select(crawl_date, func.max(table.c.crawled_at)).where(new_rows).group_by(crawl_date).order_by(crawl_date)
+        ).all()
+        if not partitions:
+            return result
+        # Named after the export's watermark, unique unless nothing was crawled since, and then nothing is written
+        file_name = f'listings-{partitions[-1][1]:%Y%m%dT%H%M%S%f}.parquet'
+        # Written in date order, so an interrupted export resumes after the last partition it completed
+        for day, crawled_until in partitions:
+            day = date.fromisoformat(day)
+            path = os.path.join(partition_dir(output_dir, portal, day), file_name)
+            result.rows += _write_partition(connection, table, schema, day, result.since, crawled_until, path,
+                                            chunk_rows)
+            result.written.append(day)
+    return result
+
+
+def exported_until(portal_dir: str) -> Optional[datetime]:
+    """Latest `crawled_at` exported to `portal_dir`, None if nothing was."""
+    if not os.path.isdir(portal_dir):
+        return None
+    days = []
+    for name in os.listdir(portal_dir):
+        if name.startswith(PARTITION_PREFIX):
+            try:
+                days.append(date.fromisoformat(name[len(PARTITION_PREFIX):]))
+            except ValueError:
+                continue
+    if not days:
+        return None
+    last_dir = os.path.join(portal_dir, f'{PARTITION_PREFIX}{max(days).isoformat()}')
+    watermarks = []
+    for name in os.listdir(last_dir):
+        if name.endswith('.parquet') and not name.startswith('.'):
+            metadata = pq.read_metadata(os.path.join(last_dir, name)).metadata or {}
+            if CRAWLED_UNTIL_KEY in metadata:
+                watermarks.append(datetime.fromisoformat(metadata[CRAWLED_UNTIL_KEY].decode()))
+    return max(watermarks, default=None)
+
+
+def _write_partition(connection: Connection, table: Table, schema: pa.Schema, day: date, since: Optional[datetime],
+                     crawled_until: datetime, path: str, chunk_rows: int) -> int:
+    start = datetime.combine(day, time.min)
+    start_condition = table.c.crawled_at > since if since and since >= start else table.c.crawled_at >= start
+    # Rows saved while exporting are left to the next export, the watermark doesn't cover them
+    query = select(table).where(start_condition, table.c.crawled_at <= crawled_until).order_by(table.c.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Hidden from dataset readers and from exported_until until complete
+    temporary_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+    rows = 0
+    with pq.ParquetWriter(temporary_path, schema) as writer:
+        for chunk in connection.execution_options(yield_per=chunk_rows).execute(query).partitions():
+            writer.write_batch(pa.record_batch([list(values) for values in zip(*chunk)], schema=schema))
+            rows += len(chunk)
+        writer.add_key_value_metadata({CRAWLED_UNTIL_KEY: crawled_until.isoformat()})
+    os.replace(temporary_path, path)
+    return rows
+
+
+def format_export(result: ExportResult) -> str:
+    written = ', '.join(crawl_date.isoformat() for crawl_date in result.written) or 'none'
+    since = f" crawled after {result.since:%Y-%m-%d %H:%M:%S}" if result.since else ""
+    return f"{result.portal}: {result.rows} rows{since} added to {len(result.written)} partitions ({written})"
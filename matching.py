@@ -0,0 +1,145 @@
+import csv
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column
+
+from config import MATCH_AREA_TOLERANCE_M2, MATCH_PRICE_TOLERANCE
+from database import Database
+from database.database import LISTING_MODELS
+from database.models import ListingModelBase
+
+# Columns every listing table has lead the reports, portal-specific ones follow
+REPORT_COLUMNS = [name for name, value in vars(ListingModelBase).items() if isinstance(value, Column)]
+
+
+@dataclass
+class PortalGap:
+    """Listings of `present_on` that have no counterpart on `missing_on`."""
+    present_on: str
+    missing_on: str
+    listings: List[dict] = field(default_factory=list)
+    # Listings without the same address on `missing_on`, but with a similar apartment there
+    fuzzy_matched: int = 0
+
+    @property
+    def report_name(self) -> str:
+        return f'find_listings_present_on_{self.present_on}_and_missing_on_{self.missing_on}.csv'
+
+
+class PortalIndex:
+    """Listings of one portal, indexed for lookups by address and by apartment features.
+
+    Exact matches are a hash lookup on `match_key`. The fuzzy fallback catches addresses written differently
+    (building "21a" vs "21 A", a missing building number): it looks for an apartment on the same street
+    with the same room count, area within `area_tolerance` m², and the same floor and a price within
+    MATCH_PRICE_TOLERANCE (each when known on both sides).
+    Candidates come from buckets of (street, rooms, area // area_tolerance), so each lookup only compares a
+    handful of listings and matching stays linear in the number of listings.
+    """
+
+    def __init__(self, portal: str, rows: List[dict], area_tolerance: float = MATCH_AREA_TOLERANCE_M2):
+        self.portal = portal
+        self.rows = rows
+        self.area_tolerance = area_tolerance
+        self.match_keys = {row['match_key'] for row in rows if row['match_key']}
+        self.blocks = defaultdict(list)
+        for row in rows:
+            block = self._block(row)
+            if block:
+                self.blocks[block].append(row)
+
+    def has_address(self, row: dict) -> bool:
+        return row['match_key'] in self.match_keys
+
+    def has_similar(self, row: dict) -> bool:
+        block = self._block(row)
+        if not block:
+            return False
+        street, rooms, area_bucket = block
+        for bucket in (area_bucket - 1, area_bucket, area_bucket + 1):
+            for candidate in self.blocks.get((street, rooms, bucket), ()):
+                if abs(candidate['area_m2'] - row['area_m2']) <= self.area_tolerance and \
+                        _same_floor(candidate.get('floor'), row.get('floor')) and \
+                        _similar_price(candidate['price'], row['price']):
+                    return True
+        return False
+
+    def _block(self, row: dict) -> Optional[tuple]:
+        if not row['match_key'] or not row['rooms'] or not row['area_m2']:
+            return None
+        return _street(row['match_key']), row['rooms'], int(row['area_m2'] // self.area_tolerance)
+
+
+def _street(match_key: str) -> str:
+    """"tallinn|sõpruse 123 a" -> "tallinn|sõpruse": the match key up to the building number."""
+    words = match_key.split(' ')
+    for position, word in enumerate(words[1:], start=1):
+        if any(char.isdigit() for char in word):
+            return ' '.join(words[:position])
+    return match_key
+
+
+def _same_floor(floor, other_floor) -> bool:
+    return floor is None or other_floor is None or floor == other_floor
+
+
+def _similar_price(price, other_price) -> bool:
+    if not price or not other_price:
+        return True
+    return abs(price - other_price) <= MATCH_PRICE_TOLERANCE * max(price, other_price)
+
+
+def load_portal_indexes(db: Database, portals: List[str],
+                        area_tolerance: float = MATCH_AREA_TOLERANCE_M2) -> Dict[str, PortalIndex]:
+    indexes = {}
+    for portal in portals:
+        table = LISTING_MODELS[portal].__table__
+        with db.lock:
+            rows = [dict(row._mapping) for row in db.session.execute(table.select())]
+        indexes[portal] = PortalIndex(portal, rows, area_tolerance)
+    return indexes
+
+
+def find_portal_gaps(indexes: Dict[str, PortalIndex], fuzzy: bool = True) -> List[PortalGap]:
+    """Every "present on A, missing on B" pair of portals, in one pass over each portal's listings."""
+    gaps = []
+    for portal, index in indexes.items():
+        portal_gaps = [PortalGap(portal, other) for other in indexes if other != portal]
+        for row in index.rows:
+            for gap in portal_gaps:
+                other_index = indexes[gap.missing_on]
+                if other_index.has_address(row):
+                    continue
+                if fuzzy and other_index.has_similar(row):
+                    gap.fuzzy_matched += 1
+                    continue
+                gap.listings.append(row)
+        gaps.extend(portal_gaps)
+    return gaps
+
+
+def write_reports(gaps: List[PortalGap], output_dir: str) -> List[str]:
+    """Write one CSV per gap, with the listing columns of the `present_on` table. Returns the file paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for gap in gaps:
+        columns = REPORT_COLUMNS + [column.name for column in LISTING_MODELS[gap.present_on].__table__.columns
+                                    if column.name not in REPORT_COLUMNS]
+        path = os.path.join(output_dir, gap.report_name)
+        with open(path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.DictWriter(report, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(gap.listings)
+        paths.append(path)
+    return paths
+
+
+def format_gaps(gaps: List[PortalGap], indexes: Dict[str, PortalIndex]) -> str:
+    lines = [f"{'present on':<14} {'missing on':<14} {'listings':>9} {'of':>7} {'fuzzy matched':>14}"]
+    for gap in gaps:
+        lines.append(f"{gap.present_on:<14} {gap.missing_on:<14} {len(gap.listings):>9} "
+                     f"{len(indexes[gap.present_on].rows):>7} {gap.fuzzy_matched:>14}")
+    return '\n'.join(lines)
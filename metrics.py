@@ -0,0 +1,205 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+# Crawl stages, in pipeline order: waiting for the rate limit or a retry backoff, the HTTP request itself, JSON
+# decoding of the response, parsing the listings out of it, and writing them to the database
+STAGES = ('wait', 'fetch', 'decode', 'parse', 'write')
+
+PROMETHEUS_PREFIX = 'real_estate_crawl_'
+
+
+@dataclass
+class PortalMetrics:
+    """What one portal's crawl spent its time on.
+
+    Stage seconds are summed over every thread and parse worker process, so with concurrent fetching they can add
+    up to more than `duration`, the crawl's wall-clock time.
+    """
+    portal: str
+    stage_seconds: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+    stage_calls: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(STAGES, 0))
+    requests: int = 0
+    # Responses served from the cache without a request, and stale ones the portal confirmed unchanged (304)
+    cache_hits: int = 0
+    cache_revalidations: int = 0
+    bytes_downloaded: int = 0
+    retries: int = 0
+    pages: int = 0
+    listings: int = 0
+    mode: Optional[str] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.duration if self.duration else 0.0
+
+    @property
+    def listings_per_second(self) -> float:
+        return self.listings / self.duration if self.duration else 0.0
+
+
+class CrawlMetrics:
+    """Thread-safe per-portal stage timers and counters of a run, filled in by the HTTP client, the parsers,
+    the parse pipeline and the database writers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.portals: Dict[str, PortalMetrics] = {}
+
+    def reset(self):
+        with self.lock:
+            self.portals = {}
+
+    @contextmanager
+    def timer(self, portal: str, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(portal, stage, time.perf_counter() - started)
+
+    def observe(self, portal: str, stage: str, seconds: float):
+        with self.lock:
+            metrics = self._portal(portal)
+            metrics.stage_seconds[stage] += seconds
+            metrics.stage_calls[stage] += 1
+
+    def add(self, portal: str, counter: str, value: int = 1):
+        """Increase one of the counters of `PortalMetrics` (requests, bytes_downloaded, pages, ...)."""
+        with self.lock:
+            metrics = self._portal(portal)
+            setattr(metrics, counter, getattr(metrics, counter) + value)
+
+    def finish(self, portal: str, mode: str, duration: float, error: Optional[str] = None):
+        with self.lock:
+            metrics = self._portal(portal)
+            metrics.mode, metrics.duration, metrics.error = mode, duration, error
+
+    def snapshot(self) -> List[PortalMetrics]:
+        with self.lock:
+            return [replace(metrics, stage_seconds=dict(metrics.stage_seconds), stage_calls=dict(metrics.stage_calls))
+                    for metrics in self.portals.values()]
+
+    def _portal(self, portal: str) -> PortalMetrics:
+        if portal not in self.portals:
+            self.portals[portal] = PortalMetrics(portal)
+        return self.portals[portal]
+
+
+_metrics = CrawlMetrics()
+
+
+def get_metrics() -> CrawlMetrics:
+    """Return the process-wide metrics every crawl component records into."""
+    return _metrics
+
+
+def to_json_record(metrics: PortalMetrics, timestamp: datetime) -> dict:
+    record = {'event': 'crawl_metrics', 'timestamp': timestamp.isoformat(timespec='seconds'), **asdict(metrics)}
+    record['status'] = 'ok' if metrics.error is None else 'failed'
+    record['pages_per_second'] = round(metrics.pages_per_second, 3)
+    record['listings_per_second'] = round(metrics.listings_per_second, 3)
+    record['stage_seconds'] = {stage: round(seconds, 6) for stage, seconds in metrics.stage_seconds.items()}
+    return record
+
+
+def append_json_log(path: str, snapshot: List[PortalMetrics], timestamp: Optional[datetime] = None):
+    """Append one JSON object per portal to the JSON lines file at `path`."""
+    timestamp = timestamp or datetime.now()
+    with open(path, 'a', encoding='utf-8') as log:
+        for metrics in snapshot:
+            log.write(json.dumps(to_json_record(metrics, timestamp), ensure_ascii=False) + '\n')
+
+
+# (name, help, value of a PortalMetrics); stage metrics get a `stage` label besides `portal`
+_PORTAL_GAUGES = [
+    ('duration_seconds', 'Wall-clock time of the last crawl', lambda m: m.duration or 0.0),
+    ('success', '1 if the last crawl finished without an error', lambda m: int(m.error is None)),
+    ('pages', 'Search results pages parsed by the last crawl', lambda m: m.pages),
+    ('listings', 'Listings parsed by the last crawl', lambda m: m.listings),
+    ('pages_per_second', 'Pages parsed per second of the last crawl', lambda m: m.pages_per_second),
+    ('listings_per_second', 'Listings parsed per second of the last crawl', lambda m: m.listings_per_second),
+    ('http_requests', 'Requests sent to the portal by the last crawl, retries included', lambda m: m.requests),
+    ('cache_hits', 'Responses served from the response cache without a request', lambda m: m.cache_hits),
+    ('cache_revalidations', 'Cached responses the portal confirmed unchanged (304)', lambda m: m.cache_revalidations),
+    ('downloaded_bytes', 'Response bytes downloaded by the last crawl', lambda m: m.bytes_downloaded),
+    ('retries', 'Requests retried by the last crawl (429, 5xx, connection errors)', lambda m: m.retries),
+]
+_STAGE_GAUGES = [
+    ('stage_seconds', 'Time spent per crawl stage, summed over threads and worker processes',
+     lambda m, stage: m.stage_seconds[stage]),
+    ('stage_calls', 'Timed calls per crawl stage', lambda m, stage: m.stage_calls[stage]),
+]
+_PORTAL_LABEL = re.compile(r'portal="((?:[^"\\]|\\.)*)"')
+
+
+def format_prometheus(snapshot: List[PortalMetrics], timestamp: Optional[datetime] = None,
+                      previous: str = '') -> str:
+    """Prometheus text format of the last crawl of every portal in `snapshot`.
+
+    Samples of other portals in `previous` (the file written by an earlier run) are kept, so crawling one portal
+    doesn't drop the series of the others.
+    """
+    timestamp = timestamp or datetime.now()
+    crawled = {metrics.portal for metrics in snapshot}
+    kept: Dict[str, List[str]] = {}
+    for line in previous.splitlines():
+        match = _PORTAL_LABEL.search(line)
+        if line.startswith(PROMETHEUS_PREFIX) and match and match.group(1) not in crawled:
+            kept.setdefault(re.split(r'[{ ]', line, 1)[0], []).append(line)
+
+    families = [(name, help_text, [(f'{{portal="{m.portal}"}}', value(m)) for m in snapshot])
+                for name, help_text, value in _PORTAL_GAUGES]
+    families += [(name, help_text, [(f'{{portal="{m.portal}",stage="{stage}"}}', value(m, stage))
+                                    for m in snapshot for stage in STAGES])
+                 for name, help_text, value in _STAGE_GAUGES]
+    families.append(('last_run_timestamp_seconds', 'Unix time the last crawl ended',
+                     [(f'{{portal="{m.portal}"}}', timestamp.timestamp()) for m in snapshot]))
+
+    lines = []
+    for name, help_text, samples in families:
+        name = PROMETHEUS_PREFIX + name
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        lines += [f'{name}{labels} {_format_value(value)}' for labels, value in samples]
+        lines += kept.get(name, [])
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str, snapshot: List[PortalMetrics], timestamp: Optional[datetime] = None):
+    """Write `snapshot` to `path` for the node_exporter textfile collector, keeping other portals' samples.
+
+    Written to a temporary file and renamed, so the collector never reads a half-written file.
+    """
+    previous = ''
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as existing:
+            previous = existing.read()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as output:
+        output.write(format_prometheus(snapshot, timestamp, previous))
+    os.replace(tmp_path, path)
+
+
+def format_metrics(snapshot: List[PortalMetrics]) -> str:
+    lines = [f"{'portal':<14}" + ''.join(f"{stage + ', s':>10}" for stage in STAGES) +
+             f" {'MB':>8} {'pages/s':>8} {'listings/s':>10} {'retries':>8} {'requests':>8} {'cached':>8} "
+             f"{'revalidated':>11}"]
+    for metrics in snapshot:
+        lines.append(f"{metrics.portal:<14}" +
+                     ''.join(f"{metrics.stage_seconds[stage]:>10.2f}" for stage in STAGES) +
+                     f" {metrics.bytes_downloaded / 1e6:>8.1f} {metrics.pages_per_second:>8.1f} "
+                     f"{metrics.listings_per_second:>10.1f} {metrics.retries:>8} {metrics.requests:>8} "
+                     f"{metrics.cache_hits:>8} {metrics.cache_revalidations:>11}")
+    return '\n'.join(lines)
+
+
+def _format_value(value: float) -> str:
+    return str(value) if isinstance(value, int) else repr(round(value, 6))
@@ -0,0 +1,109 @@
+import math
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, Iterator, List, Optional, Type, Union, get_args
+
+import numpy as np
+
+from .common import ListingBase, build_match_key, extract_district
+
+
+@dataclass
+class PriceStats:
+    count: int
+    mean: Optional[float]
+    median: Optional[float]
+    p10: Optional[float]
+    p90: Optional[float]
+
+
+class ListingBatch:
+    """Listings of one or more pages stored column-wise, one NumPy array per listing field.
+
+    Numeric fields are float64 arrays with NaN for missing values, everything else (ids, texts, flags)
+    is an object array. A page of listings costs a few arrays instead of an object per listing, and
+    statistics run on whole columns. Listing instances or rows are only rebuilt when needed, e.g.
+    `to_rows()` when saving.
+    """
+
+    def __init__(self, listing_class: Type[ListingBase], columns: Dict[str, np.ndarray]):
+        self.listing_class = listing_class
+        self.columns = columns
+
+    @classmethod
+    def from_listings(cls, listing_class: Type[ListingBase], listings: List[ListingBase]) -> 'ListingBatch':
+        columns = {}
+        for field in fields(listing_class):
+            values = [getattr(listing, field.name) for listing in listings]
+            columns[field.name] = _numeric_column(values) if _is_numeric(field.type) else _object_column(values)
+        return cls(listing_class, columns)
+
+    @classmethod
+    def concat(cls, batches: Iterable['ListingBatch']) -> 'ListingBatch':
+        """Join batches of the same listing class, e.g. every page of a crawl, into one."""
+        batches = list(batches)
+        columns = {name: np.concatenate([batch.columns[name] for batch in batches]) for name in batches[0].columns}
+        return cls(batches[0].listing_class, columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __iter__(self) -> Iterator[ListingBase]:
+        for row in self.to_rows():
+            yield self.listing_class(**row)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def to_rows(self) -> List[dict]:
+        """Rows with the listing's field names and plain Python values (None where missing)."""
+        listing_fields = fields(self.listing_class)
+        names = [field.name for field in listing_fields]
+        values = [self._column_values(field) for field in listing_fields]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def price_m2_stats(self) -> PriceStats:
+        prices = self.columns['price_m2']
+        prices = prices[~np.isnan(prices)]
+        if not len(prices):
+            return PriceStats(0, None, None, None, None)
+        p10, median, p90 = np.percentile(prices, [10, 50, 90])
+        return PriceStats(len(prices), float(prices.mean()), float(median), float(p10), float(p90))
+
+    def _column_values(self, field) -> list:
+        values = self.columns[field.name].tolist()
+        if self.columns[field.name].dtype == object:
+            return values
+        if int in get_args(field.type):
+            return [None if math.isnan(value) else int(value) for value in values]
+        return [None if math.isnan(value) else value for value in values]
+
+
+def _is_numeric(field_type) -> bool:
+    # Optional[int] / Optional[float]; bool is kept as an object column
+    return bool({int, float} & set(get_args(field_type)))
+
+
+def _numeric_column(values: list) -> np.ndarray:
+    try:
+        return np.array([math.nan if value is None else value for value in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        # A portal sent something that isn't a number: keep the values as they are
+        return _object_column(values)
+
+
+def _object_column(values: list) -> np.ndarray:
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def listing_rows(listings: Union[ListingBatch, List[ListingBase]]) -> List[dict]:
+    """Rows to store for a batch or a plain list of listings, with their `match_key` and `district`."""
+    if isinstance(listings, ListingBatch):
+        rows = listings.to_rows()
+    else:
+        rows = [{field.name: getattr(listing, field.name) for field in fields(listing)} for listing in listings]
+    for row in rows:
+        row['match_key'] = build_match_key(row['city'], row['street_with_building'])
+        row['district'] = extract_district(row['address'])
+    return rows
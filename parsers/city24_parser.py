@@ -1,16 +1,22 @@
 from dataclasses import dataclass
-from typing import List, Optional
+from itertools import count
+from typing import ClassVar, Iterator, List, Optional
 import re
 from xmlrpc.client import Error
 
-import requests
+from config import CITY24_BASE_URL, CITY24_API_SEARCH_URL, FETCH_CONCURRENCY, PARSE_WORKERS
+from metrics import get_metrics
+from .common import ListingBase, AddressComponents, ListingPage, RawPage
+from .http_client import HttpClient, get_http_client
+from .incremental import IncrementalState
+from .pagination import fetch_pages
+from .pipeline import parse_pages
 
-from config import CITY24_BASE_URL, CITY24_API_SEARCH_URL
-from .common import ListingBase, AddressComponents
 
-
-@dataclass
+@dataclass(slots=True)
 class City24Listing(ListingBase):
+    TIMESTAMP_FIELD: ClassVar[str] = 'date_published'
+
     object_important_note: Optional[str]
     date_published: Optional[str]
     floor: Optional[int]
@@ -20,24 +26,54 @@ class City24Listing(ListingBase):
     longitude: Optional[float]
 
 class City24Parser:
-    def parse(self) -> List[City24Listing]:
-        page, limit = 1, 1000
-        results: List[City24Listing] = []
-
-        while True:
+    PORTAL = 'city24'
+    LISTING_CLASS = City24Listing
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, search_url: str = CITY24_API_SEARCH_URL,
+                 client: Optional[HttpClient] = None, parse_workers: int = PARSE_WORKERS):
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.search_url = search_url
+        # Created on first request: parse workers build the parser only to parse (see parsers/pipeline.py)
+        self._client = client
+
+    @property
+    def client(self) -> HttpClient:
+        if self._client is None:
+            self._client = get_http_client()
+        return self._client
+
+    def parse(self, incremental: Optional[IncrementalState] = None) -> List[City24Listing]:
+        """Parse all listings, or with `incremental` only the pages newer than the previous crawl."""
+        return [listing for page in self.iter_pages(incremental) for listing in page.listings]
+
+    def iter_pages(self, incremental: Optional[IncrementalState] = None, columnar: bool = False,
+                   start_page: int = 1) -> Iterator[ListingPage]:
+        """Yield parsed listings page by page, in search results order, from `start_page` on; as a `ListingBatch`
+        with `columnar`."""
+        yield from parse_pages(self, self.iter_raw_pages(start_page), self.parse_workers, incremental,
+                               columnar=columnar)
+
+    def iter_raw_pages(self, start_page: int = 1) -> Iterator[RawPage]:
+        """Yield search results pages as fetched, in order, from `start_page` on."""
+        limit = 1000
+
+        def fetch_page(page):
             print(f"Fetching page {page}, limit={limit}")
-            response_json = self.fetch_data_as_json(limit=limit, page=page)
-            listings = self.parse_listings(response_json)
-            results.extend(listings)
-            print(f"Parsed {len(listings)} total listings for page {page}")
+            return self.fetch_data_as_json(limit=limit, page=page)
 
-            if len(listings) < limit:
+        # The API doesn't report the total, so pages are requested speculatively
+        # until the first short page is seen
+        for page, response_json in enumerate(fetch_pages(fetch_page, count(start_page), self.concurrency),
+                                             start=start_page):
+            print(f"Fetched {len(response_json)} listings for page {page}")
+            yield RawPage(page, response_json, limit)
+
+            if len(response_json) < limit:
                 break
-            page += 1
-        return results
 
     def fetch_data_as_json(self, limit, page):
-        url = CITY24_API_SEARCH_URL.format(limit=limit, page=page)
+        url = self.search_url.format(limit=limit, page=page)
         headers = {
             'accept': 'application/json',
             'accept-language': 'en-US,en;q=0.9,de;q=0.8,ru;q=0.7,et;q=0.6,zh-CN;q=0.5,zh;q=0.4,ko;q=0.3,lv;q=0.2,it;q=0.1,uk;q=0.1',
@@ -45,9 +81,9 @@ class City24Parser:
             'referer': 'https://www.city24.ee/',
             'origin': 'https://www.city24.ee',
         }
-        response = requests.get(url, headers=headers, verify=False)
-        response.raise_for_status()
-        return response.json()
+        response = self.client.get(self.PORTAL, url, headers=headers)
+        with get_metrics().timer(self.PORTAL, 'decode'):
+            return response.json()
 
     def parse_listings(self, apartments) -> List[City24Listing]:
         results = []
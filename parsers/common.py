@@ -1,15 +1,69 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, List, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class AddressComponents:
     city: Optional[str]
     street_with_building: Optional[str]
     apartment_number: Optional[str]
 
 
-@dataclass
+# Street type words dropped from match keys: portals disagree on whether and how to write them
+STREET_TYPES = {
+    'tn', 'tänav', 'mnt', 'maantee', 'pst', 'puiestee', 'tee', 'põik', 'allee', 'väljak', 'plats', 'pk',
+}
+
+
+def build_match_key(city: Optional[str], street_with_building: Optional[str]) -> Optional[str]:
+    """Key that identifies a building across portals, e.g. ("Tallinn", "Sõpruse pst 123") -> "tallinn|sõpruse 123".
+
+    Case, punctuation and street types are ignored; the apartment number is not part of the key.
+    """
+    if not city or not street_with_building:
+        return None
+    street = [word for word in _words(street_with_building) if word not in STREET_TYPES]
+    return f"{' '.join(_words(city))}|{' '.join(street)}"
+
+
+# Tallinn's districts (linnaosad) and the subdistricts (asumid) that portals write instead of them
+TALLINN_DISTRICTS = ['Haabersti', 'Kesklinn', 'Kristiine', 'Lasnamäe', 'Mustamäe', 'Nõmme', 'Pirita', 'Põhja-Tallinn']
+TALLINN_SUBDISTRICTS = {
+    'vanalinn': 'Kesklinn', 'kadriorg': 'Kesklinn', 'tatari': 'Kesklinn', 'juhkentali': 'Kesklinn',
+    'maakri': 'Kesklinn', 'sibulaküla': 'Kesklinn', 'torupilli': 'Kesklinn', 'uus maailm': 'Kesklinn',
+    'kassisaba': 'Kesklinn', 'veerenni': 'Kesklinn', 'kalamaja': 'Põhja-Tallinn', 'pelguranna': 'Põhja-Tallinn',
+    'kopli': 'Põhja-Tallinn', 'pelgulinn': 'Põhja-Tallinn', 'karjamaa': 'Põhja-Tallinn',
+    'lilleküla': 'Kristiine', 'tondi': 'Kristiine', 'pikaliiva': 'Haabersti', 'õismäe': 'Haabersti',
+    'väike-õismäe': 'Haabersti', 'astangu': 'Haabersti', 'mähe': 'Pirita', 'merivälja': 'Pirita',
+    'kose': 'Pirita', 'lasnamäe': 'Lasnamäe', 'pae': 'Lasnamäe', 'mustakivi': 'Lasnamäe', 'sikupilli': 'Lasnamäe',
+    'hiiu': 'Nõmme', 'pääsküla': 'Nõmme',
+}
+
+
+def extract_district(address: Optional[str]) -> Optional[str]:
+    """Tallinn district named in an address, e.g. "Tallinn, Põhja-Tallinna linnaosa, Kopli tn-3" -> "Põhja-Tallinn".
+
+    Portals write "Kesklinn", "Kesklinna linnaosa" or a subdistrict ("Vanalinn"); the first address part naming
+    a district or a known subdistrict wins.
+    """
+    if not address:
+        return None
+    for part in address.lower().split(','):
+        part = part.replace('linnaosa', '').strip()
+        for district in TALLINN_DISTRICTS:
+            # "põhja-tallinna" is the genitive of "põhja-tallinn"
+            if part in (district.lower(), district.lower() + 'a'):
+                return district
+        if part in TALLINN_SUBDISTRICTS:
+            return TALLINN_SUBDISTRICTS[part]
+    return None
+
+
+def _words(value: str) -> List[str]:
+    return value.lower().replace('.', ' ').replace(',', ' ').split()
+
+
+@dataclass(slots=True)
 class ListingBase:
     id: str
     address: Optional[str]
@@ -22,3 +76,20 @@ class ListingBase:
     price_m2: Optional[int]
     link: Optional[str]
     img_url: Optional[str]
+
+
+@dataclass
+class ListingPage:
+    """Listings parsed from one page of search results."""
+    number: int
+    # Or, for columnar crawls, a parsers.batch.ListingBatch
+    listings: List[ListingBase]
+
+
+@dataclass
+class RawPage:
+    """One fetched page of search results, before parsing."""
+    number: int
+    payload: Any
+    # Listings on a full page, to tell when an incremental crawl has caught up
+    page_size: int
@@ -0,0 +1,151 @@
+import re
+from dataclasses import dataclass, fields
+from typing import Iterable, List, Optional, Tuple
+
+# Canonical values for the phrasings used on kv.ee, in Russian and Estonian
+HEATING_TYPES = {
+    'центральное отопление': 'central', 'keskküte': 'central',
+    'местное центральное отопление': 'local_central', 'lokaalne keskküte': 'local_central',
+    'районное отопление': 'district', 'kaugküte': 'district',
+    'газовое отопление': 'gas', 'gaasiküte': 'gas',
+    'электрическое отопление': 'electric', 'elektriküte': 'electric',
+    'печное отопление': 'stove', 'ahjuküte': 'stove',
+    'геотермальное отопление': 'geothermal', 'maaküte': 'geothermal',
+    'тепловой насос': 'heat_pump', 'õhksoojuspump': 'heat_pump', 'soojuspump': 'heat_pump',
+}
+CONDITIONS = {
+    'новостройка': 'new', 'uusehitis': 'new',
+    'капитально отремонтировано': 'renovated', 'kapitaalselt renoveeritud': 'renovated',
+    'отремонтировано': 'renovated', 'renoveeritud': 'renovated',
+    'хорошее состояние': 'good', 'heas korras': 'good',
+    'удовлетворительное состояние': 'satisfactory', 'rahuldavas seisukorras': 'satisfactory',
+    'требует ремонта': 'needs_renovation', 'vajab remonti': 'needs_renovation',
+}
+
+
+def _choice(phrases: Iterable[str]) -> str:
+    # Longest first, so "местное центральное отопление" wins over "центральное отопление"
+    return '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+
+@dataclass(frozen=True)
+class AttributePattern:
+    # Attributes captured by the pattern's groups, in order
+    fields: Tuple[str, ...]
+    pattern: str
+    # For every attribute the match with the lowest priority wins, the earliest one among equals
+    priority: int
+    # Literals every match contains: the regex only runs on descriptions containing one of them
+    keywords: Tuple[str, ...]
+    # Matched against the description as it is instead of its lowercased text
+    case_sensitive: bool = False
+    # Matches must start at a word. Checked on the match rather than with a leading `\b` or lookbehind, which
+    # would keep `re` from skipping ahead to the possible first characters
+    word_start: bool = False
+
+
+# Patterns are lowercase and matched against the lowercased description, except the case-sensitive ones:
+# "Этаж 3/5" beats "3. этаж" like the original parse_floor did, but a lowercase "этаж 9" doesn't. Energy class
+# letters are accepted in either case.
+# Each one is a separate precompiled search: `re` scans for a literal (or a small set of first characters)
+# much faster than for one alternation of all of them, or for case-insensitive patterns.
+PATTERNS = [
+    AttributePattern(('floor', 'total_floors'), r'Этаж\s*(\d+)(?:/(\d+))?', 0, ('Этаж',), case_sensitive=True),
+    AttributePattern(('floor', 'total_floors'), r'korrus\s*(\d+)(?:/(\d+))?', 0, ('korrus',)),
+    AttributePattern(('year_built',), r'(?:год\s+постройки|ehitusaasta)\s*(\d{4})', 0, ('год', 'ehitusaasta')),
+    AttributePattern(('heating',), r'(' + _choice(HEATING_TYPES) + r')\b', 0, ('отоплен', 'küte', 'насос', 'pump'),
+                     word_start=True),
+    AttributePattern(('condition',), r'(' + _choice(CONDITIONS) + r')\b', 0,
+                     ('новостройк', 'ремонт', 'состояни', 'uusehitis', 'renoveeritud', 'korras', 'remonti'),
+                     word_start=True),
+    AttributePattern(('energy_class',), r'(?:класс\s+энергопотребления|энергетический\s+класс|energiaklass|'
+                                        r'energiamärgis)\s*:?\s*([a-h])\b', 0, ('класс', 'energia')),
+    AttributePattern(('no_balcony',), r'(без\s+балкона|rõduta)', 0, ('балкона', 'rõduta')),
+    AttributePattern(('floor',), r'(\d+)\.\s*этаж', 1, ('этаж',)),
+    AttributePattern(('floor',), r'(\d+)\.\s*korrus', 1, ('korrus',)),
+    AttributePattern(('total_floors',), r'этажей(?:\s+в\s+доме)?\s*(\d+)', 1, ('этажей',)),
+    AttributePattern(('total_floors',), r'korruseid(?:\s+majas)?\s*(\d+)', 1, ('korruseid',)),
+    AttributePattern(('balcony',), r'(балкон|лоджия|терраса|rõdu|lodža|terrass)\w*', 1,
+                     ('балкон', 'лоджия', 'терраса', 'rõdu', 'lodža', 'terrass'), word_start=True),
+]
+
+ATTRIBUTE_CONVERTERS = {
+    'floor': int,
+    'total_floors': int,
+    'year_built': int,
+    'heating': HEATING_TYPES.__getitem__,
+    'condition': CONDITIONS.__getitem__,
+    'energy_class': str.upper,
+    'balcony': lambda value: True,
+    'no_balcony': lambda value: False,
+}
+
+
+@dataclass(slots=True)
+class DescriptionAttributes:
+    floor: Optional[int] = None
+    total_floors: Optional[int] = None
+    year_built: Optional[int] = None
+    heating: Optional[str] = None
+    condition: Optional[str] = None
+    energy_class: Optional[str] = None
+    balcony: Optional[bool] = None
+
+
+ATTRIBUTES = [field.name for field in fields(DescriptionAttributes)]
+# Rank of an attribute not found yet: worse than any (priority, position)
+UNRANKED = 1 << 62
+
+
+def compile_patterns(patterns: List[AttributePattern]) -> list:
+    """(search, keywords, case_sensitive, word_start, priority, handlers) of every pattern, by priority, where
+    handlers are the (group, attribute index, converter) of each captured field."""
+    compiled = []
+    for pattern in sorted(patterns, key=lambda pattern: pattern.priority):
+        handlers = tuple((group, ATTRIBUTES.index('balcony' if name == 'no_balcony' else name),
+                          ATTRIBUTE_CONVERTERS[name]) for group, name in enumerate(pattern.fields, start=1))
+        compiled.append((re.compile(pattern.pattern).search, pattern.keywords, pattern.case_sensitive,
+                         pattern.word_start, pattern.priority, handlers))
+    return compiled
+
+
+COMPILED_PATTERNS = compile_patterns(PATTERNS)
+
+
+def extract_attributes(description: Optional[str], patterns: Optional[list] = None) -> DescriptionAttributes:
+    """Extract all attributes from a listing description, or those of `patterns` (see `compile_patterns`)."""
+    values = [None] * len(ATTRIBUTES)
+    if description:
+        lower = description.lower()
+        # (priority << 32) + position of the match each value comes from
+        ranks = [UNRANKED] * len(ATTRIBUTES)
+        for search, keywords, case_sensitive, word_start, priority, handlers in patterns or COMPILED_PATTERNS:
+            if priority:
+                # Patterns run by priority: skip those that can only lose
+                for _, index, _ in handlers:
+                    if ranks[index] >> 32 >= priority:
+                        break
+                else:
+                    continue
+            text = description if case_sensitive else lower
+            for keyword in keywords:
+                if keyword in text:
+                    break
+            else:
+                continue
+            match = search(text)
+            while word_start and match and match.start() and _inside_word(text, match.start()):
+                match = search(text, match.start() + 1)
+            if match is None:
+                continue
+            rank = priority << 32 | match.start()
+            for group, index, converter in handlers:
+                value = match.group(group)
+                if value is not None and rank < ranks[index]:
+                    ranks[index] = rank
+                    values[index] = converter(value)
+    return DescriptionAttributes(*values)
+
+
+def _inside_word(text: str, position: int) -> bool:
+    return text[position - 1].isalnum() or text[position - 1] == '_'
@@ -0,0 +1,223 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+from config import HTTP_TIMEOUT, HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, RATE_LIMITS
+from metrics import get_metrics
+from .response_cache import ResponseCache, CacheMissError
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class ConnectionStats:
+    requests: int
+    opened: int
+
+    @property
+    def reused(self) -> int:
+        return self.requests - self.opened
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` requests per second on average, up to `burst` at once."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _CountingPoolManager(PoolManager):
+    """Keeps every pool it creates so connection counters survive pool eviction."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_pools = []
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        self.created_pools.append(pool)
+        return pool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        # As HTTPAdapter.init_poolmanager, which would build a PoolManager only for it to be replaced
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _CountingPoolManager(num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+
+class HttpClient:
+    """HTTP client shared by all parsers: keep-alive pool per host, retries and per-portal rate limits.
+
+    With a `cache`, fresh responses are served from disk and stale ones are revalidated with
+    If-None-Match / If-Modified-Since. In `offline` mode every request must be answered from the cache.
+
+    Time spent waiting (rate limit, retry backoff) and fetching, bytes downloaded, cache hits and retries are
+    recorded per portal in `metrics.get_metrics()`.
+    """
+
+    def __init__(self,
+                 rate_limits: Dict[str, Tuple[float, int]] = RATE_LIMITS,
+                 pool_size: int = HTTP_POOL_SIZE,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_base: float = HTTP_BACKOFF_BASE,
+                 backoff_max: float = HTTP_BACKOFF_MAX,
+                 timeout: float = HTTP_TIMEOUT,
+                 cache: Optional[ResponseCache] = None,
+                 offline: bool = False):
+        if offline and cache is None:
+            raise ValueError("Offline mode requires a response cache")
+        self.cache = cache
+        self.offline = offline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retries = 0
+        self.buckets = {portal: TokenBucket(rate, burst) for portal, (rate, burst) in rate_limits.items()}
+
+        self.adapter = _CountingAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        # The portals are accessed without verifying the certificate chain (see real_estate_parser_cli.py)
+        self.session.verify = False
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.lock = threading.Lock()
+
+    def get(self, portal: str, url: str, **kwargs) -> requests.Response:
+        return self.request(portal, 'GET', url, **kwargs)
+
+    def post(self, portal: str, url: str, **kwargs) -> requests.Response:
+        return self.request(portal, 'POST', url, **kwargs)
+
+    def request(self, portal: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures (connection errors, 429 and 5xx) with backoff.
+
+        Raises `requests.HTTPError` for a non-retryable status or once the retries are used up,
+        and `CacheMissError` for an uncached request in offline mode.
+        """
+        if self.cache is None:
+            return self._send(portal, method, url, **kwargs)
+
+        key = self.cache.make_key(method, url, kwargs.get('json', kwargs.get('data')))
+        cached = self.cache.get(key)
+        if cached and (self.offline or cached.is_fresh(self.cache.ttl)):
+            get_metrics().add(portal, 'cache_hits')
+            return cached.to_response()
+        if self.offline:
+            raise CacheMissError(f"No cached response for {method} {url}")
+
+        if cached:
+            conditional_headers = {}
+            if 'ETag' in cached.headers:
+                conditional_headers['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                conditional_headers['If-Modified-Since'] = cached.headers['Last-Modified']
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **conditional_headers}
+
+        response = self._send(portal, method, url, **kwargs)
+        if response.status_code == 304 and cached:
+            get_metrics().add(portal, 'cache_revalidations')
+            self.cache.touch(key)
+            return cached.to_response()
+        self.cache.put(key, response)
+        return response
+
+    def _send(self, portal: str, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        bucket = self.buckets.get(portal)
+        metrics = get_metrics()
+
+        for attempt in range(self.max_retries + 1):
+            if bucket:
+                with metrics.timer(portal, 'wait'):
+                    bucket.acquire()
+            metrics.add(portal, 'requests')
+            try:
+                with metrics.timer(portal, 'fetch'):
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._sleep_before_retry(portal, attempt, None)
+                continue
+            metrics.add(portal, 'bytes_downloaded', len(response.content))
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                self._sleep_before_retry(portal, attempt, response.headers.get('Retry-After'))
+                continue
+            response.raise_for_status()
+            return response
+
+    def connection_stats(self) -> ConnectionStats:
+        pools = self.adapter.poolmanager.created_pools
+        return ConnectionStats(
+            requests=sum(pool.num_requests for pool in pools),
+            opened=sum(pool.num_connections for pool in pools),
+        )
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _sleep_before_retry(self, portal: str, attempt: int, retry_after: Optional[str]):
+        with self.lock:
+            self.retries += 1
+        metrics = get_metrics()
+        metrics.add(portal, 'retries')
+        delay = self._parse_retry_after(retry_after)
+        if delay is None:
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        with metrics.timer(portal, 'wait'):
+            time.sleep(min(delay, self.backoff_max))
+
+    def _parse_retry_after(self, retry_after: Optional[str]) -> Optional[float]:
+        """Parse Retry-After given either as delay in seconds or as HTTP date."""
+        if not retry_after:
+            return None
+        if retry_after.strip().isdigit():
+            return float(retry_after)
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_default_client: Optional[HttpClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the process-wide client shared by all parsers."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Set
+
+from .common import ListingBase
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse a portal timestamp ("2025-06-23 10:00:00", "2025-06-23T10:00:00+03:00") into a comparable value."""
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+@dataclass
+class IncrementalState:
+    """What the previous crawls of a portal stored: listing ids and the newest listing timestamp."""
+    known_ids: Set[str]
+    watermark: Optional[datetime]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> 'IncrementalState':
+        """Build from (id, timestamp) rows of a listing table."""
+        known_ids, watermark = set(), None
+        for listing_id, value in rows:
+            known_ids.add(str(listing_id))
+            timestamp = parse_timestamp(value)
+            if timestamp and (watermark is None or timestamp > watermark):
+                watermark = timestamp
+        return cls(known_ids, watermark)
+
+    def is_new(self, listing: ListingBase) -> bool:
+        if str(listing.id) not in self.known_ids:
+            return True
+        timestamp = parse_timestamp(getattr(listing, listing.TIMESTAMP_FIELD))
+        return bool(timestamp and self.watermark and timestamp > self.watermark)
+
+    def is_caught_up(self, page_listings: list, page_size: int) -> bool:
+        """True once a full page has nothing newer than the last crawl; results are sorted newest-first,
+        so the remaining pages only hold listings that are already stored."""
+        return len(page_listings) >= page_size and not any(self.is_new(listing) for listing in page_listings)
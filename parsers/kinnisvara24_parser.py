@@ -1,46 +1,83 @@
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import ClassVar, Iterator, List, Optional
 
-import requests
+from config import KINNISVARA24_API_SEARCH_URL, KINNISVARA24_API_PAYLOAD, FETCH_CONCURRENCY, PARSE_WORKERS
+from metrics import get_metrics
+from .common import ListingBase, AddressComponents, ListingPage, RawPage
+from .http_client import HttpClient, get_http_client
+from .incremental import IncrementalState
+from .pagination import fetch_pages
+from .pipeline import parse_pages
 
-from config import KINNISVARA24_API_SEARCH_URL, KINNISVARA24_API_PAYLOAD
-from .common import ListingBase, AddressComponents
 
-
-@dataclass
+@dataclass(slots=True)
 class Kinnisvara24Listing(ListingBase):
+    TIMESTAMP_FIELD: ClassVar[str] = 'created_at'
+
     created_at: Optional[str]
 
 
 class Kinnisvara24Parser:
-    def parse(self) -> List[Kinnisvara24Listing]:
+    PORTAL = 'kinnisvara24'
+    LISTING_CLASS = Kinnisvara24Listing
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, search_url: str = KINNISVARA24_API_SEARCH_URL,
+                 client: Optional[HttpClient] = None, parse_workers: int = PARSE_WORKERS):
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.search_url = search_url
+        # Created on first request: parse workers build the parser only to parse (see parsers/pipeline.py)
+        self._client = client
+
+    @property
+    def client(self) -> HttpClient:
+        if self._client is None:
+            self._client = get_http_client()
+        return self._client
+
+    def parse(self, incremental: Optional[IncrementalState] = None) -> List[Kinnisvara24Listing]:
+        """Parse all listings, or with `incremental` only the pages newer than the previous crawl."""
+        return [listing for page in self.iter_pages(incremental) for listing in page.listings]
+
+    def iter_pages(self, incremental: Optional[IncrementalState] = None, columnar: bool = False,
+                   start_page: int = 1) -> Iterator[ListingPage]:
+        """Yield parsed listings page by page, in search results order, from `start_page` on; as a `ListingBatch`
+        with `columnar`."""
+        yield from parse_pages(self, self.iter_raw_pages(start_page), self.parse_workers, incremental,
+                               columnar=columnar)
+
+    def iter_raw_pages(self, start_page: int = 1) -> Iterator[RawPage]:
+        """Yield the `data` of search results pages as fetched, in order, from `start_page` on.
+
+        The first page is always fetched, for the number of pages.
+        """
         print(f"Fetching page 1 to determine total pages...")
         response_json = self.fetch_data(page=1)
 
         total_pages = response_json['meta']['last_page']
         items_per_page = len(response_json['data'])
         print(f"Total pages to fetch: {total_pages}, items per page: {items_per_page}")
+        if start_page <= 1:
+            yield RawPage(1, response_json['data'], items_per_page)
 
-        all_results: List[Kinnisvara24Listing] = []
-        all_results.extend(self.parse_listings(response_json['data']))
-
-        for page in range(2, total_pages + 1):
+        def fetch_remaining_page(page):
             print(f"Fetching page {page} of {total_pages}...")
-            response_json = self.fetch_data(page=page)
-            all_results.extend(self.parse_listings(response_json['data']))
+            return self.fetch_data(page=page)
 
-        return all_results
+        pages = range(max(start_page, 2), total_pages + 1)
+        for page, response_json in zip(pages, fetch_pages(fetch_remaining_page, pages, self.concurrency)):
+            yield RawPage(page, response_json['data'], items_per_page)
 
     def fetch_data(self, page):
-        url = KINNISVARA24_API_SEARCH_URL
+        url = self.search_url
         headers = {"User-Agent": "Mozilla/5.0", "Content-Type": "application/json"}
         payload = {
             **KINNISVARA24_API_PAYLOAD,
             "page": page
         }
-        response = requests.post(url, json=payload, headers=headers, verify=False)
-        response.raise_for_status()
-        return response.json()
+        response = self.client.post(self.PORTAL, url, json=payload, headers=headers)
+        with get_metrics().timer(self.PORTAL, 'decode'):
+            return response.json()
 
     def parse_listings(self, apartments) -> List[Kinnisvara24Listing]:
         results = []
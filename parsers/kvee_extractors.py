@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from config import KVEE_EXTRACTOR
+
+
+@dataclass(slots=True)
+class KvEeArticle:
+    """Raw field values of one search result `article`, before any type conversion."""
+    object_id: str
+    address: Optional[str]
+    link: Optional[str]
+    price: Optional[str]
+    area: Optional[str]
+    rooms: Optional[str]
+    img_url: Optional[str]
+    important_note: Optional[str]
+    excerpt: Optional[str]
+
+
+class BeautifulSoupExtractor:
+    """Reference implementation on top of BeautifulSoup and the pure-Python `html.parser`."""
+    name = 'bs4'
+
+    def __init__(self):
+        # Only imported when this backend is used
+        from bs4 import BeautifulSoup
+        self.soup_class = BeautifulSoup
+
+    def extract_articles(self, html: str) -> List[KvEeArticle]:
+        soup = self.soup_class(html, 'html.parser')
+        return [self.extract_article(art) for art in soup.find_all('article', attrs={'data-object-id': True})]
+
+    def extract_article(self, art) -> KvEeArticle:
+        address = None
+        link = None
+        h2 = art.find('h2')
+        if h2:
+            for a in h2.find_all('a'):
+                if 'object-promoted' not in (a.get('class') or []):
+                    address = a.get_text(strip=True)
+                    link = a.get('href')
+                    break
+
+        price_tag = art.find("div", attrs={"data-price": True})
+        area_div = art.find('div', class_='area')
+        rooms_div = art.find('div', class_='rooms')
+        object_important_note_p = art.find('p', class_='object-important-note')
+        desc_p = art.find('p', class_='object-excerpt')
+
+        return KvEeArticle(
+            object_id=art['data-object-id'],
+            address=address,
+            link=link,
+            price=price_tag['data-price'] if price_tag else None,
+            area=area_div.get_text(strip=True) if area_div else None,
+            rooms=rooms_div.get_text(strip=True) if rooms_div else None,
+            img_url=self.extract_img_url(art.select_one("div.images img")),
+            important_note=object_important_note_p.get_text(strip=True) if object_important_note_p else None,
+            excerpt=desc_p.get_text(strip=True) if desc_p else None,
+        )
+
+    def extract_img_url(self, img_el) -> Optional[str]:
+        if not img_el:
+            return None
+        if img_el.get("data-src"):
+            return img_el.get("data-src")
+        return img_el.get("src")
+
+
+class LxmlExtractor:
+    """Same fields as `BeautifulSoupExtractor`, extracted from an lxml (libxml2) tree with plain element walks."""
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        self.fragment_parser = lxml.html.fromstring
+
+    def extract_articles(self, html: str) -> List[KvEeArticle]:
+        if not html.strip():
+            return []
+        root = self.fragment_parser(f'<div>{html}</div>')
+        return [self.extract_article(art) for art in root.iter('article') if 'data-object-id' in art.attrib]
+
+    def extract_article(self, art) -> KvEeArticle:
+        address = None
+        link = None
+        h2 = next(art.iter('h2'), None)
+        if h2 is not None:
+            for a in h2.iter('a'):
+                if 'object-promoted' not in _classes(a):
+                    address = _text(a)
+                    link = a.get('href')
+                    break
+
+        price_tag = next((div for div in art.iter('div') if 'data-price' in div.attrib), None)
+        area_div = _find_by_class(art, 'div', 'area')
+        rooms_div = _find_by_class(art, 'div', 'rooms')
+        object_important_note_p = _find_by_class(art, 'p', 'object-important-note')
+        desc_p = _find_by_class(art, 'p', 'object-excerpt')
+
+        return KvEeArticle(
+            object_id=art.get('data-object-id'),
+            address=address,
+            link=link,
+            price=price_tag.get('data-price') if price_tag is not None else None,
+            area=_text(area_div) if area_div is not None else None,
+            rooms=_text(rooms_div) if rooms_div is not None else None,
+            img_url=self.extract_img_url(art),
+            important_note=_text(object_important_note_p) if object_important_note_p is not None else None,
+            excerpt=_text(desc_p) if desc_p is not None else None,
+        )
+
+    def extract_img_url(self, art) -> Optional[str]:
+        # Equivalent of the CSS selector "div.images img"
+        for img in art.iter('img'):
+            if any('images' in _classes(div) for div in img.iterancestors('div')):
+                return img.get('data-src') or img.get('src')
+        return None
+
+
+def _classes(el) -> List[str]:
+    return (el.get('class') or '').split()
+
+
+def _find_by_class(el, tag: str, class_name: str):
+    return next((child for child in el.iter(tag) if class_name in _classes(child)), None)
+
+
+def _text(el) -> str:
+    """Same as BeautifulSoup's get_text(strip=True): every text node stripped, empty ones dropped, joined."""
+    return ''.join(text.strip() for text in el.itertext() if text.strip())
+
+
+EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def get_extractor(name: str = KVEE_EXTRACTOR):
+    """Extractor by name; falls back to BeautifulSoup when lxml isn't installed."""
+    try:
+        return EXTRACTORS[name]()
+    except ImportError:
+        print(f"kv.ee extractor '{name}' is not available, falling back to '{BeautifulSoupExtractor.name}'")
+        return BeautifulSoupExtractor()
@@ -1,16 +1,22 @@
 import re
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import ClassVar, Iterator, List, Optional
 
-import requests
-from bs4 import BeautifulSoup
+from config import KVEE_BASE_URL, KVEE_SEARCH_URL, FETCH_CONCURRENCY, KVEE_EXTRACTOR, PARSE_WORKERS
+from metrics import get_metrics
+from .common import ListingBase, AddressComponents, ListingPage, RawPage
+from .description_attributes import extract_attributes
+from .http_client import HttpClient, get_http_client
+from .incremental import IncrementalState
+from .kvee_extractors import KvEeArticle, get_extractor
+from .pagination import fetch_pages
+from .pipeline import parse_pages
 
-from config import KVEE_BASE_URL, KVEE_SEARCH_URL
-from .common import ListingBase, AddressComponents
 
-
-@dataclass
+@dataclass(slots=True)
 class KvEeListing(ListingBase):
+    TIMESTAMP_FIELD: ClassVar[str] = 'date_activated'
+
     object_important_note: Optional[str]
     description: Optional[str]
     date_activated: Optional[str]
@@ -18,10 +24,48 @@ class KvEeListing(ListingBase):
     floor: Optional[int]
     total_floors: Optional[int]
     year_built: Optional[int]
+    heating: Optional[str]
+    condition: Optional[str]
+    energy_class: Optional[str]
+    balcony: Optional[bool]
 
 
 class KvEeParser:
-    def parse(self) -> List[KvEeListing]:
+    PORTAL = 'kvee'
+    LISTING_CLASS = KvEeListing
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, search_url: str = KVEE_SEARCH_URL,
+                 client: Optional[HttpClient] = None, extractor: str = KVEE_EXTRACTOR,
+                 parse_workers: int = PARSE_WORKERS):
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.search_url = search_url
+        # Created on first request: parse workers build the parser only to parse (see parsers/pipeline.py)
+        self._client = client
+        self.extractor = get_extractor(extractor)
+
+    @property
+    def client(self) -> HttpClient:
+        if self._client is None:
+            self._client = get_http_client()
+        return self._client
+
+    def parse(self, incremental: Optional[IncrementalState] = None) -> List[KvEeListing]:
+        """Parse all listings, or with `incremental` only the pages newer than the previous crawl."""
+        return [listing for page in self.iter_pages(incremental) for listing in page.listings]
+
+    def iter_pages(self, incremental: Optional[IncrementalState] = None, columnar: bool = False,
+                   start_page: int = 1) -> Iterator[ListingPage]:
+        """Yield parsed listings page by page, in search results order, from `start_page` on; as a `ListingBatch`
+        with `columnar`."""
+        yield from parse_pages(self, self.iter_raw_pages(start_page), self.parse_workers, incremental,
+                               options={'extractor': self.extractor.name}, columnar=columnar)
+
+    def iter_raw_pages(self, start_page: int = 1) -> Iterator[RawPage]:
+        """Yield search results pages as fetched, in order, from `start_page` on.
+
+        The first page is always fetched, for the total count and page size.
+        """
         print(f"Fetching page 0 (offset=0) to determine total count...")
         first_response = self.fetch_page(start=0)
 
@@ -29,21 +73,21 @@ class KvEeParser:
         items_per_page = len(first_response['objects'])
         total_pages = (total_items + items_per_page - 1) // items_per_page
         print(f"Total listings to fetch: {total_items}, total pages: {total_pages}, items per page: {items_per_page}")
+        if start_page <= 1:
+            yield RawPage(1, first_response, items_per_page)
+        start_page = max(start_page, 2)
 
-        all_results: List[KvEeListing] = []
-        all_results.extend(self.parse_listings(first_response))
-        current_page = 1
+        def fetch_remaining_page(offset):
+            print(f"Fetching page {offset // items_per_page + 1} of {total_pages} (offset={offset})...")
+            return self.fetch_page(start=offset)
 
-        for offset in range(items_per_page, total_items, items_per_page):
-            current_page += 1
-            print(f"Fetching page {current_page} of {total_pages} (offset={offset})...")
-            response = self.fetch_page(start=offset)
-            all_results.extend(self.parse_listings(response))
-
-        return all_results
+        offsets = range((start_page - 1) * items_per_page, total_items, items_per_page)
+        for page, response in enumerate(fetch_pages(fetch_remaining_page, offsets, self.concurrency),
+                                        start=start_page):
+            yield RawPage(page, response, items_per_page)
 
     def fetch_page(self, start):
-        url = KVEE_SEARCH_URL + str(start)
+        url = self.search_url + str(start)
         headers = {
             'accept': 'application/json',
             'accept-language': 'en-US,en;q=0.9,de;q=0.8,ru;q=0.7,et;q=0.6,zh-CN;q=0.5,zh;q=0.4,ko;q=0.3,lv;q=0.2,it;q=0.1,uk;q=0.1',
@@ -51,17 +95,16 @@ class KvEeParser:
             'referer': 'https://www.kv.ee/',
             'origin': 'https://www.kv.ee',
         }
-        response = requests.get(url, headers=headers, verify=False)
-        response.raise_for_status()
-        return response.json()
+        response = self.client.get(self.PORTAL, url, headers=headers)
+        with get_metrics().timer(self.PORTAL, 'decode'):
+            return response.json()
 
     def parse_listings(self, response: dict) -> List[KvEeListing]:
         objects = response.get('objects') or []
         object_data_by_id_map = {str(data['object_id']): data for data in objects}
 
         html = response.get('content') or ''
-        soup = BeautifulSoup(html, 'html.parser')
-        articles = soup.find_all('article', attrs={'data-object-id': True})
+        articles = self.extractor.extract_articles(html)
 
         results = []
         for art in articles:
@@ -69,48 +112,26 @@ class KvEeParser:
             results.append(listing)
         return results
 
-    def parse_listing(self, art, object_data_by_id_map: dict) -> KvEeListing:
-        obj_id = art['data-object-id']
-        address = None
-        link = None
-        h2 = art.find('h2')
-        if h2:
-            for a in h2.find_all('a'):
-                if 'object-promoted' not in (a.get('class') or []):
-                    address = a.get_text(strip=True)
-                    link = a.get('href')
-                    break
+    def parse_listing(self, art: KvEeArticle, object_data_by_id_map: dict) -> KvEeListing:
+        obj_id = art.object_id
+        address = art.address
+        link = art.link
 
         if link and link.startswith('/'):
             link = KVEE_BASE_URL + link
 
         address_components = self.parse_address_components(address)
 
-        price_tag = art.find("div", attrs={"data-price": True})
-        price = price_tag['data-price'] if price_tag else None
-        price = int(float(price)) if price else None
-
-        first_img = art.select_one("div.images img")
-        img_url = self.extract_img_url(first_img)
+        price = int(float(art.price)) if art.price else None
 
-        area_div = art.find('div', class_='area')
-        area_m2 = area_div.get_text(strip=True).replace('\u00a0m\u00b2', '') if area_div else None
+        area_m2 = art.area.replace('\u00a0m\u00b2', '') if art.area else None
         area_m2 = float(area_m2) if area_m2 else None
         price_m2 = int(float(price) / float(area_m2)) if price and area_m2 else None
 
-        object_important_note_p = art.find('p', class_='object-important-note')
-        object_important_note = object_important_note_p.get_text(strip=True) if object_important_note_p else None
+        description = art.excerpt
+        attributes = extract_attributes(description)
 
-        desc_p = art.find('p', class_='object-excerpt')
-        description = desc_p.get_text(strip=True) if desc_p else None
-
-        floor = self.parse_floor(description)
-        total_floors = self.parse_total_floors(description)
-        year_built = self.parse_year_built(description)
-
-        rooms_div = art.find('div', class_='rooms')
-        rooms = rooms_div.get_text(strip=True) if rooms_div else None
-        rooms = int(rooms) if rooms else None
+        rooms = int(art.rooms) if art.rooms else None
 
         extra_data = object_data_by_id_map.get(obj_id, {})
         date_activated = extra_data.get('date_activated')
@@ -127,14 +148,18 @@ class KvEeParser:
             price=price,
             price_m2=price_m2,
             link=link,
-            img_url=img_url,
-            object_important_note=object_important_note,
+            img_url=art.img_url,
+            object_important_note=art.important_note,
             description=description,
             date_activated=date_activated,
             advertisement_level=advertisement_level,
-            floor=floor,
-            total_floors=total_floors,
-            year_built=year_built
+            floor=attributes.floor,
+            total_floors=attributes.total_floors,
+            year_built=attributes.year_built,
+            heating=attributes.heating,
+            condition=attributes.condition,
+            energy_class=attributes.energy_class,
+            balcony=attributes.balcony,
         )
 
     def parse_address_components(self, address: Optional[str]) -> AddressComponents:
@@ -172,37 +197,3 @@ class KvEeParser:
                 street_with_building = street_with_building.replace(f'/{apartment_number}', '')
 
         return AddressComponents(city, street_with_building, apartment_number)
-
-    def extract_img_url(self, img_el):
-        if not img_el:
-            return None
-        if img_el.get("data-src"):
-            return img_el.get("data-src")
-        return img_el.get("src")
-
-    def parse_floor(self, description: Optional[str]) -> Optional[int]:
-        if not description:
-            return None
-        floor_match = re.search(r'Этаж\s*(\d+)(?:/\d+)?', description)
-        if floor_match:
-            return int(floor_match.group(1))
-        floor_match = re.search(r'(\d+)\.\s*этаж', description)
-        if floor_match:
-            return int(floor_match.group(1))
-        return None
-
-    def parse_total_floors(self, description: Optional[str]) -> Optional[int]:
-        if not description:
-            return None
-        floor_match = re.search(r'Этаж\s*\d+/(\d+)', description)
-        if floor_match:
-            return int(floor_match.group(1))
-        return None
-
-    def parse_year_built(self, description: Optional[str]) -> Optional[int]:
-        if not description:
-            return None
-        year_match = re.search(r'год постройки\s*(\d{4})', description)
-        if year_match:
-            return int(year_match.group(1))
-        return None
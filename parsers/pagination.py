@@ -0,0 +1,35 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from config import FETCH_CONCURRENCY
+
+K = TypeVar('K')
+T = TypeVar('T')
+
+
+def fetch_pages(fetch: Callable[[K], T], keys: Iterable[K], concurrency: int = FETCH_CONCURRENCY) -> Iterator[T]:
+    """Fetch pages for `keys` with up to `concurrency` requests in flight, yielding results in key order.
+
+    `keys` may be unbounded (e.g. City24, where the total is unknown upfront): the consumer stops
+    iterating once it has seen the last page, and any requests still in flight are discarded.
+    """
+    keys = iter(keys)
+    if concurrency <= 1:
+        for key in keys:
+            yield fetch(key)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque(executor.submit(fetch, key) for _, key in zip(range(concurrency), keys))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                # Keep the window full while the consumer processes the current page
+                for key in keys:
+                    pending.append(executor.submit(fetch, key))
+                    break
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
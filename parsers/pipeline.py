@@ -0,0 +1,90 @@
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+from config import PARSE_QUEUE_PER_WORKER
+from metrics import get_metrics
+from .batch import ListingBatch
+from .common import ListingPage, RawPage
+from .incremental import IncrementalState
+
+# Parsers built in this worker process, by (parser class, options)
+_worker_parsers = {}
+
+
+def parse_pages(parser, raw_pages: Iterator[RawPage], workers: int = 0,
+                incremental: Optional[IncrementalState] = None, options: Optional[dict] = None,
+                max_pending: Optional[int] = None, columnar: bool = False) -> Iterator[ListingPage]:
+    """Parse fetched pages with `parser.parse_listings`, yielding them in page order.
+
+    With `workers` > 0 pages are parsed in a pool of worker processes, so CPU-bound parsing runs
+    beside the fetching threads instead of competing with them for the GIL. At most `max_pending`
+    pages are queued or being parsed; `raw_pages` is only advanced when a slot frees up, so fetching
+    can't run ahead of parsing. In the workers the parser is rebuilt as `type(parser)(**options)`, which
+    only parses: its HTTP client is created on its first request, so workers never build one.
+
+    With `columnar`, each page's listings are a `ListingBatch` of `parser.LISTING_CLASS` (built in the
+    worker, which also makes the results cheaper to send back). With `incremental`, stops after the
+    first full page without new listings.
+
+    Parse time (measured where the page is parsed, so worker time too), pages and listings are recorded
+    under `parser.PORTAL` in `metrics.get_metrics()`.
+    """
+    if workers > 0:
+        pages = _parse_in_pool(parser, raw_pages, workers, options or {},
+                               max_pending or workers * PARSE_QUEUE_PER_WORKER, columnar)
+    else:
+        pages = ((raw_page, _parse(parser, raw_page.payload, columnar)) for raw_page in raw_pages)
+    metrics = get_metrics()
+    try:
+        for raw_page, (listings, parse_seconds) in pages:
+            metrics.observe(parser.PORTAL, 'parse', parse_seconds)
+            metrics.add(parser.PORTAL, 'pages')
+            metrics.add(parser.PORTAL, 'listings', len(listings))
+            yield ListingPage(raw_page.number, listings)
+            if incremental and incremental.is_caught_up(listings, raw_page.page_size):
+                print(f"Page {raw_page.number} has no new listings, stopping incremental crawl")
+                break
+    finally:
+        pages.close()
+        # Stops fetching right away; a plain iterator has nothing to stop
+        if hasattr(raw_pages, 'close'):
+            raw_pages.close()
+
+
+def _parse_in_pool(parser, raw_pages: Iterator[RawPage], workers: int, options: dict, max_pending: int,
+                   columnar: bool):
+    # spawn rather than fork: the crawl runs fetching threads (and other portals) while the pool starts
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    key = (type(parser), tuple(sorted(options.items())))
+    pending = deque()
+    try:
+        for raw_page in raw_pages:
+            pending.append((raw_page, executor.submit(_parse_page, key, raw_page.payload, columnar)))
+            if len(pending) >= max_pending:
+                raw_page, future = pending.popleft()
+                yield raw_page, future.result()
+        while pending:
+            raw_page, future = pending.popleft()
+            yield raw_page, future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _parse_page(key: tuple, payload, columnar: bool):
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        parser_class, options = key
+        parser = _worker_parsers[key] = parser_class(**dict(options))
+    return _parse(parser, payload, columnar)
+
+
+def _parse(parser, payload, columnar: bool):
+    """Parsed listings of a page, and the seconds it took."""
+    started = time.perf_counter()
+    listings = parser.parse_listings(payload)
+    if columnar:
+        listings = ListingBatch.from_listings(parser.LISTING_CLASS, listings)
+    return listings, time.perf_counter() - started
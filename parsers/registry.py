@@ -0,0 +1,41 @@
+import importlib
+import threading
+from typing import Dict, Iterator, Mapping, Type
+
+# Portal -> "module:class" of its parser
+PARSER_PATHS = {
+    'kvee': 'parsers.kvee_parser:KvEeParser',
+    'city24': 'parsers.city24_parser:City24Parser',
+    'kinnisvara24': 'parsers.kinnisvara24_parser:Kinnisvara24Parser',
+}
+
+
+class ParserRegistry(Mapping):
+    """Parser class by portal name, with each portal's module imported on first access.
+
+    Listing portal names (`list(PARSERS)`, `portal in PARSERS`) imports nothing, so `--help` or a City24 crawl
+    doesn't pay for the kv.ee HTML extractors.
+    """
+
+    def __init__(self, paths: Dict[str, str]):
+        self.paths = paths
+        self.classes: Dict[str, Type] = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, portal: str) -> Type:
+        # KeyError for unknown portals, like a dict
+        path = self.paths[portal]
+        with self.lock:
+            if portal not in self.classes:
+                module_name, class_name = path.split(':')
+                self.classes[portal] = getattr(importlib.import_module(module_name), class_name)
+            return self.classes[portal]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+PARSERS = ParserRegistry(PARSER_PATHS)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import CACHE_MAX_AGE, CACHE_PATH, CACHE_TTL
+
+# Response headers worth keeping: needed for decoding and for revalidation
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class CacheMissError(Exception):
+    """Raised in offline mode when a request has no cached response."""
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        return response
+
+
+class ResponseCache:
+    """Persistent response cache in a single SQLite file, bodies stored zlib-compressed.
+
+    Entries not stored or revalidated within `max_age` seconds are deleted on opening, so the file only holds
+    the pages of recent crawls.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_age: float = CACHE_MAX_AGE):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS response (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status_code INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS ix_response_stored_at ON response (stored_at)")
+        self.connection.commit()
+        self.evicted = self.evict(max_age)
+
+    @staticmethod
+    def make_key(method: str, url: str, payload: Any = None) -> str:
+        """Key by method, URL and request payload (kinnisvara24 pages differ only by the POST body)."""
+        serialized_payload = json.dumps(payload, sort_keys=True) if payload is not None else ''
+        return hashlib.sha256(f'{method.upper()}\n{url}\n{serialized_payload}'.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT url, status_code, headers, body, stored_at FROM response WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        url, status_code, headers, body, stored_at = row
+        return CachedResponse(url, status_code, json.loads(headers), zlib.decompress(body), stored_at)
+
+    def put(self, key: str, response: requests.Response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO response (key, url, status_code, headers, body, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response.url, response.status_code, json.dumps(headers), zlib.compress(response.content),
+                 time.time()),
+            )
+            self.connection.commit()
+
+    def touch(self, key: str):
+        """Mark an entry as fresh again after the server confirmed it's unchanged (304)."""
+        with self.lock:
+            self.connection.execute("UPDATE response SET stored_at = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+
+    def evict(self, max_age: float) -> int:
+        """Delete the entries stored or revalidated more than `max_age` seconds ago and give their space back to
+        the file system. Returns the number of deleted entries."""
+        with self.lock:
+            deleted = self.connection.execute(
+                "DELETE FROM response WHERE stored_at < ?", (time.time() - max_age,)
+            ).rowcount
+            self.connection.commit()
+            if deleted:
+                self.connection.execute("VACUUM")
+        return deleted
+
+    def close(self):
+        self.connection.close()
@@ -1,35 +1,286 @@
 import argparse
+import sys
 
-import urllib3
+from config import FETCH_CONCURRENCY, CACHE_PATH, CACHE_TTL, CACHE_MAX_AGE, INCREMENTAL_FULL_SWEEP_HOURS, \
+    PARSE_WORKERS, MATCH_REPORTS_DIR, EXPORT_DIR, COMPARABLES_K, DETECT_MIN_Z, IMAGE_CONCURRENCY, IMAGE_MAX_DISTANCE, \
+    METRICS_LOG_PATH, METRICS_PROM_PATH, CRAWL_RESUME_MAX_AGE_HOURS
+from parsers.registry import PARSERS
 
-from database import Database
-from parsers.city24_parser import City24Parser
-from parsers.kinnisvara24_parser import Kinnisvara24Parser
-from parsers.kvee_parser import KvEeParser
+# Commands import what they need when they run (SQLAlchemy, requests, NumPy, the portal parsers), so parsing
+# the arguments and --help stay fast; tests/test_startup.py keeps it that way
+
+
+def parse_portals(value: str):
+    """Parse --portal: a single portal, a comma-separated list or 'all'."""
+    if value == 'all':
+        return list(PARSERS)
+    portals = [portal.strip() for portal in value.split(',') if portal.strip()]
+    unknown = [portal for portal in portals if portal not in PARSERS]
+    if unknown or not portals:
+        raise argparse.ArgumentTypeError(
+            f"unknown portal(s): {', '.join(unknown) or value!r} (choose from {', '.join(PARSERS)} or all)")
+    return list(dict.fromkeys(portals))
 
 
 def main():
     parser = argparse.ArgumentParser(description='Parse real estate listings from portals.')
-    parser.add_argument('--portal', choices=['kvee', 'city24', 'kinnisvara24'], required=True, help='Portal to parse')
+    parser.add_argument('--portal', type=parse_portals,
+                        help=f"Portal to parse: {', '.join(PARSERS)}, a comma-separated list or 'all' "
+                             f"(several portals are crawled in parallel)")
+    parser.add_argument('--concurrency', type=int, default=FETCH_CONCURRENCY,
+                        help=f'Max number of page requests in flight (default: {FETCH_CONCURRENCY})')
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS,
+                        help='Parse fetched pages in this many worker processes per portal '
+                             f'(default: {PARSE_WORKERS}, parse on the fetching thread)')
+    parser.add_argument('--cache', action='store_true',
+                        help=f'Serve pages fetched less than {CACHE_TTL // 60} min ago from the response cache '
+                             f'({CACHE_PATH}) and revalidate older ones')
+    parser.add_argument('--offline', action='store_true',
+                        help='Re-parse a previous crawl from the response cache without touching the network')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Stop at the first page with no listings newer than the previous crawl '
+                             f'(a full crawl still runs every {INCREMENTAL_FULL_SWEEP_HOURS}h)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an unfinished full crawl (started within '
+                             f'{CRAWL_RESUME_MAX_AGE_HOURS}h) after its last saved page instead of starting over')
+    parser.add_argument('--metrics-log', default=METRICS_LOG_PATH,
+                        help=f'Append per-portal crawl metrics as JSON lines to this file '
+                             f'(default: {METRICS_LOG_PATH})')
+    parser.add_argument('--metrics-prom', default=METRICS_PROM_PATH,
+                        help=f'Write per-portal crawl metrics in Prometheus text format to this file '
+                             f'(default: {METRICS_PROM_PATH})')
+
+    commands = parser.add_subparsers(dest='command', required=False)
+    compare_parser = commands.add_parser(
+        'compare', help='Report listings present on one portal and missing on another (from the DB, no crawling)')
+    compare_parser.add_argument('--output-dir', default=MATCH_REPORTS_DIR,
+                                help=f'Directory for the CSV reports (default: {MATCH_REPORTS_DIR})')
+    compare_parser.add_argument('--no-fuzzy', action='store_true',
+                                help='Match on the address only, without the area/rooms/floor fallback')
+
+    only_on_parser = commands.add_parser(
+        'only-on', help='List listings whose building is on no other portal (from the DB, no crawling)')
+    only_on_parser.add_argument('only_on_portal', choices=list(PARSERS), help='Portal the listings are on')
+    only_on_parser.add_argument('--missing-on', type=parse_portals, default=None,
+                                help='Portal(s) to compare with, comma-separated (default: all others)')
+    only_on_parser.add_argument('--limit', type=int, default=20, help='Listings to show (default: 20)')
+
+    drops_parser = commands.add_parser(
+        'price-drops', help='List listings whose price dropped within the last days (from the price history)')
+    drops_parser.add_argument('--portal', dest='drop_portals', type=parse_portals, default=list(PARSERS),
+                              help='Portal, a comma-separated list or all (default: all)')
+    drops_parser.add_argument('--min-drop', type=float, default=5.0, help='Minimum drop in %% (default: 5)')
+    drops_parser.add_argument('--days', type=float, default=30.0, help='Period in days (default: 30)')
+
+    export_parser = commands.add_parser(
+        'export', help='Append the listings saved since the last export to Parquet, partitioned by crawl date')
+    export_parser.add_argument('--portal', dest='export_portals', type=parse_portals, default=list(PARSERS),
+                               help='Portal, a comma-separated list or all (default: all)')
+    export_parser.add_argument('--output-dir', default=EXPORT_DIR,
+                               help=f'Directory for the Parquet files (default: {EXPORT_DIR})')
+
+    fair_price_parser = commands.add_parser(
+        'fair-price', help='Estimate City24 fair prices from nearby comparable listings, largest discounts first')
+    fair_price_parser.add_argument('--k', type=int, default=COMPARABLES_K,
+                                   help=f'Comparables per listing (default: {COMPARABLES_K})')
+    fair_price_parser.add_argument('--limit', type=int, default=20, help='Listings to show (default: 20)')
+
+    detect_parser = commands.add_parser(
+        'detect', help='Rank listings by how far their price per m² is from comparable listings on all portals')
+    detect_parser.add_argument('--min-z', type=float, default=DETECT_MIN_Z,
+                               help=f'Minimum robust z-score (default: {DETECT_MIN_Z})')
+    detect_parser.add_argument('--overpriced', action='store_true',
+                               help='Show the most overpriced listings instead of the most underpriced')
+    detect_parser.add_argument('--limit', type=int, default=20, help='Listings to show (default: 20)')
+
+    duplicates_parser = commands.add_parser(
+        'duplicates', help='Find listings with the same photo on different portals (downloads unhashed photos)')
+    duplicates_parser.add_argument('--portal', dest='duplicate_portals', type=parse_portals, default=list(PARSERS),
+                                   help='Portal, a comma-separated list or all (default: all)')
+    duplicates_parser.add_argument('--max-distance', type=int, default=IMAGE_MAX_DISTANCE,
+                                   help=f'Max differing bits of two photo hashes (default: {IMAGE_MAX_DISTANCE})')
+    duplicates_parser.add_argument('--concurrency', dest='image_concurrency', type=int, default=IMAGE_CONCURRENCY,
+                                   help=f'Photo downloads in flight (default: {IMAGE_CONCURRENCY})')
+    duplicates_parser.add_argument('--no-download', action='store_true',
+                                   help='Only compare the photos fingerprinted before')
+    duplicates_parser.add_argument('--all', dest='all_duplicates', action='store_true',
+                                   help='Also show pairs whose addresses already match')
+    duplicates_parser.add_argument('--limit', type=int, default=20, help='Pairs to show (default: 20)')
+
     args = parser.parse_args()
+    if args.command == 'compare':
+        return compare(args)
+    if args.command == 'only-on':
+        return only_on(args)
+    if args.command == 'price-drops':
+        return price_drops(args)
+    if args.command == 'export':
+        return export(args)
+    if args.command == 'fair-price':
+        return fair_price(args)
+    if args.command == 'detect':
+        return detect(args)
+    if args.command == 'duplicates':
+        return duplicates(args)
+    if not args.portal:
+        parser.error('the following arguments are required: --portal')
+    return crawl(args)
+
+
+def crawl(args) -> int:
+    from crawler import CrawlOptions, crawl_portals, format_summary
+    from database import Database, DatabaseWriter
+    from database.writer import format_writer_stats
+    from metrics import append_json_log, format_metrics, get_metrics, write_prometheus
+    from parsers.http_client import HttpClient
+    from parsers.response_cache import ResponseCache
 
+    _disable_certificate_warnings()
     db = Database()
-    portal = args.portal
+    cache = ResponseCache() if args.cache or args.offline else None
+    if cache is not None and cache.evicted:
+        print(f"Deleted {cache.evicted} response cache entries older than {CACHE_MAX_AGE // 3600}h")
+    client = HttpClient(cache=cache, offline=args.offline)
+    options = CrawlOptions(concurrency=args.concurrency, incremental=args.incremental, resume=args.resume,
+                           parse_workers=args.parse_workers)
 
-    if portal == 'kvee':
-        listings = KvEeParser().parse()
-        db.save_kvee_listings(listings)
-    if portal == 'city24':
-        listings = City24Parser().parse()
-        db.save_city24_listings(listings)
-    if portal == 'kinnisvara24':
-        listings = Kinnisvara24Parser().parse()
-        db.save_kinnisvara24_listings(listings)
-    print(f"Processed {len(listings)} listings from {portal}")
+    writer = DatabaseWriter(db)
+    results = crawl_portals(args.portal, db, client, options, writer)
+    writer.close()
+    for result in results:
+        if result.ok:
+            print(f"Processed {result.listings_count} listings from {result.portal}")
+    print(format_summary(results))
 
+    snapshot = get_metrics().snapshot()
+    stats = client.connection_stats()
+    line = f"HTTP requests: {stats.requests}, connections opened: {stats.opened}, reused: {stats.reused}, " \
+           f"retries: {client.retries}"
+    if cache is not None:
+        line += f", served from the response cache: {sum(metrics.cache_hits for metrics in snapshot)}, " \
+                f"revalidated: {sum(metrics.cache_revalidations for metrics in snapshot)}"
+    print(line)
+    print(format_writer_stats(writer.stats()))
 
-if __name__ == '__main__':
+    print(format_metrics(snapshot))
+    append_json_log(args.metrics_log, snapshot)
+    write_prometheus(args.metrics_prom, snapshot)
+    print(f"Crawl metrics appended to {args.metrics_log} and written to {args.metrics_prom}")
+    client.close()
+    db.close()
+    return 0 if all(result.ok for result in results) else 1
+
+
+def compare(args) -> int:
+    from database import Database
+    from matching import find_portal_gaps, format_gaps, load_portal_indexes, write_reports
+
+    db = Database()
+    indexes = load_portal_indexes(db, list(PARSERS))
+    db.close()
+    gaps = find_portal_gaps(indexes, fuzzy=not args.no_fuzzy)
+    for path in write_reports(gaps, args.output_dir):
+        print(f"Saved {path}")
+    print(format_gaps(gaps, indexes))
+    return 0
+
+
+def only_on(args) -> int:
+    from database import Database
+
+    among = [args.only_on_portal] + args.missing_on if args.missing_on else None
+    db = Database()
+    listings = db.only_on(args.only_on_portal, among)
+    db.close()
+    others = ', '.join(portal for portal in (among or PARSERS) if portal != args.only_on_portal)
+    print(f"{len(listings)} {args.only_on_portal} listings in buildings without listings on {others}")
+    for listing in listings[:args.limit]:
+        print(f"  {listing['id']}: {listing['price'] or '-'} €  {listing['address'] or ''}  {listing['link'] or ''}")
+    return 0
+
+
+def price_drops(args) -> int:
+    from database import Database
+
+    db = Database()
+    for portal in args.drop_portals:
+        drops = db.price_drops(portal, args.min_drop, args.days)
+        print(f"{portal}: {len(drops)} listings dropped more than {args.min_drop:g}% in {args.days:g} days")
+        for drop in drops:
+            print(f"  {drop.listing_id}: {drop.peak_price} -> {drop.price} (-{drop.drop_pct:.1f}%) "
+                  f"since {drop.changed_at:%Y-%m-%d %H:%M}  {drop.address or ''}  {drop.link or ''}")
+    db.close()
+    return 0
+
+
+def export(args) -> int:
+    from database import Database
+    from export import export_portal, format_export
+
+    db = Database()
+    for portal in args.export_portals:
+        print(format_export(export_portal(db, portal, args.output_dir)))
+    db.close()
+    return 0
+
+
+def fair_price(args) -> int:
+    from database import Database
+    from spatial import SpatialIndex, format_fair_prices
+
+    db = Database()
+    index = SpatialIndex.load(db)
+    db.close()
+    estimates = index.fair_prices(args.k)
+    print(f"{len(estimates)} of {len(index)} geocoded City24 listings estimated from {args.k} comparables")
+    print(format_fair_prices(estimates, args.limit))
+    return 0
+
+
+def detect(args) -> int:
+    from database import Database
+    from detect import find_outliers, format_outliers, load_listing_arrays
+
+    db = Database()
+    listings = load_listing_arrays(db, list(PARSERS))
+    db.close()
+    outliers = find_outliers(listings, args.min_z)
+    underpriced = [outlier for outlier in outliers if outlier.z < 0]
+    overpriced = [outlier for outlier in reversed(outliers) if outlier.z > 0]
+    print(f"{len(listings['id'])} listings compared: {len(underpriced)} underpriced, {len(overpriced)} overpriced "
+          f"(|z| >= {args.min_z:g})")
+    print(format_outliers(overpriced if args.overpriced else underpriced, args.limit))
+    return 0
+
+
+def duplicates(args) -> int:
+    from database import Database
+    from duplicates import ImageCache, find_duplicates, fingerprint_images, format_duplicates, format_fingerprints, \
+        load_listing_hashes
+    from parsers.http_client import HttpClient
+
+    db = Database()
+    if not args.no_download:
+        _disable_certificate_warnings()
+        client = HttpClient()
+        print(format_fingerprints(fingerprint_images(db, client, args.duplicate_portals, ImageCache(),
+                                                     args.image_concurrency)))
+        client.close()
+    listings = load_listing_hashes(db, args.duplicate_portals)
+    db.close()
+    pairs = find_duplicates(listings, args.duplicate_portals, args.max_distance)
+    new_pairs = [pair for pair in pairs if not pair.same_address]
+    print(f"{len(pairs)} listing pairs with the same photo on different portals, {len(new_pairs)} of them with "
+          f"different addresses")
+    print(format_duplicates(pairs if args.all_duplicates else new_pairs, args.limit))
+    return 0
+
+
+def _disable_certificate_warnings():
     # disable warnings for "not able to verify SSL self-signed certificate"
+    import urllib3
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-    main()
+
+if __name__ == '__main__':
+    sys.exit(main())
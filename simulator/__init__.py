@@ -0,0 +1,4 @@
+from .server import PortalSimulator
+from .listings import SyntheticApartment, generate_apartments
+
+__all__ = ['PortalSimulator', 'SyntheticApartment', 'generate_apartments']
@@ -0,0 +1,34 @@
+import argparse
+import time
+
+from .server import PortalSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic kv.ee, City24 and kinnisvara24 search APIs locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--listings', type=int, default=10000, help='Number of synthetic apartments')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay per response, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of responses failing with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of responses failing with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After sent with 429, in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.listings} synthetic apartments...")
+    simulator = PortalSimulator(listings=args.listings, latency=args.latency, error_rate=args.error_rate,
+                                throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed,
+                                host=args.host, port=args.port)
+    simulator.start()
+    print(f"Portal simulator listening on {simulator.base_url}")
+    print(f"Point the crawler at it with: PORTAL_SIMULATOR_URL={simulator.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Every portal shows the same photo of an apartment, but not the same file: City24 serves it smaller and
+# kinnisvara24 re-encodes it slightly brighter
+IMAGE_SIZES = {
+    'kvee': (320, 240),
+    'city24': (200, 150),
+    'kinnisvara24': (320, 240),
+}
+IMAGE_BRIGHTNESS = {
+    'kinnisvara24': 12,
+}
+# Coarse random grid the photo is interpolated from (columns, rows)
+IMAGE_GRID = (12, 9)
+
+
+def apartment_image(index: int, portal: str) -> bytes:
+    """Deterministic PNG "photo" of apartment `index` as served by `portal`."""
+    width, height = IMAGE_SIZES[portal]
+    grid = np.random.default_rng(index).uniform(0, 230, (IMAGE_GRID[1], IMAGE_GRID[0], 3))
+    # Bilinear interpolation of the grid over the image: one weight matrix per axis, rows first, then columns
+    rows = (_interpolation(height, IMAGE_GRID[1]) @ grid.reshape(IMAGE_GRID[1], -1)).reshape(height, IMAGE_GRID[0], 3)
+    pixels = _interpolation(width, IMAGE_GRID[0]) @ rows
+    pixels = np.clip(pixels + IMAGE_BRIGHTNESS.get(portal, 0), 0, 255).astype(np.uint8)
+    return encode_png(pixels)
+
+
+def _interpolation(size: int, points: int) -> np.ndarray:
+    """(size, points) weights interpolating `points` evenly spaced values linearly over `size` pixels."""
+    positions = np.linspace(0, points - 1, size)
+    return np.maximum(0, 1 - np.abs(positions[:, None] - np.arange(points)[None, :]))
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """PNG file of an RGB uint8 array of shape (height, width, 3)."""
+    height, width, _ = pixels.shape
+    # Filter type 2 (up): every scanline is stored as its difference to the one above, which compresses gradients well
+    rows = np.diff(pixels, axis=0, prepend=np.zeros((1, width, 3), dtype=np.uint8))
+    raw = b''.join(b'\x02' + row.tobytes() for row in rows)
+    return (b'\x89PNG\r\n\x1a\n'
+            + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + _chunk(b'IDAT', zlib.compress(raw, 1))
+            + _chunk(b'IEND', b''))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
@@ -0,0 +1,90 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+DISTRICTS = ['Lasnamäe', 'Mustamäe', 'Kesklinn', 'Põhja-Tallinn', 'Haabersti', 'Kristiine', 'Nõmme', 'Pirita']
+STREETS = [
+    'Punane tn', 'Pärnu mnt', 'Narva mnt', 'Tartu mnt', 'Sõpruse pst', 'Mustamäe tee', 'Pirita tee',
+    'Kalaranna tn', 'Tiiu tn', 'Akadeemia tee', 'Paldiski mnt', 'Laagna tee', 'Uus-Maleva tn', 'Vene tn',
+    'Pikaliiva tn', 'J. Kunderi tn', 'Ehitajate tee', 'Sõle tn', 'Kadaka tee', 'Majaka tn',
+]
+HEATING = [('центральное отопление', 'keskküte'), ('газовое отопление', 'gaasiküte'),
+           ('электрическое отопление', 'elektriküte')]
+CONDITION = [('новостройка', 'uusehitis'), ('отремонтировано', 'renoveeritud'), ('хорошее состояние', 'heas korras'),
+             ('требует ремонта', 'vajab remonti')]
+ENERGY_CLASSES = ['A', 'B', 'C', 'D', 'E']
+
+# Newest listing is published at this moment, every next one a few minutes earlier
+NEWEST_LISTING_AT = datetime(2026, 1, 1, 12, 0, 0)
+
+# Share of apartments posted on each portal
+PORTAL_COVERAGE = {'kvee': 0.9, 'city24': 0.8, 'kinnisvara24': 0.65}
+
+
+@dataclass
+class SyntheticApartment:
+    """One apartment for sale; each portal renders it in its own format."""
+    index: int
+    district: str
+    street: str
+    building: str
+    apartment_number: Optional[str]
+    rooms: int
+    area_m2: float
+    price: int
+    floor: int
+    total_floors: int
+    year_built: int
+    heating: int
+    condition: int
+    energy_class: str
+    balcony: bool
+    estonian_excerpt: bool
+    latitude: float
+    longitude: float
+    published_at: datetime
+    portals: frozenset
+
+    @property
+    def price_m2(self) -> int:
+        return int(self.price / self.area_m2)
+
+
+def make_apartment(index: int, seed: int = 0) -> SyntheticApartment:
+    """Deterministic apartment for `index`, so the same scale and seed always serve the same data."""
+    rng = random.Random(seed * 1_000_003 + index)
+    rooms = rng.choices([1, 2, 3, 4, 5], weights=[20, 35, 30, 10, 5])[0]
+    area_m2 = round(rng.uniform(18, 30) * rooms + rng.uniform(0, 15), 1)
+    total_floors = rng.choice([2, 3, 4, 5, 5, 9, 9, 12, 16])
+    year_built = rng.choice([rng.randint(1900, 1940), rng.randint(1950, 1991), rng.randint(1992, 2025)])
+    building = str(rng.randint(1, 180)) + rng.choice(['', '', '', 'a', 'b'])
+    portals = frozenset(portal for portal, share in PORTAL_COVERAGE.items() if rng.random() < share)
+
+    return SyntheticApartment(
+        index=index,
+        district=rng.choice(DISTRICTS),
+        street=rng.choice(STREETS),
+        building=building,
+        apartment_number=str(rng.randint(1, 120)) if rng.random() < 0.8 else None,
+        rooms=rooms,
+        area_m2=area_m2,
+        price=int(area_m2 * max(900.0, rng.gauss(3200, 700))) // 100 * 100,
+        floor=rng.randint(1, total_floors),
+        total_floors=total_floors,
+        year_built=year_built,
+        heating=rng.randrange(len(HEATING)),
+        condition=rng.randrange(len(CONDITION)),
+        energy_class=rng.choice(ENERGY_CLASSES),
+        balcony=rng.random() < 0.6,
+        estonian_excerpt=rng.random() < 0.2,
+        latitude=round(rng.uniform(59.38, 59.47), 6),
+        longitude=round(rng.uniform(24.58, 24.88), 6),
+        published_at=NEWEST_LISTING_AT - timedelta(minutes=index * 7),
+        portals=portals,
+    )
+
+
+def generate_apartments(count: int, seed: int = 0) -> List[SyntheticApartment]:
+    """`count` apartments sorted newest-first, like all three portals' search results."""
+    return [make_apartment(index, seed) for index in range(count)]
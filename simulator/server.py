@@ -0,0 +1,291 @@
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import urlsplit, parse_qs
+
+from config import KVEE_SEARCH_URL, CITY24_API_SEARCH_URL, KINNISVARA24_API_SEARCH_URL
+from .images import apartment_image
+from .listings import SyntheticApartment, generate_apartments, HEATING, CONDITION
+
+KVEE_PAGE_SIZE = 50
+KINNISVARA24_PAGE_SIZE = 50
+# Listing photos: GET /images/<portal>/<apartment index>.png (City24: /images/city24/<index>/<format>.png)
+IMAGE_PATH = re.compile(r'/images/(kvee|city24|kinnisvara24)/(\d+)(?:/\w+)?\.png')
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+
+class PortalSimulator:
+    """Local stand-in for the kv.ee, City24 and kinnisvara24 search APIs, serving synthetic listings.
+
+    Every response can be delayed by `latency` seconds, and fail with 500 (`error_rate`) or
+    429 with Retry-After (`throttle_rate`). Listing photos are served locally too: the same apartment has a
+    similar, but not byte-identical, image on every portal (see simulator/images.py).
+
+    Usage:
+        with PortalSimulator(listings=1000) as simulator:
+            KvEeParser(search_url=simulator.kvee_search_url).parse()
+    """
+
+    def __init__(self, listings: int = 1000, latency: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 1, seed: int = 0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_served = 0
+
+        apartments = generate_apartments(listings, seed)
+        self.apartment_count = listings
+        self.apartments_by_portal: Dict[str, List[SyntheticApartment]] = {
+            portal: [apartment for apartment in apartments if portal in apartment.portals]
+            for portal in ('kvee', 'city24', 'kinnisvara24')
+        }
+
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def kvee_search_url(self) -> str:
+        return self._local_url(KVEE_SEARCH_URL)
+
+    @property
+    def city24_search_url(self) -> str:
+        return self._local_url(CITY24_API_SEARCH_URL)
+
+    @property
+    def kinnisvara24_search_url(self) -> str:
+        return self._local_url(KINNISVARA24_API_SEARCH_URL)
+
+    @property
+    def search_urls(self) -> Dict[str, str]:
+        return {
+            'kvee': self.kvee_search_url,
+            'city24': self.city24_search_url,
+            'kinnisvara24': self.kinnisvara24_search_url,
+        }
+
+    def start(self) -> 'PortalSimulator':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread:
+            self.server.shutdown()
+            self.thread = None
+        self.server.server_close()
+
+    def __enter__(self) -> 'PortalSimulator':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _local_url(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f'{self.base_url}{parts.path}?{parts.query}' if parts.query else f'{self.base_url}{parts.path}'
+
+    def injected_failure(self):
+        """Return the status code of an injected failure for the current request, if any."""
+        with self.lock:
+            self.requests_served += 1
+            roll = self.rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    # kv.ee: GET /ru/search?...&start=<offset>
+    def kvee_page(self, start: int) -> dict:
+        apartments = self.apartments_by_portal['kvee']
+        page = apartments[start:start + KVEE_PAGE_SIZE]
+        return {
+            'countsOverall': len(apartments),
+            'objects': [
+                {
+                    'object_id': _kvee_id(apartment),
+                    'date_activated': apartment.published_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    'advertisment_level': apartment.index % 3,
+                }
+                for apartment in page
+            ],
+            'content': ''.join(_kvee_article(apartment, self.base_url) for apartment in page),
+        }
+
+    # City24: GET /ru_RU/search/realties?...&itemsPerPage=<limit>&page=<page>
+    def city24_page(self, limit: int, page: int) -> list:
+        apartments = self.apartments_by_portal['city24'][(page - 1) * limit:page * limit]
+        return [_city24_item(apartment, self.base_url) for apartment in apartments]
+
+    # kinnisvara24: POST /search with {"page": <page>, ...}
+    def kinnisvara24_page(self, page: int) -> dict:
+        apartments = self.apartments_by_portal['kinnisvara24']
+        last_page = max(1, (len(apartments) + KINNISVARA24_PAGE_SIZE - 1) // KINNISVARA24_PAGE_SIZE)
+        page_apartments = apartments[(page - 1) * KINNISVARA24_PAGE_SIZE:page * KINNISVARA24_PAGE_SIZE]
+        return {
+            'data': [_kinnisvara24_item(apartment, self.base_url) for apartment in page_apartments],
+            'meta': {'current_page': page, 'last_page': last_page, 'total': len(apartments)},
+        }
+
+
+def _make_handler(simulator: PortalSimulator):
+    class PortalSimulatorHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            image = IMAGE_PATH.fullmatch(url.path)
+            if url.path == '/ru/search':
+                self._respond(lambda: simulator.kvee_page(int(query.get('start', 0))))
+            elif url.path == '/ru_RU/search/realties':
+                self._respond(lambda: simulator.city24_page(int(query.get('itemsPerPage', 1000)),
+                                                            int(query.get('page', 1))))
+            elif image and int(image[2]) < simulator.apartment_count:
+                self._respond(lambda: apartment_image(int(image[2]), image[1]), 'image/png')
+            else:
+                self._send(404, b'{}')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if urlsplit(self.path).path == '/search':
+                self._respond(lambda: simulator.kinnisvara24_page(int(payload.get('page', 1))))
+            else:
+                self._send(404, b'{}')
+
+        def _respond(self, build_body, content_type: str = JSON_CONTENT_TYPE):
+            if simulator.latency:
+                time.sleep(simulator.latency)
+            failure = simulator.injected_failure()
+            if failure == 429:
+                self._send(429, b'{"error": "Too Many Requests"}', {'Retry-After': str(simulator.retry_after)})
+            elif failure:
+                self._send(failure, b'{"error": "Internal Server Error"}')
+            else:
+                body = build_body()
+                if content_type == JSON_CONTENT_TYPE:
+                    body = json.dumps(body, ensure_ascii=False).encode()
+                self._send(200, body, content_type=content_type)
+
+        def _send(self, status: int, body: bytes, headers: dict = None, content_type: str = JSON_CONTENT_TYPE):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PortalSimulatorHandler
+
+
+def _kvee_id(apartment: SyntheticApartment) -> int:
+    return 3_000_000 + apartment.index
+
+
+def _kvee_excerpt(apartment: SyntheticApartment) -> str:
+    heating_ru, heating_et = HEATING[apartment.heating]
+    condition_ru, condition_et = CONDITION[apartment.condition]
+    if apartment.estonian_excerpt:
+        parts = [f'Korrus {apartment.floor}/{apartment.total_floors}', f'ehitusaasta {apartment.year_built}',
+                 heating_et, condition_et, f'energiaklass {apartment.energy_class}']
+        if apartment.balcony:
+            parts.append('rõdu')
+    else:
+        parts = [f'Этаж {apartment.floor}/{apartment.total_floors}', f'год постройки {apartment.year_built}',
+                 heating_ru, condition_ru, f'класс энергопотребления {apartment.energy_class}']
+        if apartment.balcony:
+            parts.append('балкон')
+    return ', '.join(parts)
+
+
+def _kvee_article(apartment: SyntheticApartment, base_url: str) -> str:
+    obj_id = _kvee_id(apartment)
+    building = apartment.building
+    if apartment.apartment_number:
+        building = f'{building}-{apartment.apartment_number}'
+    address = f'Tallinn, {apartment.district}, {apartment.street} {building}'
+    note = f'<p class="object-important-note">Цена снижена!</p>' if apartment.index % 5 == 0 else ''
+    return (
+        f'<article data-object-id="{obj_id}">'
+        f'<h2><a href="/ru/{obj_id}" class="object-promoted">TOP</a>'
+        f'<a href="/ru/{obj_id}">{html.escape(address)}</a></h2>'
+        f'<div class="images">'
+        f'<img data-src="{base_url}/images/kvee/{apartment.index}.png" src="/placeholder.gif"></div>'
+        f'<div data-price="{apartment.price}" class="price">{apartment.price} €</div>'
+        f'<div class="rooms">{apartment.rooms}</div>'
+        f'<div class="area">{apartment.area_m2}\u00a0m\u00b2</div>'
+        f'{note}'
+        f'<p class="object-excerpt">{html.escape(_kvee_excerpt(apartment))}</p>'
+        f'</article>'
+    )
+
+
+def _city24_item(apartment: SyntheticApartment, base_url: str) -> dict:
+    house_number = apartment.building
+    if apartment.apartment_number:
+        house_number += '/' + apartment.apartment_number
+    return {
+        'friendly_id': f'{4_000_000 + apartment.index}',
+        'address': {
+            'parish_name': 'Tallinn',
+            'city_name': f'{apartment.district} linnaosa',
+            'street_name': apartment.street,
+            'house_number': house_number,
+        },
+        'price': f'{apartment.price}.00',
+        'price_per_unit': apartment.price_m2,
+        'main_image': {'url': f'{base_url}/images/city24/{apartment.index}/{{fmt:em}}.png'},
+        'slogans': {'ru_RU': {'slogan': 'Отличная квартира'}} if apartment.index % 4 == 0 else None,
+        'attributes': {'FLOOR': apartment.floor, 'TOTAL_FLOORS': apartment.total_floors},
+        'room_count': apartment.rooms,
+        'property_size': apartment.area_m2,
+        'date_published': apartment.published_at.strftime('%Y-%m-%dT%H:%M:%S+02:00'),
+        'year_built': apartment.year_built,
+        'latitude': apartment.latitude,
+        'longitude': apartment.longitude,
+    }
+
+
+def _kinnisvara24_item(apartment: SyntheticApartment, base_url: str) -> dict:
+    obj_id = 5_000_000 + apartment.index
+    short_address = f'{apartment.street} {apartment.building}'
+    return {
+        'id': obj_id,
+        'permalink': f'https://kinnisvara24.ee/{obj_id}',
+        'address': {
+            'address': f'{short_address}, {apartment.district}, Tallinn, Harju maakond',
+            'short_address': short_address,
+            'A1': 'Harju maakond',
+            'A2': 'Tallinn',
+            'A3': apartment.district,
+            'A5': apartment.street,
+            'A7': apartment.building,
+            'A8': apartment.apartment_number or '',
+        },
+        'hind': apartment.price,
+        'price_per_m2': apartment.price_m2,
+        'area': apartment.area_m2,
+        'images': [{'url': f'{base_url}/images/kinnisvara24/{apartment.index}.png'}],
+        'rooms': apartment.rooms,
+        'created_at': apartment.published_at.strftime('%Y-%m-%d %H:%M:%S'),
+    }
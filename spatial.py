@@ -0,0 +1,215 @@
+import math
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from config import SPATIAL_CELL_M, COMPARABLES_K, COMPARABLE_AREA_TOLERANCE
+from database import Database, City24ListingModel
+
+EARTH_RADIUS_M = 6371000.0
+# Cell (x, y) is stored as the code (x + CELL_OFFSET) * CELL_SPAN + y + CELL_OFFSET, which sorts like (x, y)
+CELL_OFFSET = 2 ** 20
+CELL_SPAN = 2 ** 21
+
+
+@dataclass
+class Comparable:
+    listing_id: str
+    distance_m: float
+    rooms: Optional[int]
+    area_m2: Optional[float]
+    price: Optional[int]
+    price_m2: Optional[int]
+
+
+@dataclass
+class FairPrice:
+    listing_id: str
+    price: int
+    area_m2: float
+    # Median price per m² of the comparables times the listing's area
+    estimate: int
+    comparables: int
+    # Distance to the farthest comparable used
+    radius_m: float
+
+    @property
+    def discount_pct(self) -> float:
+        """How far the asking price is below the estimate (negative: above)."""
+        return (self.estimate - self.price) / self.estimate * 100
+
+
+class SpatialIndex:
+    """Geocoded listings in a uniform grid, for radius and k-nearest queries.
+
+    Coordinates are projected to metres around the mean latitude (equirectangular: accurate to well below a metre
+    over a city) and bucketed into square cells of `cell_m`. Listings are stored sorted by cell code, so a column
+    of adjacent cells is one slice of the arrays, found by binary search, and a query only measures the distance
+    to listings in the cells around the point.
+    """
+
+    def __init__(self, listing_ids, latitudes, longitudes, rooms, areas, prices, prices_m2,
+                 cell_m: float = SPATIAL_CELL_M):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        geocoded = np.isfinite(latitudes) & np.isfinite(longitudes)
+        self.cell_m = cell_m
+        self.origin = (float(latitudes[geocoded].mean()), float(longitudes[geocoded].mean())) if geocoded.any() \
+            else (0.0, 0.0)
+
+        x, y = self._project(latitudes[geocoded], longitudes[geocoded])
+        cell_x, cell_y = self._cell(x), self._cell(y)
+        codes = self._code(cell_x, cell_y)
+        order = np.argsort(codes, kind='stable')
+        self.codes = codes[order]
+        self.x, self.y = x[order], y[order]
+        self.latitudes, self.longitudes = latitudes[geocoded][order], longitudes[geocoded][order]
+        self.listing_ids = np.asarray(listing_ids, dtype=object)[geocoded][order]
+        self.rooms = _numbers(rooms)[geocoded][order]
+        self.areas = _numbers(areas)[geocoded][order]
+        self.prices = _numbers(prices)[geocoded][order]
+        self.prices_m2 = _numbers(prices_m2)[geocoded][order]
+
+        self.cell_bounds = (cell_x.min(), cell_x.max(), cell_y.min(), cell_y.max()) if len(codes) else None
+        self.positions = {listing_id: position for position, listing_id in enumerate(self.listing_ids)}
+
+    @classmethod
+    def load(cls, db: Database, cell_m: float = SPATIAL_CELL_M) -> 'SpatialIndex':
+        """Index the geocoded City24 listings (the only portal with coordinates)."""
+        model = City24ListingModel
+        with db.lock:
+            rows = db.session.query(model.id, model.latitude, model.longitude, model.rooms, model.area_m2,
+                                    model.price, model.price_m2) \
+                .filter(model.latitude.isnot(None), model.longitude.isnot(None)).all()
+        return cls(*(zip(*rows) if rows else [()] * 7), cell_m=cell_m)
+
+    def __len__(self) -> int:
+        return len(self.listing_ids)
+
+    def within(self, latitude: float, longitude: float, radius_m: float, rooms: Optional[int] = None,
+               area_m2: Optional[float] = None) -> List[Comparable]:
+        """Listings within `radius_m` of the point, nearest first; with `rooms` / `area_m2` only similar ones."""
+        x, y = self._project(latitude, longitude)
+        cell_x, cell_y = int(self._cell(x)), int(self._cell(y))
+        ring = math.ceil(radius_m / self.cell_m)
+        positions = self._positions([(cell_x + dx, cell_y - ring, cell_y + ring) for dx in range(-ring, ring + 1)])
+        positions, distances = self._similar(positions, x, y, rooms, area_m2)
+        inside = distances <= radius_m
+        return self._comparables(positions[inside], distances[inside])
+
+    def nearest(self, latitude: float, longitude: float, k: int, rooms: Optional[int] = None,
+                area_m2: Optional[float] = None, exclude: Optional[str] = None) -> List[Comparable]:
+        """The `k` nearest listings (with `rooms` / `area_m2`: nearest similar ones), nearest first.
+
+        Searches rings of cells outwards. Anything outside the rings searched so far is at least `ring * cell_m`
+        away, so the search stops once `k` listings are found closer than that.
+        """
+        x, y = self._project(latitude, longitude)
+        cell_x, cell_y = int(self._cell(x)), int(self._cell(y))
+        last_ring = 0
+        if self.cell_bounds:
+            min_x, max_x, min_y, max_y = self.cell_bounds
+            # Beyond this ring there are no more listings
+            last_ring = int(max(cell_x - min_x, max_x - cell_x, cell_y - min_y, max_y - cell_y, 0))
+        found_positions, found_distances = [], []
+        for ring in range(last_ring + 1):
+            positions = self._positions(_ring_columns(cell_x, cell_y, ring))
+            positions, distances = self._similar(positions, x, y, rooms, area_m2)
+            if exclude is not None:
+                keep = self.listing_ids[positions] != exclude
+                positions, distances = positions[keep], distances[keep]
+            found_positions.append(positions)
+            found_distances.append(distances)
+            distances = np.concatenate(found_distances)
+            if len(distances) >= k and np.sort(distances)[k - 1] <= ring * self.cell_m:
+                break
+        positions, distances = np.concatenate(found_positions), np.concatenate(found_distances)
+        nearest = np.argsort(distances, kind='stable')[:k]
+        return self._comparables(positions[nearest], distances[nearest])
+
+    def fair_price(self, listing_id: str, k: int = COMPARABLES_K) -> Optional[FairPrice]:
+        """Estimate from the `k` nearest listings with the same rooms and a similar area (see `nearest`)."""
+        position = self.positions.get(listing_id)
+        if position is None or not (self.prices[position] > 0 and self.areas[position] > 0):
+            return None
+        comparables = self.nearest(self.latitudes[position], self.longitudes[position], k,
+                                   rooms=_value(self.rooms[position]), area_m2=self.areas[position],
+                                   exclude=listing_id)
+        prices_m2 = [comparable.price_m2 for comparable in comparables if comparable.price_m2]
+        if not prices_m2:
+            return None
+        estimate = float(np.median(prices_m2)) * self.areas[position]
+        return FairPrice(listing_id, int(self.prices[position]), float(self.areas[position]), round(estimate),
+                         len(prices_m2), max(comparable.distance_m for comparable in comparables))
+
+    def fair_prices(self, k: int = COMPARABLES_K) -> List[FairPrice]:
+        """Fair price estimates for every listing with a price and area, largest discount first."""
+        estimates = [self.fair_price(listing_id, k) for listing_id in self.listing_ids]
+        return sorted((estimate for estimate in estimates if estimate), key=lambda estimate: estimate.discount_pct,
+                      reverse=True)
+
+    def _positions(self, columns) -> np.ndarray:
+        """Positions of the listings in the cells (x, first y .. last y) of each of `columns`."""
+        cell_x, first_y, last_y = np.array(columns, dtype=np.int64).reshape(-1, 3).T
+        starts = np.searchsorted(self.codes, self._code(cell_x, first_y), side='left')
+        ends = np.searchsorted(self.codes, self._code(cell_x, last_y), side='right')
+        slices = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        return np.concatenate(slices) if slices else np.array([], dtype=np.intp)
+
+    def _similar(self, positions: np.ndarray, x: float, y: float, rooms: Optional[int], area_m2: Optional[float]):
+        if rooms is not None:
+            positions = positions[self.rooms[positions] == rooms]
+        if area_m2:
+            positions = positions[np.abs(self.areas[positions] - area_m2) <= COMPARABLE_AREA_TOLERANCE * area_m2]
+        return positions, np.hypot(self.x[positions] - x, self.y[positions] - y)
+
+    def _comparables(self, positions: np.ndarray, distances: np.ndarray) -> List[Comparable]:
+        order = np.argsort(distances, kind='stable')
+        return [Comparable(self.listing_ids[position], float(distance), _value(self.rooms[position]),
+                           _value(self.areas[position], float), _value(self.prices[position]),
+                           _value(self.prices_m2[position]))
+                for position, distance in zip(positions[order], distances[order])]
+
+    def _project(self, latitude, longitude):
+        origin_latitude, origin_longitude = self.origin
+        x = np.radians(np.subtract(longitude, origin_longitude)) * EARTH_RADIUS_M * math.cos(
+            math.radians(origin_latitude))
+        y = np.radians(np.subtract(latitude, origin_latitude)) * EARTH_RADIUS_M
+        return x, y
+
+    def _cell(self, coordinate):
+        return np.floor_divide(coordinate, self.cell_m).astype(np.int64)
+
+    @staticmethod
+    def _code(cell_x, cell_y):
+        return (np.asarray(cell_x) + CELL_OFFSET) * CELL_SPAN + np.asarray(cell_y) + CELL_OFFSET
+
+
+def _ring_columns(cell_x: int, cell_y: int, ring: int) -> list:
+    """The cells at Chebyshev distance `ring` from (cell_x, cell_y), as (x, first y, last y) columns."""
+    if ring == 0:
+        return [(cell_x, cell_y, cell_y)]
+    columns = [(cell_x - ring, cell_y - ring, cell_y + ring), (cell_x + ring, cell_y - ring, cell_y + ring)]
+    for dx in range(-ring + 1, ring):
+        columns.append((cell_x + dx, cell_y - ring, cell_y - ring))
+        columns.append((cell_x + dx, cell_y + ring, cell_y + ring))
+    return columns
+
+
+def _numbers(values) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _value(number: float, convert=int):
+    return None if np.isnan(number) else convert(number)
+
+
+def format_fair_prices(estimates: List[FairPrice], limit: int) -> str:
+    lines = [f"{'listing':<12} {'price':>9} {'estimate':>9} {'discount':>9} {'area':>7} {'comparables':>12} "
+             f"{'radius':>8}"]
+    for estimate in estimates[:limit]:
+        lines.append(f"{estimate.listing_id:<12} {estimate.price:>9} {estimate.estimate:>9} "
+                     f"{estimate.discount_pct:>8.1f}% {estimate.area_m2:>7.1f} {estimate.comparables:>12} "
+                     f"{estimate.radius_m:>7.0f}m")
+    return '\n'.join(lines)
@@ -0,0 +1,56 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from benchmarks.record_fixtures import load_fixture
+from benchmarks.suite import compare_with_baseline, run_suite
+from parsers.registry import PARSERS
+
+
+def results(values: dict) -> dict:
+    # Times (seconds) are better lower, rates better higher
+    return {'metrics': {name: {'value': value, 'unit': '', 'higher_is_better': not name.endswith('fuzzy_s')}
+                        for name, value in values.items()}}
+
+
+class TestRecordedFixtures(unittest.TestCase):
+    def test_fixtures_parse(self):
+        for portal, parser_class in PARSERS.items():
+            with self.subTest(portal=portal):
+                parser = parser_class()
+                listings = [listing for page in load_fixture(portal) for listing in parser.parse_listings(page)]
+                self.assertGreaterEqual(len(listings), 1000)
+                self.assertTrue(all(listing.id and listing.street_with_building for listing in listings))
+
+
+class TestCompareWithBaseline(unittest.TestCase):
+    def test_regressions_in_both_directions(self):
+        baseline = results({'parse.kvee.listings_per_s': 1000, 'compare.fuzzy_s': 1.0, 'upsert.rows_per_s': 1000})
+        current = results({'parse.kvee.listings_per_s': 700, 'compare.fuzzy_s': 1.1, 'upsert.rows_per_s': 700,
+                           'new.listings_per_s': 1})
+        regressions = compare_with_baseline(current, baseline, threshold=0.25, thresholds={'upsert.*': 0.4})
+        self.assertEqual([(regression.metric, round(regression.change, 2)) for regression in regressions],
+                         [('parse.kvee.listings_per_s', 0.3)])
+
+        slower = results({'compare.fuzzy_s': 1.5})
+        self.assertEqual([regression.metric for regression in compare_with_baseline(slower, baseline, 0.25, {})],
+                         ['compare.fuzzy_s'])
+
+    def test_small_suite_run(self):
+        with redirect_stdout(io.StringIO()):
+            suite_results = run_suite([300], repeat=1)
+        metrics = suite_results['metrics']
+        self.assertIn('parse.kvee.listings_per_s', metrics)
+        self.assertIn('upsert.300.update_rows_per_s', metrics)
+        self.assertFalse(metrics['compare.300.fuzzy_s']['higher_is_better'])
+        self.assertTrue(all(metric['value'] > 0 for metric in metrics.values()))
+        self.assertEqual(compare_with_baseline(suite_results, suite_results), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, KvEeListingModel
+from database.bulk import upsert_rows
+
+
+def make_row(listing_id, price, **extra):
+    return {'id': listing_id, 'address': f'Punane tn {listing_id}', 'price': price, **extra}
+
+
+class TestUpsertRows(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+        self.table = KvEeListingModel.__table__
+
+    def tearDown(self):
+        self.db.close()
+
+    def prices(self):
+        return dict(self.db.session.query(KvEeListingModel.id, KvEeListingModel.price))
+
+    def test_inserts_and_updates_across_chunks(self):
+        upsert_rows(self.db.session, self.table, [make_row(str(i), 100) for i in range(7)], chunk_size=3)
+        upsert_rows(self.db.session, self.table, [make_row(str(i), 200) for i in range(5, 10)], chunk_size=3)
+        self.db.session.commit()
+        self.assertEqual(self.prices(), {**{str(i): 100 for i in range(5)}, **{str(i): 200 for i in range(5, 10)}})
+
+    def test_columns_not_supplied_keep_their_values(self):
+        upsert_rows(self.db.session, self.table, [make_row('1', 100, heating='gas', balcony=True)])
+        upsert_rows(self.db.session, self.table, [make_row('1', 90)])
+        self.db.session.commit()
+        listing = self.db.session.get(KvEeListingModel, '1')
+        self.assertEqual((listing.price, listing.heating, listing.balcony), (90, 'gas', True))
+
+    def test_empty_rows(self):
+        self.assertEqual(upsert_rows(self.db.session, self.table, []), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
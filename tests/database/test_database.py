@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, Kinnisvara24ListingModel
+from parsers.batch import ListingBatch
+from parsers.common import ListingPage
+from parsers.kinnisvara24_parser import Kinnisvara24Listing
+
+
+def make_kinnisvara24_listing(listing_id, created_at, price=100000):
+    return Kinnisvara24Listing(
+        id=listing_id, address='Punane tn 21, Lasnamäe, Tallinn', city='Tallinn', street_with_building='Punane tn 21',
+        apartment_number='1', rooms=2, area_m2=50.0, price=price, price_m2=price // 50, link=None, img_url=None,
+        created_at=created_at,
+    )
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_save_listing_pages_counts_streamed_listings(self):
+        pages = (ListingPage(page, [make_kinnisvara24_listing(f'{page}-{i}', None) for i in range(3)])
+                 for page in range(1, 5))
+        self.assertEqual(self.db.save_listing_pages('kinnisvara24', pages, commit_every=5), 12)
+        self.assertEqual(self.db.session.query(Kinnisvara24ListingModel).count(), 12)
+
+    def test_save_listing_batch(self):
+        listings = [make_kinnisvara24_listing(str(i), '2025-06-23 10:00:00') for i in range(3)]
+        listings[2].price = listings[2].price_m2 = None
+        self.db.save_listing_pages('kinnisvara24', [ListingPage(1, ListingBatch.from_listings(Kinnisvara24Listing,
+                                                                                                listings))])
+        saved = self.db.session.query(Kinnisvara24ListingModel).order_by(Kinnisvara24ListingModel.id).all()
+        self.assertEqual([(row.id, row.price, row.rooms) for row in saved],
+                         [('0', 100000, 2), ('1', 100000, 2), ('2', None, 2)])
+
+    def test_save_listing_pages_keeps_committed_pages_on_failure(self):
+        def failing_pages():
+            for page in range(1, 4):
+                yield ListingPage(page, [make_kinnisvara24_listing(f'{page}-{i}', None) for i in range(2)])
+            raise ConnectionError("crawl died at page 4")
+
+        with self.assertRaises(ConnectionError):
+            self.db.save_listing_pages('kinnisvara24', failing_pages(), commit_every=4)
+        # Pages 1-2 were committed together, page 3 was still pending and is rolled back, not left for the next
+        # commit on the shared session
+        self.db.session.commit()
+        self.assertEqual(self.db.session.query(Kinnisvara24ListingModel).count(), 4)
+
+    def test_load_incremental_state(self):
+        self.db.save_kinnisvara24_listings([
+            make_kinnisvara24_listing('1', '2025-06-23 10:00:00'),
+            make_kinnisvara24_listing('2', '2025-06-24 09:00:00'),
+        ])
+        state = self.db.load_incremental_state('kinnisvara24')
+        self.assertEqual(state.known_ids, {'1', '2'})
+        self.assertEqual(state.watermark, datetime(2025, 6, 24, 9, 0))
+
+    def test_last_full_crawl_ignores_unfinished_and_incremental_runs(self):
+        self.assertIsNone(self.db.last_full_crawl_at('kvee'))
+        full_run = self.db.start_crawl_run('kvee', 'full')
+        self.db.finish_crawl_run(full_run)
+        self.db.start_crawl_run('kvee', 'full')
+        incremental_run = self.db.start_crawl_run('kvee', 'incremental')
+        self.db.finish_crawl_run(incremental_run)
+
+        finished_full_run_started_at = self.db.last_full_crawl_at('kvee')
+        self.assertIsNotNone(finished_full_run_started_at)
+        self.assertIsNone(self.db.last_full_crawl_at('city24'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, Kinnisvara24ListingModel, KvEeListingModel, DatabaseWriter
+from database.history import find_price_drops, record_changes
+from database.models import Kinnisvara24ListingHistoryModel, KvEeListingHistoryModel
+from parsers.batch import listing_rows
+from parsers.common import ListingPage
+from tests.database.test_database import make_kinnisvara24_listing
+
+
+class TestRecordChanges(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+
+    def tearDown(self):
+        self.db.close()
+
+    def history(self):
+        return [(row.listing_id, row.price) for row in
+                self.db.session.query(Kinnisvara24ListingHistoryModel).order_by(Kinnisvara24ListingHistoryModel.id)]
+
+    def test_only_new_and_changed_listings_are_recorded(self):
+        self.db.save_kinnisvara24_listings([make_kinnisvara24_listing('1', None), make_kinnisvara24_listing('2', None)])
+        # Unchanged crawl
+        self.db.save_kinnisvara24_listings([make_kinnisvara24_listing('1', None), make_kinnisvara24_listing('2', None)])
+        self.db.save_kinnisvara24_listings([make_kinnisvara24_listing('1', None, price=90000),
+                                            make_kinnisvara24_listing('2', None),
+                                            make_kinnisvara24_listing('3', None)])
+        self.assertEqual(self.history(), [('1', 100000), ('2', 100000), ('1', 90000), ('3', 100000)])
+
+    def test_repeated_listing_in_one_batch(self):
+        rows = [{'id': 1, 'price': 100000}, {'id': '1', 'price': 100000}, {'id': 1, 'price': 95000}]
+        self.assertEqual(record_changes(self.db.session, Kinnisvara24ListingModel, rows, datetime.now(),
+                                        chunk_size=2), 2)
+
+    def test_writer_records_changes(self):
+        writer = DatabaseWriter(self.db)
+        writer.save_listing_pages('kinnisvara24', [ListingPage(1, [make_kinnisvara24_listing('1', None)])])
+        writer.save_listing_pages('kinnisvara24', [ListingPage(1, [make_kinnisvara24_listing('1', None, 80000)])])
+        writer.close()
+        self.assertEqual(self.history(), [('1', 100000), ('1', 80000)])
+
+
+class TestPriceDrops(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+        self.now = datetime(2025, 6, 30, 12, 0)
+
+    def tearDown(self):
+        self.db.close()
+
+    def crawl(self, days_ago, prices):
+        listings = [make_kinnisvara24_listing(listing_id, None, price) for listing_id, price in prices.items()]
+        self.db.save_rows(Kinnisvara24ListingModel, listing_rows(listings),
+                          crawled_at=self.now - timedelta(days=days_ago))
+
+    def test_drops_within_period(self):
+        self.crawl(60, {'old-drop': 200000, 'recent-drop': 200000, 'small-drop': 100000, 'raised': 100000})
+        self.crawl(40, {'old-drop': 150000})
+        self.crawl(10, {'recent-drop': 220000, 'small-drop': 97000, 'raised': 120000})
+        self.crawl(2, {'recent-drop': 176000})
+
+        drops = find_price_drops(self.db.session, Kinnisvara24ListingModel, 5, days=30, now=self.now)
+        self.assertEqual([(drop.listing_id, drop.peak_price, drop.price) for drop in drops],
+                         [('recent-drop', 220000, 176000)])
+        self.assertAlmostEqual(drops[0].drop_pct, 20.0)
+        self.assertEqual(drops[0].changed_at, self.now - timedelta(days=2))
+
+        # The price in effect when the period starts counts as well
+        drops = find_price_drops(self.db.session, Kinnisvara24ListingModel, 2, days=30, now=self.now)
+        self.assertEqual([drop.listing_id for drop in drops], ['recent-drop', 'small-drop'])
+        drops = find_price_drops(self.db.session, Kinnisvara24ListingModel, 5, days=50, now=self.now)
+        self.assertEqual([drop.listing_id for drop in drops], ['old-drop', 'recent-drop'])
+
+
+class TestHistoryMigration(unittest.TestCase):
+    def test_listings_saved_before_history_get_a_first_row(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'old.db')
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE kvee_listing (id VARCHAR PRIMARY KEY, price INTEGER, area_m2 FLOAT)")
+            connection.execute("INSERT INTO kvee_listing VALUES ('1', 100000, 50.5)")
+            connection.commit()
+            connection.close()
+
+            db = Database(f'sqlite:///{db_file}')
+            history = db.session.query(KvEeListingHistoryModel).all()
+            self.assertEqual([(row.listing_id, row.price, row.area_m2) for row in history], [('1', 100000, 50.5)])
+            self.assertIsInstance(history[0].crawled_at, datetime)
+            self.assertEqual(db.session.get(KvEeListingModel, '1').crawled_at, history[0].crawled_at)
+            db.close()
+            # Runs on every start, but only for listings without history
+            db = Database(f'sqlite:///{db_file}')
+            self.assertEqual(db.session.query(KvEeListingHistoryModel).count(), 1)
+            db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, DatabaseWriter
+from database.journal import record_page
+from database.models import CrawlPageModel, CrawlRunModel
+from parsers.common import ListingPage
+from tests.database.test_database import make_kinnisvara24_listing
+
+
+def listing_pages(pages):
+    return [ListingPage(page, [make_kinnisvara24_listing(f'{page}-{i}', None) for i in range(2)]) for page in pages]
+
+
+class TestCrawlJournal(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+
+    def tearDown(self):
+        self.db.close()
+
+    def journal(self, crawl_run_id):
+        return {row.page: json.loads(row.listing_ids)
+                for row in self.db.session.query(CrawlPageModel).filter_by(crawl_run_id=crawl_run_id)}
+
+    def test_pages_are_journaled_with_their_listings(self):
+        crawl_run_id = self.db.start_crawl_run('kinnisvara24', 'full')
+        self.db.save_listing_pages('kinnisvara24', listing_pages([1, 2]), crawl_run_id=crawl_run_id)
+        writer = DatabaseWriter(self.db)
+        writer.save_listing_pages('kinnisvara24', listing_pages([3]), crawl_run_id=crawl_run_id)
+        writer.close()
+
+        self.assertEqual(self.journal(crawl_run_id), {1: ['1-0', '1-1'], 2: ['2-0', '2-1'], 3: ['3-0', '3-1']})
+        self.assertEqual(self.db.completed_pages(crawl_run_id), 3)
+
+    def test_uncommitted_pages_are_not_journaled(self):
+        def failing_pages():
+            yield from listing_pages([1, 2, 3])
+            raise ConnectionError("crawl died at page 4")
+
+        crawl_run_id = self.db.start_crawl_run('kinnisvara24', 'full')
+        with self.assertRaises(ConnectionError):
+            self.db.save_listing_pages('kinnisvara24', failing_pages(), commit_every=4, crawl_run_id=crawl_run_id)
+        self.db.session.rollback()
+        # Pages 1-2 were committed together, page 3 was still pending
+        self.assertEqual(sorted(self.journal(crawl_run_id)), [1, 2])
+        self.assertEqual(self.db.unfinished_crawl_run('kinnisvara24'), crawl_run_id)
+
+    def test_resume_point_is_the_end_of_the_first_run_of_pages(self):
+        for page in (1, 2, 4):
+            record_page(self.db.session, 7, 'kvee', page, [])
+        self.assertEqual(self.db.completed_pages(7), 2)
+        self.assertEqual(self.db.completed_pages(8), 0)
+
+    def test_only_the_latest_recent_full_run_is_unfinished(self):
+        self.assertIsNone(self.db.unfinished_crawl_run('kvee'))
+        crawl_run_id = self.db.start_crawl_run('kvee', 'full')
+        self.assertEqual(self.db.unfinished_crawl_run('kvee'), crawl_run_id)
+        self.assertIsNone(self.db.unfinished_crawl_run('city24'))
+        self.assertIsNone(self.db.unfinished_crawl_run('kvee', max_age=timedelta(0)))
+
+        self.db.session.get(CrawlRunModel, crawl_run_id).started_at = datetime.now() - timedelta(hours=1)
+        self.db.finish_crawl_run(self.db.start_crawl_run('kvee', 'full'))
+        self.assertIsNone(self.db.unfinished_crawl_run('kvee'))
+        self.db.start_crawl_run('kvee', 'incremental')
+        self.assertIsNone(self.db.unfinished_crawl_run('kvee'))
+
+
+if __name__ == '__main__':
+    unittest.main()
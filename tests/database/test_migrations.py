@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, City24ListingModel, KvEeListingModel
+from database.models import SCHEMA_VERSION
+
+
+class TestAddMissingColumns(unittest.TestCase):
+    def test_columns_added_to_existing_table(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'old.db')
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE kvee_listing (id VARCHAR PRIMARY KEY, address TEXT, price INTEGER)")
+            connection.execute("INSERT INTO kvee_listing (id, address, price) VALUES ('1', 'Punane tn 21', 100000)")
+            connection.commit()
+            connection.close()
+
+            db = Database(f'sqlite:///{db_file}')
+            listing = db.session.get(KvEeListingModel, '1')
+            self.assertEqual(listing.price, 100000)
+            self.assertIsNone(listing.heating)
+            self.assertIsNone(listing.balcony)
+            db.close()
+
+
+class TestMatchKeyMigration(unittest.TestCase):
+    def test_existing_rows_are_backfilled_and_indexed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'old.db')
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE city24_listing (id VARCHAR PRIMARY KEY, city VARCHAR, "
+                               "street_with_building TEXT, apartment_number VARCHAR)")
+            connection.executemany("INSERT INTO city24_listing VALUES (?, ?, ?, ?)",
+                                   [('1', 'Tallinn', 'Pirita tee 26b', '4'), ('2', None, None, None)])
+            connection.commit()
+            connection.close()
+
+            db = Database(f'sqlite:///{db_file}')
+            self.assertEqual(dict(db.session.query(City24ListingModel.id, City24ListingModel.match_key)),
+                             {'1': 'tallinn|pirita 26b', '2': None})
+            db.close()
+
+            connection = sqlite3.connect(db_file)
+            indexes = {row[1] for row in connection.execute("PRAGMA index_list('city24_listing')")}
+            connection.close()
+            self.assertIn('ix_city24_listing_match_key', indexes)
+
+
+class TestCoordinateMigration(unittest.TestCase):
+    def test_text_coordinates_become_numbers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'old.db')
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE city24_listing (id VARCHAR PRIMARY KEY, price INTEGER, "
+                               "latitude VARCHAR, longitude VARCHAR)")
+            connection.execute("CREATE INDEX ix_city24_listing_match_key ON city24_listing (price)")
+            connection.executemany("INSERT INTO city24_listing VALUES (?, ?, ?, ?)",
+                                   [('1', 100000, '59.428727', '24.823749'), ('2', 90000, '', 'n/a')])
+            connection.commit()
+            connection.close()
+
+            db = Database(f'sqlite:///{db_file}')
+            rows = db.session.query(City24ListingModel.id, City24ListingModel.price, City24ListingModel.latitude,
+                                    City24ListingModel.longitude).order_by(City24ListingModel.id).all()
+            self.assertEqual(rows, [('1', 100000, 59.428727, 24.823749), ('2', 90000, None, None)])
+            db.close()
+
+            connection = sqlite3.connect(db_file)
+            columns = {row[1]: row[2] for row in connection.execute("PRAGMA table_info('city24_listing')")}
+            connection.close()
+            self.assertEqual((columns['latitude'], columns['longitude']), ('FLOAT', 'FLOAT'))
+
+
+class TestSchemaVersion(unittest.TestCase):
+    def test_migrations_run_only_when_the_version_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'listings.db')
+            Database(f'sqlite:///{db_file}').close()
+            connection = sqlite3.connect(db_file)
+            self.assertEqual(connection.execute("SELECT version FROM schema_version").fetchall(), [(SCHEMA_VERSION,)])
+            connection.execute("DROP TABLE crawl_page")
+            connection.commit()
+
+            # Already at SCHEMA_VERSION: nothing is created or migrated
+            Database(f'sqlite:///{db_file}').close()
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertNotIn('crawl_page', tables)
+
+            connection.execute("UPDATE schema_version SET version = ?", (SCHEMA_VERSION - 1,))
+            connection.commit()
+            Database(f'sqlite:///{db_file}').close()
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertIn('crawl_page', tables)
+            self.assertEqual(connection.execute("SELECT version FROM schema_version").fetchall(), [(SCHEMA_VERSION,)])
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
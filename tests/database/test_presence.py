@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, DatabaseWriter, City24ListingModel, Kinnisvara24ListingModel, KvEeListingModel
+from database.models import ListingPresenceModel
+from database.presence import changed_match_keys
+from parsers.common import ListingPage
+from tests.database.test_database import make_kinnisvara24_listing
+
+
+def listing(listing_id, match_key):
+    return {'id': listing_id, 'match_key': match_key}
+
+
+class TestListingPresence(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+        self.db.save_rows(KvEeListingModel, [listing('kv-1', 'tallinn|punane 21'), listing('kv-2', 'tallinn|narva 1')])
+        self.db.save_rows(City24ListingModel, [listing('c-1', 'tallinn|punane 21'), listing('c-2', 'tallinn|pae 5'),
+                                               listing('c-3', 'tallinn|pae 5'), listing('c-4', None)])
+
+    def tearDown(self):
+        self.db.close()
+
+    def presence(self):
+        return {row.match_key: (row.kvee, row.city24, row.kinnisvara24, row.only_on)
+                for row in self.db.session.query(ListingPresenceModel)}
+
+    def only_on(self, portal, among=None):
+        return [row['id'] for row in self.db.only_on(portal, among)]
+
+    def test_counts_per_portal(self):
+        self.assertEqual(self.presence(), {
+            'tallinn|punane 21': (1, 1, 0, None),
+            'tallinn|narva 1': (1, 0, 0, 'kvee'),
+            'tallinn|pae 5': (0, 2, 0, 'city24'),
+        })
+        # Listings without a match_key can't be matched
+        self.assertEqual(self.only_on('city24'), ['c-2', 'c-3', 'c-4'])
+        self.assertEqual(self.only_on('kvee'), ['kv-2'])
+        self.assertEqual(self.only_on('kinnisvara24'), [])
+
+    def test_subset_of_portals(self):
+        self.db.save_rows(Kinnisvara24ListingModel, [listing('k-1', 'tallinn|pae 5')])
+        self.assertEqual(self.only_on('city24'), ['c-4'])
+        self.assertEqual(self.only_on('city24', ['city24', 'kvee']), ['c-2', 'c-3', 'c-4'])
+
+    def test_changed_address_moves_listing(self):
+        self.db.save_rows(KvEeListingModel, [listing('kv-2', 'tallinn|pae 5')])
+        self.assertEqual(self.presence(), {
+            'tallinn|punane 21': (1, 1, 0, None),
+            'tallinn|pae 5': (1, 2, 0, None),
+        })
+        self.assertEqual(self.only_on('city24'), ['c-4'])
+
+    def test_unchanged_listings_touch_nothing(self):
+        rows = [listing('kv-1', 'tallinn|punane 21'), {'id': 'kv-2', 'price': 90000}]
+        self.assertEqual(changed_match_keys(self.db.session, KvEeListingModel, rows), set())
+        rows = [listing('kv-1', 'tallinn|punane 21'), listing('kv-3', 'tallinn|narva 1'),
+                listing('kv-1', 'tallinn|pae 5')]
+        self.assertEqual(changed_match_keys(self.db.session, KvEeListingModel, rows, chunk_size=2),
+                         {'tallinn|narva 1', 'tallinn|punane 21', 'tallinn|pae 5'})
+
+    def test_writer_updates_presence(self):
+        writer = DatabaseWriter(self.db)
+        # make_kinnisvara24_listing is at Punane tn 21
+        writer.save_listing_pages('kinnisvara24', [ListingPage(1, [make_kinnisvara24_listing('1', None)])])
+        writer.close()
+        self.assertEqual(self.presence()['tallinn|punane 21'], (1, 1, 1, None))
+
+
+class TestPresenceMigration(unittest.TestCase):
+    def test_listings_saved_before_presence_are_counted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'old.db')
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE kvee_listing (id VARCHAR PRIMARY KEY, match_key VARCHAR)")
+            connection.execute("INSERT INTO kvee_listing VALUES ('1', 'tallinn|punane 21'), ('2', 'tallinn|pae 5')")
+            connection.execute("CREATE TABLE city24_listing (id VARCHAR PRIMARY KEY, match_key VARCHAR)")
+            connection.execute("INSERT INTO city24_listing VALUES ('1', 'tallinn|punane 21')")
+            connection.commit()
+            connection.close()
+
+            db = Database(f'sqlite:///{db_file}')
+            self.assertEqual([row['id'] for row in db.only_on('kvee')], ['2'])
+            self.assertEqual(db.session.query(ListingPresenceModel).count(), 2)
+            db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from database import Database, DatabaseWriter, Kinnisvara24ListingModel
+from parsers.common import ListingPage
+from tests.database.test_database import make_kinnisvara24_listing
+
+
+class TestDatabaseWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp_dir.name, 'test.db')
+        self.db = Database(f'sqlite:///{self.db_file}')
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_pages_are_committed_one_batch_each(self):
+        writer = DatabaseWriter(self.db, queue_size=2)
+        pages = [ListingPage(page, [make_kinnisvara24_listing(f'{page}-{i}', None) for i in range(3)])
+                 for page in range(1, 6)]
+        self.assertEqual(writer.save_listing_pages('kinnisvara24', pages), 15)
+        writer.close()
+
+        self.assertEqual(self.db.session.query(Kinnisvara24ListingModel).count(), 15)
+        stats = writer.stats()
+        self.assertEqual((stats.batches, stats.rows), (5, 15))
+        self.assertLessEqual(stats.max_queue_depth, 2)
+        self.assertGreater(stats.max_commit_latency, 0)
+
+    def test_readers_see_committed_rows_of_a_wal_database(self):
+        writer = DatabaseWriter(self.db)
+        writer.save_listing_pages('kinnisvara24', [ListingPage(1, [make_kinnisvara24_listing('1', None)])])
+        reader = sqlite3.connect(self.db_file)
+        self.assertEqual(reader.execute('PRAGMA journal_mode').fetchone(), ('wal',))
+        self.assertEqual(reader.execute('SELECT count(*) FROM kinnisvara24_listing').fetchone(), (1,))
+        reader.close()
+        writer.close()
+
+    def test_failed_write_is_raised_to_the_crawl(self):
+        writer = DatabaseWriter(self.db)
+        with self.assertRaises(RuntimeError):
+            writer.save_listing_pages('unknown', [ListingPage(1, [make_kinnisvara24_listing('1', None)])])
+        # Raised once, then the portal starts clean
+        writer.flush('unknown')
+        writer.submit('unknown', [make_kinnisvara24_listing('2', None)])
+        with self.assertRaises(RuntimeError):
+            writer.flush('unknown')
+        writer.close()
+
+    def test_failed_portal_does_not_stop_the_others(self):
+        writer = DatabaseWriter(self.db)
+        # 'unknown' has no table: its batch fails
+        writer.submit('unknown', [make_kinnisvara24_listing('1', None)])
+        writer.submit('kinnisvara24', [make_kinnisvara24_listing('2', None)])
+        pages = [ListingPage(1, [make_kinnisvara24_listing('4', None)])]
+        self.assertEqual(writer.save_listing_pages('kinnisvara24', pages), 1)
+        writer.flush('kinnisvara24')
+        with self.assertRaises(RuntimeError):
+            writer.flush('unknown')
+        writer.close()
+
+        ids = [listing.id for listing in self.db.session.query(Kinnisvara24ListingModel).order_by('id')]
+        self.assertEqual(ids, ['2', '4'])
+        self.assertEqual(writer.stats().batches, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import statistics
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+import numpy as np
+
+from parsers.batch import ListingBatch, listing_rows
+from parsers.city24_parser import City24Listing
+
+
+def make_city24_listing(listing_id, price_m2, floor=3, latitude=59.43):
+    return City24Listing(
+        id=listing_id, address='Tallinn, Punane tn 21', city='Tallinn', street_with_building='Punane tn 21',
+        apartment_number=None, rooms=2, area_m2=50.5, price=price_m2 * 50 if price_m2 else None, price_m2=price_m2,
+        link=None, img_url=None, object_important_note=None, date_published='2025-06-23T10:00:00+03:00',
+        floor=floor, total_floors=5, year_built=None, latitude=latitude, longitude=24.75,
+    )
+
+
+class TestListingBatch(unittest.TestCase):
+    def setUp(self):
+        self.listings = [make_city24_listing(str(i), 2000 + 37 * i, floor=i % 6 or None) for i in range(40)]
+        self.listings.append(make_city24_listing('no-price', None))
+
+    def test_round_trip_restores_values_and_types(self):
+        batch = ListingBatch.from_listings(City24Listing, self.listings)
+        self.assertEqual(len(batch), len(self.listings))
+        self.assertEqual(batch.column('price_m2').dtype, np.float64)
+        self.assertEqual(listing_rows(batch), listing_rows(self.listings))
+        self.assertEqual(list(batch), self.listings)
+        self.assertIsInstance(batch.to_rows()[1]['floor'], int)
+        self.assertIsNone(batch.to_rows()[0]['floor'])
+
+    def test_non_numeric_values_stay_as_they_are(self):
+        listings = [make_city24_listing('1', 2000, latitude='59.4 N')]
+        batch = ListingBatch.from_listings(City24Listing, listings)
+        self.assertEqual(listing_rows(batch), listing_rows(listings))
+
+    def test_price_m2_stats(self):
+        batch = ListingBatch.concat([ListingBatch.from_listings(City24Listing, self.listings[:20]),
+                                     ListingBatch.from_listings(City24Listing, self.listings[20:])])
+        prices = [listing.price_m2 for listing in self.listings if listing.price_m2]
+        stats = batch.price_m2_stats()
+        self.assertEqual(stats.count, len(prices))
+        self.assertAlmostEqual(stats.mean, statistics.mean(prices))
+        self.assertAlmostEqual(stats.median, statistics.median(prices))
+        self.assertEqual(ListingBatch.from_listings(City24Listing, []).price_m2_stats().count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.city24_parser import City24Parser
+from parsers.common import build_match_key, extract_district
+from parsers.http_client import HttpClient
+from parsers.kvee_parser import KvEeParser
+
+
+class TestBuildMatchKey(unittest.TestCase):
+    def test_build_match_key(self):
+        test_cases = [
+            (("Tallinn", "Punane tn 21"), "tallinn|punane 21"),
+            (("Tallinn", "Punane 21"), "tallinn|punane 21"),
+            (("tallinn", "Sõpruse pst. 123"), "tallinn|sõpruse 123"),
+            (("Tallinn", "Pärnu mnt 26b"), "tallinn|pärnu 26b"),
+            (("Tallinn", "Uus-Maleva tn 3"), "tallinn|uus-maleva 3"),
+            (("Tallinn", "Kadaka  tee 12/1"), "tallinn|kadaka 12/1"),
+            ((None, "Punane tn 21"), None),
+            (("Tallinn", None), None),
+        ]
+        for (city, street_with_building), expected in test_cases:
+            with self.subTest(city=city, street_with_building=street_with_building):
+                self.assertEqual(build_match_key(city, street_with_building), expected)
+
+    def test_same_building_on_different_portals(self):
+        client = HttpClient(rate_limits={})
+        kvee = KvEeParser(client=client).parse_address_components("Tallinn, Lasnamäe, Punane tn 21-1")
+        city24 = City24Parser(client=client).parse_address_components("Tallinn, Lasnamäe linnaosa, Punane tn-21/1")
+        client.close()
+        self.assertEqual(build_match_key(kvee.city, kvee.street_with_building),
+                         build_match_key(city24.city, city24.street_with_building))
+        self.assertEqual(kvee.apartment_number, city24.apartment_number)
+
+
+class TestExtractDistrict(unittest.TestCase):
+    def test_extract_district(self):
+        test_cases = [
+            ("Tallinn, Lasnamäe, Punane tn 21-1", "Lasnamäe"),
+            ("Tallinn, Põhja-Tallinna linnaosa, Kalaranna tn-8/8", "Põhja-Tallinn"),
+            ("Tallinn, Kesklinna linnaosa, Pirita tee-26b/4", "Kesklinn"),
+            ("Sõpruse pst 123, Haabersti, Tallinn, Harju maakond", "Haabersti"),
+            ("Tallinn, Vanalinn, Viru 7", "Kesklinn"),
+            ("Kotka tn 1, Lilleküla, Kristiine", "Kristiine"),
+            ("Põllu 137, Laagri alevik, Saue vald, Harju maakond", None),
+            (None, None),
+        ]
+        for address, expected in test_cases:
+            with self.subTest(address=address):
+                self.assertEqual(extract_district(address), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
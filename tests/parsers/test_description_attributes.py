@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.description_attributes import CONDITIONS, HEATING_TYPES, DescriptionAttributes, extract_attributes
+
+
+class TestDescriptionAttributes(unittest.TestCase):
+    def test_extract_attributes(self):
+        test_cases = [
+            # Russian excerpt with every attribute
+            {
+                "description": "Этаж 3/5, год постройки 1975, центральное отопление, хорошее состояние, "
+                               "класс энергопотребления C, балкон",
+                "expected": DescriptionAttributes(3, 5, 1975, 'central', 'good', 'C', True)
+            },
+            # Estonian excerpt with every attribute
+            {
+                "description": "Korrus 2/9, ehitusaasta 2019, maaküte, uusehitis, energiaklass A, rõdu",
+                "expected": DescriptionAttributes(2, 9, 2019, 'geothermal', 'new', 'A', True)
+            },
+            # Floor given as "4. этаж", no balcony
+            {
+                "description": "4. этаж, Год постройки 1960, без балкона, требует ремонта",
+                "expected": DescriptionAttributes(4, None, 1960, None, 'needs_renovation', None, False)
+            },
+            # "Этаж N" takes precedence over "N. этаж"
+            {
+                "description": "5. этаж, Этаж 3",
+                "expected": DescriptionAttributes(floor=3)
+            },
+            # Longest phrase wins; street names are not conditions
+            {
+                "description": "Uus-Maleva tn, капитально отремонтировано, местное центральное отопление",
+                "expected": DescriptionAttributes(heating='local_central', condition='renovated')
+            },
+            # Total floors given separately
+            {
+                "description": "3. korrus, korruseid majas 5",
+                "expected": DescriptionAttributes(floor=3, total_floors=5)
+            },
+            {
+                "description": None,
+                "expected": DescriptionAttributes()
+            },
+        ]
+
+        for i, test_case in enumerate(test_cases):
+            with self.subTest(i=i, description=test_case["description"]):
+                self.assertEqual(extract_attributes(test_case["description"]), test_case["expected"])
+
+    def test_every_phrase_is_found(self):
+        # Patterns only run on descriptions containing one of their keywords
+        for phrase, heating in HEATING_TYPES.items():
+            with self.subTest(phrase=phrase):
+                self.assertEqual(extract_attributes(f"Этаж 2, {phrase.capitalize()}").heating, heating)
+        for phrase, condition in CONDITIONS.items():
+            with self.subTest(phrase=phrase):
+                self.assertEqual(extract_attributes(f"Korrus 2, {phrase.upper()}").condition, condition)
+        # Only whole words
+        self.assertEqual(extract_attributes("põrandakeskküte, terrassimaja"), DescriptionAttributes(balcony=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
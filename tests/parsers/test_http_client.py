@@ -0,0 +1,105 @@
+import os
+import pickle
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.http_client import HttpClient, TokenBucket, _CountingAdapter, _CountingPoolManager
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers with the next (status, headers) from the server's script, then 200 once it's used up."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        with self.server.lock:
+            status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+            self.server.hits += 1
+        body = b'{"ok": true}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        self.server.script, self.server.hits, self.server.lock = [], 0, threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+        self.client = HttpClient(rate_limits={}, backoff_base=0.01, max_retries=3)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_transient_errors(self):
+        self.server.script = [(503, {}), (500, {}), (429, {})]
+        response = self.client.get('kvee', self.url)
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(self.server.hits, 4)
+        self.assertEqual(self.client.retries, 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.script = [(503, {})] * 4
+        with self.assertRaises(requests.HTTPError):
+            self.client.get('kvee', self.url)
+        self.assertEqual(self.server.hits, 4)
+
+    def test_does_not_retry_client_errors(self):
+        self.server.script = [(404, {})]
+        with self.assertRaises(requests.HTTPError):
+            self.client.get('kvee', self.url)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_honors_retry_after(self):
+        self.server.script = [(429, {'Retry-After': '1'})]
+        started = time.monotonic()
+        self.client.get('kvee', self.url)
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+
+    def test_reuses_connections(self):
+        for _ in range(5):
+            self.client.get('kvee', self.url)
+        stats = self.client.connection_stats()
+        self.assertEqual(stats.requests, 5)
+        self.assertEqual(stats.opened, 1)
+        self.assertEqual(stats.reused, 4)
+
+    def test_builds_a_single_pool_manager(self):
+        with mock.patch('requests.adapters.PoolManager') as plain_pool_manager:
+            adapter = _CountingAdapter(pool_connections=3, pool_maxsize=3)
+        plain_pool_manager.assert_not_called()
+        # Pickling rebuilds the pool manager from the settings init_poolmanager saved
+        adapter = pickle.loads(pickle.dumps(adapter))
+        self.assertIsInstance(adapter.poolmanager, _CountingPoolManager)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], 3)
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_limit_after_burst(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # 2 requests go out immediately, the other 4 at 20 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+
+if __name__ == '__main__':
+    unittest.main()
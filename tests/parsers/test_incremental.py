@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.city24_parser import City24Parser
+from parsers.http_client import HttpClient
+from parsers.incremental import IncrementalState, parse_timestamp
+from parsers.kinnisvara24_parser import Kinnisvara24Parser
+from parsers.kvee_parser import KvEeParser
+from simulator import PortalSimulator
+
+
+class TestIncrementalState(unittest.TestCase):
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp('2025-06-23 10:00:00'), datetime(2025, 6, 23, 10, 0))
+        self.assertEqual(parse_timestamp('2025-06-23T10:00:00+03:00'), datetime(2025, 6, 23, 7, 0))
+        self.assertIsNone(parse_timestamp(None))
+        self.assertIsNone(parse_timestamp('yesterday'))
+
+    def test_from_rows(self):
+        state = IncrementalState.from_rows([(1, '2025-06-23 10:00:00'), ('2', '2025-06-24 09:00:00'), ('3', None)])
+        self.assertEqual(state.known_ids, {'1', '2', '3'})
+        self.assertEqual(state.watermark, datetime(2025, 6, 24, 9, 0))
+
+
+class TestIncrementalCrawl(unittest.TestCase):
+    """Previous crawl stored everything but the 10 newest listings: only the first page needs fetching"""
+
+    def setUp(self):
+        self.client = HttpClient(rate_limits={})
+
+    def tearDown(self):
+        self.client.close()
+
+    def assert_stops_early(self, make_parser, page_size):
+        with PortalSimulator(listings=1000) as simulator:
+            listings = make_parser(simulator).parse()
+            total_requests = simulator.requests_served
+
+            stored = listings[10:]
+            state = IncrementalState.from_rows(
+                (listing.id, getattr(listing, listing.TIMESTAMP_FIELD)) for listing in stored)
+            simulator.requests_served = 0
+            new_listings = make_parser(simulator).parse(incremental=state)
+
+        self.assertEqual([listing.id for listing in new_listings[:10]], [listing.id for listing in listings[:10]])
+        self.assertLessEqual(len(new_listings), 2 * page_size)
+        self.assertLess(simulator.requests_served, total_requests)
+
+    def test_kvee(self):
+        self.assert_stops_early(
+            lambda simulator: KvEeParser(concurrency=1, search_url=simulator.kvee_search_url, client=self.client), 50)
+
+    def test_kinnisvara24(self):
+        self.assert_stops_early(
+            lambda simulator: Kinnisvara24Parser(concurrency=1, search_url=simulator.kinnisvara24_search_url,
+                                                 client=self.client), 50)
+
+    def test_city24_caught_up_only_on_full_page(self):
+        state = IncrementalState(known_ids={'1'}, watermark=datetime(2026, 1, 1))
+        listing = City24Parser(client=self.client).parse_listing({'friendly_id': '1', 'date_published': '2025-12-31'})
+        self.assertTrue(state.is_caught_up([listing], page_size=1))
+        self.assertFalse(state.is_caught_up([listing], page_size=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.kvee_extractors import EXTRACTORS, BeautifulSoupExtractor, LxmlExtractor
+from parsers.kvee_parser import KvEeParser
+from simulator import PortalSimulator
+
+# Markup variations seen on kv.ee result pages
+ARTICLES_HTML = """
+<div class="results">
+<article data-object-id="101" class="default">
+  <h2>
+    <a href="/ru/101" class="object-promoted"><span>TOP</span></a>
+    <a href="/ru/101"> Tallinn, Lasnamäe, <!-- district -->Punane tn 21-1 </a>
+  </h2>
+  <div class="images"><a href="/ru/101"><img data-src="https://img.kv.ee/101.jpg" src="/blank.gif"></a></div>
+  <div class="price" data-price="125000.00">125 000&nbsp;€</div>
+  <div class="rooms"> 2 </div>
+  <div class="area">50.4&nbsp;m&sup2;</div>
+  <p class="object-important-note">Цена <b>снижена</b>!</p>
+  <p class="object-excerpt">Этаж 3/5, год постройки 1975, &laquo;центральное отопление&raquo;</p>
+</article>
+<article data-object-id="102">
+  <h2><a href="https://www.kv.ee/ru/102">Tallinn, Kesklinn, Pärnu mnt 26b-15</a></h2>
+  <img src="/outside-images.jpg">
+  <div class="images"><img src="https://img.kv.ee/102.jpg"></div>
+  <div data-price=""></div>
+  <div class="rooms"></div>
+</article>
+<article class="ad-banner"><h2><a href="/ads">Not a listing</a></h2></article>
+<article data-object-id="103"></article>
+</div>
+"""
+
+
+class TestKvEeExtractors(unittest.TestCase):
+    def test_backends_extract_identical_articles(self):
+        expected = BeautifulSoupExtractor().extract_articles(ARTICLES_HTML)
+        self.assertEqual([article.object_id for article in expected], ['101', '102', '103'])
+        self.assertEqual(LxmlExtractor().extract_articles(ARTICLES_HTML), expected)
+
+    def test_fields(self):
+        for name, extractor_class in EXTRACTORS.items():
+            with self.subTest(extractor=name):
+                first, second, empty = extractor_class().extract_articles(ARTICLES_HTML)
+                self.assertEqual(first.address, 'Tallinn, Lasnamäe,Punane tn 21-1')
+                self.assertEqual(first.link, '/ru/101')
+                self.assertEqual(first.price, '125000.00')
+                self.assertEqual(first.area, '50.4 m²')
+                self.assertEqual(first.rooms, '2')
+                self.assertEqual(first.img_url, 'https://img.kv.ee/101.jpg')
+                self.assertEqual(first.important_note, 'Ценаснижена!')
+                self.assertEqual(second.img_url, 'https://img.kv.ee/102.jpg')
+                self.assertEqual(second.price, '')
+                self.assertIsNone(second.area)
+                self.assertIsNone(empty.address)
+
+    def test_empty_content(self):
+        for name, extractor_class in EXTRACTORS.items():
+            with self.subTest(extractor=name):
+                self.assertEqual(extractor_class().extract_articles(''), [])
+
+    def test_identical_listings_on_simulated_pages(self):
+        simulator = PortalSimulator(listings=300)
+        try:
+            for start in range(0, len(simulator.apartments_by_portal['kvee']), 50):
+                response = simulator.kvee_page(start)
+                expected = KvEeParser(extractor='bs4').parse_listings(response)
+                self.assertEqual(KvEeParser(extractor='lxml').parse_listings(response), expected)
+        finally:
+            simulator.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from itertools import count
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.pagination import fetch_pages
+
+
+class TestFetchPages(unittest.TestCase):
+    def test_results_keep_page_order(self):
+        """Pages finishing out of order are still yielded in key order"""
+        def fetch(page):
+            time.sleep(0.01 * (10 - page))
+            return page * 10
+
+        self.assertEqual(list(fetch_pages(fetch, range(10), concurrency=4)), [p * 10 for p in range(10)])
+
+    def test_sequential_when_concurrency_is_one(self):
+        self.assertEqual(list(fetch_pages(lambda page: page, range(5), concurrency=1)), [0, 1, 2, 3, 4])
+
+    def test_concurrency_limit(self):
+        """No more than `concurrency` fetches run at the same time"""
+        lock = threading.Lock()
+        in_flight, max_in_flight = [0], [0]
+
+        def fetch(page):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return page
+
+        list(fetch_pages(fetch, range(20), concurrency=3))
+        self.assertLessEqual(max_in_flight[0], 3)
+        self.assertGreater(max_in_flight[0], 1)
+
+    def test_unbounded_keys_stop_with_consumer(self):
+        """Consumer can stop on an unbounded key sequence; only a window of extra pages is requested"""
+        requested = []
+
+        def fetch(page):
+            requested.append(page)
+            return page
+
+        results = []
+        for page in fetch_pages(fetch, count(1), concurrency=4):
+            results.append(page)
+            if page == 5:
+                break
+        self.assertEqual(results, [1, 2, 3, 4, 5])
+        self.assertLessEqual(max(requested), 5 + 4)
+
+    def test_fetch_error_propagates(self):
+        def fetch(page):
+            if page == 2:
+                raise ValueError("bad page")
+            return page
+
+        with self.assertRaises(ValueError):
+            list(fetch_pages(fetch, range(5), concurrency=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import sys
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.batch import ListingBatch
+from parsers.city24_parser import City24Parser
+from parsers.common import RawPage
+from parsers import http_client
+from parsers.http_client import HttpClient
+from parsers.incremental import IncrementalState
+from parsers.kvee_parser import KvEeParser
+from parsers.pipeline import _parse_page, parse_pages
+from simulator import PortalSimulator
+
+
+def parse_in_worker(payload):
+    listings, _ = _parse_page((KvEeParser, (('extractor', 'lxml'),)), payload, False)
+    return len(listings), http_client._default_client is None
+
+
+class TestParsePages(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Pages are built in-process, the simulator's server is never started
+        simulator = PortalSimulator(listings=600)
+        cls.kvee_pages = [RawPage(i + 1, simulator.kvee_page(start), 50)
+                          for i, start in enumerate(range(0, len(simulator.apartments_by_portal['kvee']), 50))]
+        cls.city24_pages = [RawPage(page, simulator.city24_page(20, page), 20) for page in range(1, 11)]
+        simulator.stop()
+
+    def setUp(self):
+        self.client = HttpClient(rate_limits={})
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_worker_processes_match_inline_parsing_in_page_order(self):
+        parser = KvEeParser(client=self.client)
+        options = {'extractor': parser.extractor.name}
+        inline = list(parse_pages(parser, iter(self.kvee_pages)))
+        pooled = list(parse_pages(parser, iter(self.kvee_pages), workers=2, options=options))
+
+        self.assertEqual([page.number for page in pooled], list(range(1, len(self.kvee_pages) + 1)))
+        self.assertEqual(pooled, inline)
+
+    def test_workers_parse_without_an_http_client(self):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            listings, without_client = executor.submit(parse_in_worker, self.kvee_pages[0].payload).result()
+        self.assertEqual(listings, 50)
+        self.assertTrue(without_client)
+
+    def test_columnar_pages_hold_the_same_listings(self):
+        parser = City24Parser(client=self.client)
+        pages = list(parse_pages(parser, iter(self.city24_pages), workers=2, columnar=True))
+        self.assertIsInstance(pages[0].listings, ListingBatch)
+        self.assertEqual([list(page.listings) for page in pages],
+                         [parser.parse_listings(raw_page.payload) for raw_page in self.city24_pages])
+
+    def test_fetching_is_bounded_by_parsing(self):
+        """No more than `max_pending` fetched pages wait for the consumer"""
+        fetched = []
+
+        def raw_pages():
+            for raw_page in self.city24_pages:
+                fetched.append(raw_page.number)
+                yield raw_page
+
+        for page in parse_pages(City24Parser(client=self.client), raw_pages(), workers=2, max_pending=3):
+            self.assertLessEqual(len(fetched) - page.number, 3)
+        self.assertEqual(len(fetched), len(self.city24_pages))
+
+    def test_incremental_stop_closes_fetching(self):
+        """Pages 6+ hold only stored listings: the crawl stops after page 6 and fetching is shut down"""
+        parser = City24Parser(client=self.client)
+        known_ids = {listing.id for page in self.city24_pages[5:] for listing in parser.parse_listings(page.payload)}
+        incremental = IncrementalState(known_ids=known_ids, watermark=None)
+        closed = []
+
+        def raw_pages():
+            try:
+                yield from self.city24_pages
+            finally:
+                closed.append(True)
+
+        pages = list(parse_pages(parser, raw_pages(), workers=2, incremental=incremental))
+        self.assertEqual([page.number for page in pages], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(closed, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from metrics import get_metrics
+from parsers.http_client import HttpClient
+from parsers.response_cache import ResponseCache, CacheMissError
+
+ETAG = '"v1"'
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'{"page": 1}'
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/search'
+        get_metrics().reset()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_payload(self):
+        key_page_1 = ResponseCache.make_key('POST', self.url, {'page': 1, 'sort_by': 'created_at'})
+        key_page_2 = ResponseCache.make_key('POST', self.url, {'page': 2, 'sort_by': 'created_at'})
+        same_as_page_1 = ResponseCache.make_key('post', self.url, {'sort_by': 'created_at', 'page': 1})
+        self.assertNotEqual(key_page_1, key_page_2)
+        self.assertEqual(key_page_1, same_as_page_1)
+
+    def test_fresh_entry_served_without_request(self):
+        client = HttpClient(rate_limits={}, cache=ResponseCache(self.cache_path, ttl=60))
+        self.assertEqual(client.get('kvee', self.url).json(), {'page': 1})
+        self.assertEqual(client.get('kvee', self.url).json(), {'page': 1})
+        self.assertEqual(len(self.server.requests), 1)
+        client.close()
+
+    def test_stale_entry_revalidated_with_etag(self):
+        client = HttpClient(rate_limits={}, cache=ResponseCache(self.cache_path, ttl=0))
+        client.get('kvee', self.url)
+        response = client.get('kvee', self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'page': 1})
+        self.assertEqual(self.server.requests[1].get('If-None-Match'), ETAG)
+        client.close()
+
+    def test_hits_and_revalidations_are_counted_apart(self):
+        client = HttpClient(rate_limits={}, cache=ResponseCache(self.cache_path, ttl=60))
+        client.get('kvee', self.url)
+        client.get('kvee', self.url)
+        client.cache.ttl = 0
+        client.get('kvee', self.url)
+        client.close()
+        metrics, = get_metrics().snapshot()
+        self.assertEqual((metrics.requests, metrics.cache_hits, metrics.cache_revalidations), (2, 1, 1))
+
+    def test_old_entries_are_evicted_on_opening(self):
+        cache = ResponseCache(self.cache_path)
+        client = HttpClient(rate_limits={}, cache=cache)
+        client.get('kvee', self.url)
+        client.get('kvee', self.url + '?page=2')
+        key = cache.make_key('GET', self.url)
+        cache.connection.execute("UPDATE response SET stored_at = ? WHERE key = ?", (time.time() - 3600, key))
+        cache.connection.commit()
+        client.close()
+
+        cache = ResponseCache(self.cache_path, max_age=60)
+        self.assertEqual(cache.evicted, 1)
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(cache.make_key('GET', self.url + '?page=2')))
+        cache.close()
+        cache = ResponseCache(self.cache_path, max_age=60)
+        self.assertEqual(cache.evicted, 0)
+        cache.close()
+
+    def test_offline_replay(self):
+        online = HttpClient(rate_limits={}, cache=ResponseCache(self.cache_path, ttl=0))
+        online.get('kvee', self.url)
+        online.close()
+
+        offline = HttpClient(rate_limits={}, cache=ResponseCache(self.cache_path, ttl=0), offline=True)
+        self.assertEqual(offline.get('kvee', self.url).json(), {'page': 1})
+        with self.assertRaises(CacheMissError):
+            offline.get('kvee', self.url + '?page=2')
+        self.assertEqual(len(self.server.requests), 1)
+        offline.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+# Simulator tests package
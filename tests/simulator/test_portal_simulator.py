@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from parsers.city24_parser import City24Parser
+from parsers.http_client import HttpClient
+from parsers.kinnisvara24_parser import Kinnisvara24Parser
+from parsers.kvee_parser import KvEeParser
+from simulator import PortalSimulator
+
+
+class TestPortalSimulator(unittest.TestCase):
+    def setUp(self):
+        self.client = HttpClient(rate_limits={}, backoff_base=0.01)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_parsers_crawl_every_listing(self):
+        with PortalSimulator(listings=300) as simulator:
+            parsers = {
+                'kvee': KvEeParser(search_url=simulator.kvee_search_url, client=self.client),
+                'city24': City24Parser(search_url=simulator.city24_search_url, client=self.client),
+                'kinnisvara24': Kinnisvara24Parser(search_url=simulator.kinnisvara24_search_url, client=self.client),
+            }
+            for portal, parser in parsers.items():
+                with self.subTest(portal=portal):
+                    listings = parser.parse()
+                    self.assertEqual(len(listings), len(simulator.apartments_by_portal[portal]))
+                    self.assertEqual(len({listing.id for listing in listings}), len(listings))
+                    self.assertTrue(all(listing.street_with_building and listing.price for listing in listings))
+
+    def test_same_apartment_on_several_portals(self):
+        with PortalSimulator(listings=50) as simulator:
+            apartment = next(a for a in simulator.apartments_by_portal['kvee'] if 'city24' in a.portals)
+            kvee = KvEeParser(search_url=simulator.kvee_search_url, client=self.client).parse()
+            city24 = City24Parser(search_url=simulator.city24_search_url, client=self.client).parse()
+
+        kvee_listing = next(listing for listing in kvee if listing.id == str(3_000_000 + apartment.index))
+        city24_listing = next(listing for listing in city24 if listing.id == str(4_000_000 + apartment.index))
+        self.assertEqual(kvee_listing.street_with_building, city24_listing.street_with_building)
+        self.assertEqual(kvee_listing.price, city24_listing.price)
+
+    def test_injected_failures_are_retried(self):
+        with PortalSimulator(listings=300, error_rate=0.2, throttle_rate=0.1, retry_after=0) as simulator:
+            listings = KvEeParser(search_url=simulator.kvee_search_url, client=self.client).parse()
+            self.assertEqual(len(listings), len(simulator.apartments_by_portal['kvee']))
+        self.assertGreater(self.client.retries, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler import CrawlOptions, crawl_portals, format_summary
+from database import Database, DatabaseWriter, KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel
+from database.models import CrawlPageModel, CrawlRunModel
+from parsers.http_client import HttpClient
+from simulator import PortalSimulator
+
+
+class TestCrawlPortals(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        self.client = HttpClient(rate_limits={})
+
+    def tearDown(self):
+        self.client.close()
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_all_portals_in_parallel(self):
+        for use_writer in (False, True):
+            with self.subTest(use_writer=use_writer):
+                self.check_all_portals_in_parallel(DatabaseWriter(self.db) if use_writer else None)
+
+    def check_all_portals_in_parallel(self, writer):
+        with PortalSimulator(listings=500, latency=0.01) as simulator:
+            options = CrawlOptions(search_urls=simulator.search_urls)
+            results = crawl_portals(['kvee', 'city24', 'kinnisvara24'], self.db, self.client, options, writer)
+        if writer:
+            writer.close()
+            self.assertEqual(writer.stats().rows, sum(result.listings_count for result in results))
+
+        self.assertEqual([result.portal for result in results], ['kvee', 'city24', 'kinnisvara24'])
+        self.assertTrue(all(result.ok for result in results), format_summary(results))
+        for result, model in zip(results, [KvEeListingModel, City24ListingModel, Kinnisvara24ListingModel]):
+            expected_count = len(simulator.apartments_by_portal[result.portal])
+            self.assertEqual(result.listings_count, expected_count)
+            self.assertEqual(self.db.session.query(model).count(), expected_count)
+
+    def test_failing_portal_does_not_stop_others(self):
+        with PortalSimulator(listings=200) as simulator:
+            search_urls = {**simulator.search_urls, 'city24': simulator.base_url + '/missing?page={page}&l={limit}'}
+            results = crawl_portals(['kvee', 'city24'], self.db, self.client, CrawlOptions(search_urls=search_urls))
+
+        kvee, city24 = results
+        self.assertTrue(kvee.ok)
+        self.assertEqual(kvee.listings_count, len(simulator.apartments_by_portal['kvee']))
+        self.assertFalse(city24.ok)
+        self.assertIn('HTTPError', city24.error)
+        self.assertIn('failed: HTTPError', format_summary(results))
+
+    def test_resume_after_failure(self):
+        class DyingClient(HttpClient):
+            """Loses the connection for good after `requests_left` requests."""
+            requests_left = 5
+
+            def request(self, *args, **kwargs):
+                self.requests_left -= 1
+                if self.requests_left < 0:
+                    raise requests.ConnectionError('network is down')
+                return super().request(*args, **kwargs)
+
+        with PortalSimulator(listings=500) as simulator:
+            options = CrawlOptions(concurrency=1, resume=True, search_urls=simulator.search_urls)
+            dying_client = DyingClient(rate_limits={})
+            # As in the CLI, the writer commits every page, so the pages saved before the failure are kept
+            writer = DatabaseWriter(self.db)
+            failed, = crawl_portals(['kvee'], self.db, dying_client, options, writer)
+            writer.close()
+            dying_client.close()
+            resumed, = crawl_portals(['kvee'], self.db, self.client, options)
+            # Nothing left to resume: a new run starts from page 1
+            fresh, = crawl_portals(['kvee'], self.db, self.client, options)
+
+        total = len(simulator.apartments_by_portal['kvee'])
+        self.assertFalse(failed.ok)
+        self.assertTrue(resumed.ok)
+        self.assertEqual((resumed.resumed_from_page, resumed.listings_count), (6, total - 5 * 50))
+        self.assertIn('resumed from page 6', format_summary([resumed]))
+        self.assertEqual((fresh.resumed_from_page, fresh.listings_count), (None, total))
+        self.assertEqual(self.db.session.query(KvEeListingModel).count(), total)
+
+        first_run, second_run = self.db.session.query(CrawlRunModel).order_by(CrawlRunModel.id)
+        self.assertIsNotNone(first_run.finished_at)
+        journal = self.db.session.query(CrawlPageModel).filter_by(crawl_run_id=first_run.id)
+        self.assertEqual(sorted(page.page for page in journal), list(range(1, (total + 49) // 50 + 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
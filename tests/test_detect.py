@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from database import Database, City24ListingModel, KvEeListingModel
+from detect import find_outliers, format_outliers, load_listing_arrays, robust_baselines
+from parsers.batch import listing_rows
+from tests.parsers.test_batch import make_city24_listing
+
+
+class TestRobustBaselines(unittest.TestCase):
+    def test_matches_per_group_median_and_mad(self):
+        rng = np.random.default_rng(3)
+        keys = rng.integers(0, 20, 1000)
+        values = rng.normal(3000, 500, 1000).round()
+        group_keys, medians, mads, counts = robust_baselines(keys, values)
+        for key, median, mad, count in zip(group_keys, medians, mads, counts):
+            group = values[keys == key]
+            self.assertEqual(median, np.median(group))
+            self.assertEqual(mad, np.median(np.abs(group - np.median(group))))
+            self.assertEqual(count, len(group))
+
+
+class TestFindOutliers(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+
+    def tearDown(self):
+        self.db.close()
+
+    def save(self, model, listings):
+        self.db.save_rows(model, listing_rows(listings))
+
+    def test_ranks_underpriced_listing_against_its_group(self):
+        listings = []
+        for i, price_m2 in enumerate([3000, 3100, 2900, 3050, 2950, 3020, 2980, 1500]):
+            listing = make_city24_listing(str(i), price_m2)
+            listing.address = 'Tallinn, Lasnamäe linnaosa, Punane tn-21'
+            listing.apartment_number = str(i)
+            listings.append(listing)
+        # Another district: not part of the group
+        other = make_city24_listing('other', 6000)
+        other.address = 'Tallinn, Kesklinna linnaosa, Narva mnt-1'
+        self.save(City24ListingModel, listings + [other])
+
+        outliers = find_outliers(load_listing_arrays(self.db, ['city24']), min_z=3, min_group=5)
+        self.assertEqual([(outlier.listing_id, outlier.district, outlier.baseline, outlier.group_size)
+                          for outlier in outliers], [('7', 'Lasnamäe', 2990.0, 8)])
+        self.assertLess(outliers[0].z, -3)
+
+    def test_listing_with_unknown_rooms_is_reported(self):
+        listings = []
+        for i, price_m2 in enumerate([3000, 3100, 2900, 3050, 2950, 1500]):
+            listing = make_city24_listing(str(i), price_m2)
+            listing.address = 'Tallinn, Lasnamäe linnaosa, Punane tn-21'
+            listing.apartment_number = str(i)
+            listing.rooms = None
+            listings.append(listing)
+        self.save(City24ListingModel, listings)
+
+        outliers = find_outliers(load_listing_arrays(self.db, ['city24']), min_z=3, min_group=5)
+        self.assertEqual([(outlier.listing_id, outlier.rooms) for outlier in outliers], [('5', None)])
+        self.assertIn(' - ', format_outliers(outliers, limit=10).splitlines()[1])
+
+    def test_apartment_on_several_portals_counts_once(self):
+        listings = [make_city24_listing(str(i), 3000 + 10 * i) for i in range(5)]
+        for i, listing in enumerate(listings):
+            listing.address = 'Tallinn, Lasnamäe linnaosa, Punane tn-21'
+            listing.apartment_number = str(i)
+        self.save(City24ListingModel, listings)
+        outliers = find_outliers(load_listing_arrays(self.db, ['city24', 'kvee']), min_z=0, min_group=5)
+        self.assertEqual(len(outliers), 5)
+
+        # The same apartments again on kv.ee: still a group of 5, but each reported on both portals
+        kvee_columns = KvEeListingModel.__table__.c
+        self.db.save_rows(KvEeListingModel, [{**{key: value for key, value in row.items() if key in kvee_columns},
+                                              'id': f'kv-{row["id"]}'} for row in listing_rows(listings)])
+        outliers = find_outliers(load_listing_arrays(self.db, ['city24', 'kvee']), min_z=0, min_group=5)
+        self.assertEqual(len(outliers), 10)
+        self.assertEqual({outlier.group_size for outlier in outliers}, {5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler import CrawlOptions, crawl_portals
+from database import Database, KvEeListingModel
+from database.models import ImageFingerprintModel
+from duplicates import HashIndex, ImageCache, ListingImage, dhash, find_duplicates, fingerprint_images, hamming, \
+    load_listing_hashes
+from parsers.http_client import HttpClient
+from simulator import PortalSimulator
+from simulator.images import apartment_image
+
+PORTALS = ['kvee', 'city24', 'kinnisvara24']
+
+
+class TestDhash(unittest.TestCase):
+    def test_same_photo_on_every_portal(self):
+        for index in range(20):
+            hashes = [dhash(apartment_image(index, portal)) for portal in PORTALS]
+            other = dhash(apartment_image(index + 100, 'kvee'))
+            with self.subTest(index=index):
+                self.assertLessEqual(max(hamming(hashes[0], value) for value in hashes), 3)
+                self.assertGreater(hamming(hashes[0], other), 10)
+
+    def test_not_an_image(self):
+        with self.assertRaises(OSError):
+            dhash(b'<html>Not found</html>')
+
+
+class TestHashIndex(unittest.TestCase):
+    def test_search_matches_brute_force(self):
+        rng = random.Random(5)
+        values = []
+        for _ in range(500):
+            value = rng.getrandbits(64)
+            values.append(value)
+            for _ in range(3):
+                for _ in range(rng.randint(1, 7)):
+                    value ^= 1 << rng.randrange(64)
+                values.append(value)
+        index = HashIndex(values, max_distance=5)
+        for value in values[:200]:
+            expected = sorted({(hamming(value, other), other) for other in values if hamming(value, other) <= 5})
+            self.assertEqual(index.search(value), expected)
+
+
+class TestFindDuplicates(unittest.TestCase):
+    def test_pairs_across_portals(self):
+        listings = {
+            0b1111: [ListingImage('kvee', 'kv-1', 'tallinn punane 21', '1', None),
+                     ListingImage('city24', 'c-1', 'tallinn punane 21', '1', None)],
+            # One bit off: the same photo re-encoded, listed under another address
+            0b1110: [ListingImage('kinnisvara24', 'k-1', 'tallinn punane 21a', None, None)],
+            # Re-posted on the same portal: not a cross-portal duplicate
+            1 << 40: [ListingImage('kvee', 'kv-2', None, None, None), ListingImage('kvee', 'kv-3', None, None, None)],
+        }
+        duplicates = find_duplicates(listings, PORTALS, max_distance=2)
+        self.assertEqual([(duplicate.portal, duplicate.listing_id, duplicate.other_portal, duplicate.other_listing_id,
+                           duplicate.distance, duplicate.same_address) for duplicate in duplicates],
+                         [('kvee', 'kv-1', 'city24', 'c-1', 0, True),
+                          ('kvee', 'kv-1', 'kinnisvara24', 'k-1', 1, False),
+                          ('city24', 'c-1', 'kinnisvara24', 'k-1', 1, False)])
+
+    def test_common_photo_ignored(self):
+        placeholder = [ListingImage('kvee', f'kv-{i}', None, None, None) for i in range(3)]
+        listings = {0: placeholder + [ListingImage('city24', 'c-1', None, None, None)]}
+        self.assertEqual(len(find_duplicates(listings, PORTALS, common_hash_listings=3)), 3)
+        self.assertEqual(find_duplicates(listings, PORTALS, common_hash_listings=2), [])
+
+
+class TestFingerprintImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        self.client = HttpClient(rate_limits={})
+        self.cache = ImageCache(os.path.join(self.tmp_dir.name, 'images'))
+
+    def tearDown(self):
+        self.client.close()
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_photos_are_downloaded_once(self):
+        with PortalSimulator(listings=60) as simulator:
+            crawl_portals(PORTALS, self.db, self.client, CrawlOptions(search_urls=simulator.search_urls))
+            urls = sum(len(apartments) for apartments in simulator.apartments_by_portal.values())
+
+            served = simulator.requests_served
+            result = fingerprint_images(self.db, self.client, PORTALS, self.cache, concurrency=4)
+            self.assertEqual((result.urls, result.downloaded, result.failed, result.errors), (urls, urls, 0, 0))
+            self.assertEqual(simulator.requests_served - served, urls)
+
+            # Hashed URLs are skipped without a request
+            served = simulator.requests_served
+            result = fingerprint_images(self.db, self.client, PORTALS, self.cache)
+            self.assertEqual((result.known, result.downloaded), (urls, 0))
+            # A lost fingerprint is rebuilt from the image cache
+            self.db.session.query(ImageFingerprintModel).delete()
+            self.db.session.commit()
+            result = fingerprint_images(self.db, self.client, PORTALS, self.cache)
+            self.assertEqual((result.cached, result.downloaded), (urls, 0))
+            self.assertEqual(simulator.requests_served, served)
+
+            duplicates = find_duplicates(load_listing_hashes(self.db, PORTALS), PORTALS)
+            expected = {apartment.index: len(apartment.portals) for apartments in
+                        simulator.apartments_by_portal.values() for apartment in apartments}
+        self.assertEqual(len(duplicates), sum(count * (count - 1) // 2 for count in expected.values()))
+        # The simulator's listing ids end with the apartment index on every portal
+        self.assertTrue(all(int(duplicate.listing_id) % 1_000_000 == int(duplicate.other_listing_id) % 1_000_000
+                            for duplicate in duplicates))
+
+    def test_missing_photo_is_not_retried(self):
+        with PortalSimulator(listings=10) as simulator:
+            self.db.save_rows(KvEeListingModel, [{'id': '1', 'img_url': simulator.base_url + '/images/kvee/99.png'}])
+            result = fingerprint_images(self.db, self.client, ['kvee'], self.cache)
+            self.assertEqual((result.downloaded, result.failed), (0, 1))
+            served = simulator.requests_served
+            result = fingerprint_images(self.db, self.client, ['kvee'], self.cache)
+            self.assertEqual((result.known, result.failed), (1, 0))
+            self.assertEqual(simulator.requests_served, served)
+        self.assertEqual(load_listing_hashes(self.db, ['kvee']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
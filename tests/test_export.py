@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from database import Database, City24ListingModel
+from export import export_portal, format_export, partition_dir
+from parsers.batch import listing_rows
+from tests.parsers.test_batch import make_city24_listing
+
+
+class TestExportPortal(unittest.TestCase):
+    def setUp(self):
+        self.db = Database('sqlite://')
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.db.close()
+
+    def crawl(self, crawled_at, listing_ids, latitude=59.43):
+        listings = [make_city24_listing(listing_id, 2000, latitude=latitude) for listing_id in listing_ids]
+        self.db.save_rows(City24ListingModel, listing_rows(listings), crawled_at=crawled_at)
+
+    def test_partitions_by_crawl_date_with_numeric_types(self):
+        self.crawl(datetime(2025, 6, 22, 10), ['1', '2', '3'])
+        self.crawl(datetime(2025, 6, 23, 10), ['3', '4'], latitude=None)
+
+        result = export_portal(self.db, 'city24', self.output_dir, chunk_rows=2)
+        self.assertEqual(result.written, [date(2025, 6, 22), date(2025, 6, 23)])
+        self.assertEqual(result.rows, 4)
+
+        table = ds.dataset(os.path.join(self.output_dir, 'city24'), partitioning='hive').to_table()
+        self.assertEqual(table.schema.field('latitude').type, pa.float64())
+        self.assertEqual(table.schema.field('price').type, pa.int64())
+        self.assertEqual(table.schema.field('crawled_at').type, pa.timestamp('us'))
+        rows = sorted(table.select(['id', 'crawl_date', 'latitude']).to_pylist(), key=lambda row: row['id'])
+        self.assertEqual([(row['id'], str(row['crawl_date']), row['latitude']) for row in rows],
+                         [('1', '2025-06-22', 59.43), ('2', '2025-06-22', 59.43),
+                          ('3', '2025-06-23', None), ('4', '2025-06-23', None)])
+
+    def dataset(self):
+        return ds.dataset(os.path.join(self.output_dir, 'city24'), partitioning='hive').to_table()
+
+    def test_only_rows_crawled_since_the_last_export_are_appended(self):
+        self.crawl(datetime(2025, 6, 22, 10), ['1'])
+        self.crawl(datetime(2025, 6, 23, 10), ['2'])
+        export_portal(self.db, 'city24', self.output_dir)
+        first_files = {day: os.listdir(partition_dir(self.output_dir, 'city24', day))
+                       for day in (date(2025, 6, 22), date(2025, 6, 23))}
+        exported_at = os.path.getmtime(os.path.join(partition_dir(self.output_dir, 'city24', date(2025, 6, 22)),
+                                                    first_files[date(2025, 6, 22)][0]))
+
+        self.crawl(datetime(2025, 6, 23, 18), ['3'])
+        self.crawl(datetime(2025, 6, 24, 10), ['4'])
+        result = export_portal(self.db, 'city24', self.output_dir)
+        self.assertEqual(result.since, datetime(2025, 6, 23, 10))
+        # The crawl later on 06-23 adds a file next to the one exported before
+        self.assertEqual(result.written, [date(2025, 6, 23), date(2025, 6, 24)])
+        self.assertEqual(result.rows, 2)
+        self.assertEqual(os.listdir(partition_dir(self.output_dir, 'city24', date(2025, 6, 22))),
+                         first_files[date(2025, 6, 22)])
+        self.assertEqual(os.path.getmtime(os.path.join(partition_dir(self.output_dir, 'city24', date(2025, 6, 22)),
+                                                       first_files[date(2025, 6, 22)][0])), exported_at)
+        self.assertEqual(len(os.listdir(partition_dir(self.output_dir, 'city24', date(2025, 6, 23)))), 2)
+        self.assertEqual(sorted(self.dataset()['id'].to_pylist()), ['1', '2', '3', '4'])
+
+        result = export_portal(self.db, 'city24', self.output_dir)
+        self.assertEqual((result.written, result.rows), ([], 0))
+        self.assertEqual(format_export(result),
+                         "city24: 0 rows crawled after 2025-06-24 10:00:00 added to 0 partitions (none)")
+
+    def test_listings_crawled_again_keep_their_exported_rows(self):
+        self.crawl(datetime(2026, 1, 1, 23), ['1', '2', '3', '4', '5'])
+        export_portal(self.db, 'city24', self.output_dir)
+        self.crawl(datetime(2026, 1, 2, 9), ['1', '2', '3', '4'], latitude=59.44)
+
+        result = export_portal(self.db, 'city24', self.output_dir)
+        self.assertEqual(result.written, [date(2026, 1, 2)])
+        self.assertEqual(result.rows, 4)
+        rows = self.dataset().select(['id', 'crawled_at', 'latitude']).to_pylist()
+        self.assertEqual(len(rows), 9)
+        # The latest row of each listing is its current state
+        latest = {}
+        for row in sorted(rows, key=lambda row: row['crawled_at']):
+            latest[row['id']] = row['latitude']
+        self.assertEqual(latest, {'1': 59.44, '2': 59.44, '3': 59.44, '4': 59.44, '5': 59.43})
+
+
+if __name__ == '__main__':
+    unittest.main()
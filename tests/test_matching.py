@@ -0,0 +1,65 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from matching import PortalIndex, find_portal_gaps, load_portal_indexes, write_reports
+from parsers.common import build_match_key
+from tests.database.test_database import make_kinnisvara24_listing
+
+
+def make_row(listing_id, street_with_building, rooms=2, area_m2=50.0, floor=None, price=150000):
+    return {'id': listing_id, 'city': 'Tallinn', 'street_with_building': street_with_building,
+            'match_key': build_match_key('Tallinn', street_with_building), 'apartment_number': None,
+            'rooms': rooms, 'area_m2': area_m2, 'floor': floor, 'price': price}
+
+
+class TestFindPortalGaps(unittest.TestCase):
+    def test_exact_and_fuzzy_matches(self):
+        indexes = {
+            'kvee': PortalIndex('kvee', [
+                make_row('k1', 'Punane tn 21'),
+                make_row('k2', 'Pärnu mnt 10a', floor=3),
+                make_row('k3', 'Tiiu tn 5', area_m2=70.0),
+                make_row('k4', 'Vene tn 1', price=100000),
+            ]),
+            'city24': PortalIndex('city24', [
+                make_row('c1', 'Punane 21', rooms=3),
+                # Building written differently, same apartment
+                make_row('c2', 'Pärnu mnt 10 A', floor=3, area_m2=50.4),
+                # Same street, but a different apartment
+                make_row('c3', 'Tiiu tn 7', area_m2=52.0),
+                make_row('c4', 'Vene tn 3', price=130000),
+            ]),
+        }
+        gaps = {(gap.present_on, gap.missing_on): gap for gap in find_portal_gaps(indexes)}
+        self.assertEqual(set(gaps), {('kvee', 'city24'), ('city24', 'kvee')})
+        self.assertEqual([row['id'] for row in gaps['kvee', 'city24'].listings], ['k3', 'k4'])
+        self.assertEqual(gaps['kvee', 'city24'].fuzzy_matched, 1)
+
+        no_fuzzy = {(gap.present_on, gap.missing_on): gap for gap in find_portal_gaps(indexes, fuzzy=False)}
+        self.assertEqual([row['id'] for row in no_fuzzy['kvee', 'city24'].listings], ['k2', 'k3', 'k4'])
+
+    def test_reports_from_database(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = Database('sqlite://')
+            db.save_kinnisvara24_listings([make_kinnisvara24_listing('1', None)])
+            indexes = load_portal_indexes(db, ['kvee', 'city24', 'kinnisvara24'])
+            db.close()
+
+            paths = write_reports(find_portal_gaps(indexes), tmp_dir)
+            self.assertEqual(len(paths), 6)
+            report = os.path.join(tmp_dir, 'find_listings_present_on_kinnisvara24_and_missing_on_kvee.csv')
+            with open(report, encoding='utf-8') as report_file:
+                rows = list(csv.DictReader(report_file))
+            self.assertEqual([(row['id'], row['match_key']) for row in rows], [('1', 'tallinn|punane 21')])
+            self.assertEqual(list(rows[0])[0], 'id')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler import CrawlOptions, crawl_portals
+from database import Database, DatabaseWriter
+from metrics import STAGES, CrawlMetrics, PortalMetrics, append_json_log, format_prometheus, get_metrics, \
+    write_prometheus
+from parsers.http_client import HttpClient
+from simulator import PortalSimulator
+
+NOW = datetime(2025, 6, 23, 12, 0)
+
+
+class TestCrawlMetrics(unittest.TestCase):
+    def test_timers_and_counters_per_portal(self):
+        metrics = CrawlMetrics()
+        metrics.observe('kvee', 'fetch', 0.5)
+        metrics.observe('kvee', 'fetch', 0.25)
+        with metrics.timer('city24', 'parse'):
+            pass
+        metrics.add('kvee', 'bytes_downloaded', 1000)
+        metrics.add('kvee', 'pages')
+        metrics.finish('kvee', 'full', 2.0)
+
+        kvee, city24 = metrics.snapshot()
+        self.assertEqual(kvee.stage_seconds['fetch'], 0.75)
+        self.assertEqual(kvee.stage_calls['fetch'], 2)
+        self.assertEqual((kvee.bytes_downloaded, kvee.pages, kvee.pages_per_second), (1000, 1, 0.5))
+        self.assertEqual(city24.stage_calls['parse'], 1)
+        # Not finished yet
+        self.assertEqual(city24.pages_per_second, 0.0)
+
+    def test_prometheus_keeps_other_portals(self):
+        kvee = PortalMetrics('kvee', pages=10, listings=500, duration=5.0)
+        city24 = PortalMetrics('city24', pages=2, error='HTTPError: 500')
+        previous = format_prometheus([kvee, city24], NOW)
+
+        text = format_prometheus([PortalMetrics('kvee', pages=12, duration=6.0)], NOW, previous)
+        lines = text.splitlines()
+        self.assertIn('real_estate_crawl_pages{portal="kvee"} 12', lines)
+        self.assertIn('real_estate_crawl_pages{portal="city24"} 2', lines)
+        self.assertIn('real_estate_crawl_success{portal="city24"} 0', lines)
+        self.assertNotIn('real_estate_crawl_pages{portal="kvee"} 10', lines)
+        self.assertIn('real_estate_crawl_stage_seconds{portal="kvee",stage="write"} 0.0', lines)
+        # Every family is declared once, with its samples right below
+        self.assertEqual(lines.count('# TYPE real_estate_crawl_pages gauge'), 1)
+        pages_at = lines.index('# TYPE real_estate_crawl_pages gauge')
+        self.assertEqual(lines[pages_at + 1:pages_at + 3], ['real_estate_crawl_pages{portal="kvee"} 12',
+                                                           'real_estate_crawl_pages{portal="city24"} 2'])
+
+    def test_json_log_appends_a_line_per_portal(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'metrics.jsonl')
+            append_json_log(path, [PortalMetrics('kvee', listings=100, duration=4.0)], NOW)
+            append_json_log(path, [PortalMetrics('city24', error='boom')], NOW)
+            with open(path) as log:
+                records = [json.loads(line) for line in log]
+        self.assertEqual([(record['portal'], record['status']) for record in records],
+                         [('kvee', 'ok'), ('city24', 'failed')])
+        self.assertEqual(records[0]['listings_per_second'], 25.0)
+        self.assertEqual(records[0]['timestamp'], '2025-06-23T12:00:00')
+        self.assertEqual(list(records[0]['stage_seconds']), list(STAGES))
+
+
+class TestCrawlInstrumentation(unittest.TestCase):
+    def setUp(self):
+        get_metrics().reset()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        self.client = HttpClient(rate_limits={'kvee': (1000, 1000)}, backoff_base=0.01)
+
+    def tearDown(self):
+        get_metrics().reset()
+        self.client.close()
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_every_stage_is_recorded(self):
+        writer = DatabaseWriter(self.db)
+        with PortalSimulator(listings=300, error_rate=0.2, seed=1) as simulator:
+            options = CrawlOptions(search_urls=simulator.search_urls)
+            results = crawl_portals(['kvee', 'city24'], self.db, self.client, options, writer)
+        writer.close()
+
+        snapshot = {metrics.portal: metrics for metrics in get_metrics().snapshot()}
+        self.assertEqual(set(snapshot), {'kvee', 'city24'})
+        for result in results:
+            metrics = snapshot[result.portal]
+            self.assertTrue(result.ok)
+            self.assertEqual((metrics.listings, metrics.duration, metrics.mode),
+                             (result.listings_count, result.duration, 'full'))
+            self.assertGreater(metrics.bytes_downloaded, 0)
+            self.assertEqual(metrics.stage_calls['parse'], metrics.pages)
+            self.assertEqual(metrics.stage_calls['write'], metrics.pages)
+            self.assertEqual(metrics.requests, metrics.stage_calls['fetch'])
+            self.assertEqual(metrics.requests, metrics.stage_calls['decode'] + metrics.retries)
+        self.assertEqual(sum(metrics.retries for metrics in snapshot.values()), self.client.retries)
+        self.assertGreater(self.client.retries, 0)
+        # Only kvee is rate limited
+        self.assertGreater(snapshot['kvee'].stage_calls['wait'], 0)
+
+        prom_path = os.path.join(self.tmp_dir.name, 'crawl.prom')
+        write_prometheus(prom_path, list(snapshot.values()), NOW)
+        with open(prom_path) as prom:
+            self.assertIn(f'real_estate_crawl_listings{{portal="city24"}} {results[1].listings_count}\n', prom.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
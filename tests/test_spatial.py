@@ -0,0 +1,83 @@
+import math
+import os
+import random
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database, City24ListingModel
+from parsers.batch import listing_rows
+from spatial import SpatialIndex
+from tests.parsers.test_batch import make_city24_listing
+
+
+def distance_m(latitude, longitude, other_latitude, other_longitude):
+    """Haversine distance, as a reference for the projected grid distances."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    a = math.sin((other_phi - phi) / 2) ** 2 + \
+        math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(a))
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.listings = [(str(i), rng.uniform(59.38, 59.47), rng.uniform(24.58, 24.88), rng.randint(1, 4),
+                          rng.uniform(25, 120)) for i in range(2000)]
+        self.index = SpatialIndex(*zip(*[(listing_id, latitude, longitude, rooms, area, area * 3000, 3000)
+                                         for listing_id, latitude, longitude, rooms, area in self.listings]),
+                                  cell_m=200)
+
+    def brute_force(self, latitude, longitude, rooms=None):
+        return sorted((distance_m(latitude, longitude, listing_latitude, listing_longitude), listing_id)
+                      for listing_id, listing_latitude, listing_longitude, listing_rooms, _ in self.listings
+                      if rooms is None or listing_rooms == rooms)
+
+    def test_within_matches_brute_force(self):
+        found = self.index.within(59.43, 24.75, 600)
+        expected = [(distance, listing_id) for distance, listing_id in self.brute_force(59.43, 24.75)
+                    if distance <= 600]
+        self.assertEqual([comparable.listing_id for comparable in found],
+                         [listing_id for _, listing_id in expected])
+        for comparable, (distance, _) in zip(found, expected):
+            self.assertAlmostEqual(comparable.distance_m, distance, delta=0.5)
+
+    def test_nearest_matches_brute_force(self):
+        for latitude, longitude in [(59.43, 24.75), (59.38, 24.58), (59.60, 25.00)]:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                found = self.index.nearest(latitude, longitude, 7, rooms=2)
+                expected = self.brute_force(latitude, longitude, rooms=2)[:7]
+                self.assertEqual([comparable.listing_id for comparable in found],
+                                 [listing_id for _, listing_id in expected])
+                self.assertTrue(all(comparable.rooms == 2 for comparable in found))
+
+    def test_nearest_similar_area_excludes_listing(self):
+        listing_id, latitude, longitude, rooms, area = self.listings[0]
+        found = self.index.nearest(latitude, longitude, 5, rooms=rooms, area_m2=area, exclude=listing_id)
+        self.assertEqual(len(found), 5)
+        self.assertNotIn(listing_id, [comparable.listing_id for comparable in found])
+        self.assertTrue(all(abs(comparable.area_m2 - area) <= 0.2 * area for comparable in found))
+
+
+class TestFairPrice(unittest.TestCase):
+    def test_estimate_from_comparables(self):
+        db = Database('sqlite://')
+        listings = [make_city24_listing(str(i), 2000 + 100 * i, latitude=59.43 + i * 0.0001) for i in range(6)]
+        listings.append(make_city24_listing('far', 9000, latitude=59.50))
+        listings.append(make_city24_listing('no-coordinates', 9000, latitude=None))
+        db.save_rows(City24ListingModel, listing_rows(listings))
+        index = SpatialIndex.load(db)
+        db.close()
+
+        self.assertEqual(len(index), 7)
+        estimate = index.fair_price('0', k=3)
+        # Comparables 1, 2 and 3: median 2200 €/m² for 50.5 m²
+        self.assertEqual((estimate.estimate, estimate.comparables, estimate.price), (111100, 3, 100000))
+        self.assertAlmostEqual(estimate.discount_pct, 9.99, places=2)
+        self.assertEqual(index.fair_prices(k=3)[0].listing_id, '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import STARTUP_IMPORT_BUDGET_MS
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Imported by commands only, never by `--help`
+HEAVY_MODULES = ['sqlalchemy', 'requests', 'urllib3', 'numpy', 'pyarrow', 'PIL', 'bs4', 'lxml']
+
+
+def import_times(*args):
+    """Cumulative import time in microseconds of each top-level module imported by `python -X importtime *args`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=PROJECT_ROOT, capture_output=True,
+                            text=True, check=True)
+    times = {}
+    # "import time: self [us] | cumulative | imported package", nested imports are indented under their importer
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def imported_modules(code):
+    result = subprocess.run([sys.executable, '-c', f'{code}\nimport sys; print("\\n".join(sys.modules))'],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_help_imports_within_budget(self):
+        # Modules imported by the interpreter itself (site, encodings...) don't count
+        interpreter = import_times('-c', 'pass')
+        cli = import_times('real_estate_parser_cli.py', '--help')
+        modules = {name: time for name, time in cli.items() if name not in interpreter}
+
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, modules)
+        total_ms = sum(modules.values()) / 1000
+        self.assertLess(total_ms, STARTUP_IMPORT_BUDGET_MS,
+                        f"--help imports took {total_ms:.1f} ms: {sorted(modules.items(), key=lambda m: -m[1])}")
+
+    def test_portal_parsers_are_imported_on_use(self):
+        modules = imported_modules("import crawler\nfrom parsers.registry import PARSERS\nPARSERS['city24']")
+        self.assertIn('parsers.city24_parser', modules)
+        for module in ('parsers.kvee_parser', 'parsers.kinnisvara24_parser', 'bs4', 'lxml'):
+            self.assertNotIn(module, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()